@@ -1,9 +1,9 @@
 # bombay/__init__.py
-from .pipeline import VectorDB, HNSWLib, ChromaDB, EmbeddingModel, OpenAIEmbedding, QueryModel, OpenAIQuery, RAGPipeline, create_pipeline, run_pipeline
+from .pipeline import VectorDB, HNSWLib, NumpyFlatDB, ChromaDB, ShardedVectorDB, IVFPQDB, EmbeddingModel, OpenAIEmbedding, EmbeddingCache, CachedEmbedding, QueryModel, OpenAIQuery, AnswerCache, ContextBudgeter, BM25Index, reciprocal_rank_fusion, RAGPipeline, AsyncRAGPipeline, create_pipeline, run_pipeline
 
 __all__ = [
-    "VectorDB", "HNSWLib", "ChromaDB",
-    "EmbeddingModel", "OpenAIEmbedding",
-    "QueryModel", "OpenAIQuery",
-    "RAGPipeline", "create_pipeline", "run_pipeline"
+    "VectorDB", "HNSWLib", "NumpyFlatDB", "ChromaDB", "ShardedVectorDB", "IVFPQDB",
+    "EmbeddingModel", "OpenAIEmbedding", "EmbeddingCache", "CachedEmbedding",
+    "QueryModel", "OpenAIQuery", "AnswerCache", "ContextBudgeter", "BM25Index", "reciprocal_rank_fusion",
+    "RAGPipeline", "AsyncRAGPipeline", "create_pipeline", "run_pipeline"
 ]
\ No newline at end of file
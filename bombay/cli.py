@@ -8,9 +8,14 @@ from rich.table import Table
 from string import Template
 from .utils.config import Config
 from .pipeline import create_pipeline
+from .plugins import available_embedding_models, available_query_models
 from .templates import get_project_templates
+from .utils.imports import lazy_import
+import json
 import os
-import pyfiglet
+import sys
+
+pyfiglet = lazy_import('pyfiglet')
 
 
 console = Console()
@@ -75,8 +80,8 @@ def create_project():
 
     template = select_option("Select a project template:", list(template_options.keys()), list(template_options.values()))
 
-    embedding_model = select_option("Select embedding model:", ["openai"])
-    query_model = select_option("Select query model:", ["gpt-3"])
+    embedding_model = select_option("Select embedding model:", available_embedding_models())
+    query_model = select_option("Select query model:", available_query_models())
     vector_db = select_option("Select vector database:", ["chromadb", "hnswlib"])
 
     if vector_db == "chromadb":
@@ -115,7 +120,8 @@ def create_project():
             embedding_model=embedding_model,
             query_model=query_model,
             vector_db=vector_db,
-            use_persistent_storage=use_persistent_storage
+            use_persistent_storage=use_persistent_storage,
+            index_path=repr('index.bin') if vector_db == "hnswlib" else None
         )
 
         with open(f"{project_name}/main.py", "w", encoding="utf-8") as f:
@@ -137,19 +143,73 @@ def create_project():
     else:
         console.print("[yellow]Project creation canceled.[/yellow]")
 
-def main():
+def run_bench(args):
+    """Run the retrieval benchmark and print the results as JSON."""
+    from .evaluation.benchmark import run_benchmark, load_embeddings, import_time
+
+    if args.import_time:
+        write_report(import_time(repeat=args.repeat), args.output)
+        return
+    embeddings = load_embeddings(args.embeddings) if args.embeddings else None
+    queries = load_embeddings(args.queries) if args.queries else None
+    if (embeddings is None) != (queries is None):
+        raise SystemExit("--embeddings and --queries must be given together.")
+    report = run_benchmark(
+        backends=args.backends,
+        embeddings=embeddings,
+        queries=queries,
+        k=args.k,
+        similarity=args.similarity,
+        backend_params=json.loads(args.params) if args.params else None,
+        batch_size=args.batch_size,
+        num_documents=args.num_documents,
+        num_queries=args.num_queries,
+        dim=args.dim,
+        num_clusters=args.clusters,
+        seed=args.seed
+    )
+    write_report(report, args.output)
+
+def write_report(report, path=None):
+    """Write a JSON report to a file, or to stdout when no path is given."""
+    output = json.dumps(report, indent=2)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Bombay CLI tool")
     subparsers = parser.add_subparsers(dest='command')
 
     create_parser = subparsers.add_parser('create', help='Create a new Bombay project')
-    create_parser.set_defaults(func=create_project)
-
-    args = parser.parse_args()
+    create_parser.set_defaults(func=lambda args: create_project())
+
+    bench_parser = subparsers.add_parser('bench', help='Benchmark vector database backends and print JSON')
+    bench_parser.add_argument('--backends', nargs='+', default=['hnswlib', 'numpy'], help='Backends to benchmark (hnswlib, numpy, sharded, ivfpq, chromadb)')
+    bench_parser.add_argument('--num-documents', type=int, default=10000, help='Number of synthetic documents')
+    bench_parser.add_argument('--num-queries', type=int, default=200, help='Number of synthetic queries')
+    bench_parser.add_argument('--dim', type=int, default=128, help='Synthetic embedding dimension')
+    bench_parser.add_argument('--clusters', type=int, default=32, help='Number of synthetic clusters')
+    bench_parser.add_argument('--seed', type=int, default=0, help='Random seed for synthetic data')
+    bench_parser.add_argument('--embeddings', help='.npy file with document embeddings (instead of synthetic data)')
+    bench_parser.add_argument('--queries', help='.npy file with query embeddings (instead of synthetic data)')
+    bench_parser.add_argument('--k', type=int, default=10, help='Number of neighbors per query')
+    bench_parser.add_argument('--similarity', default='cosine', choices=['cosine', 'ip', 'l2'], help='Similarity for ground truth and backends')
+    bench_parser.add_argument('--batch-size', type=int, default=1000, help='Documents per add_documents call')
+    bench_parser.add_argument('--params', help='JSON object of backend parameters, e.g. \'{"hnswlib": {"ef_search": 100}}\'')
+    bench_parser.add_argument('--output', help='Write JSON to this file instead of stdout')
+    bench_parser.add_argument('--import-time', action='store_true', help='Measure cold "import bombay" time in fresh interpreters instead')
+    bench_parser.add_argument('--repeat', type=int, default=5, help='Number of fresh interpreters for --import-time')
+    bench_parser.set_defaults(func=run_bench)
+
+    args = parser.parse_args(argv)
 
     if args.command is None:
         print_initial_message()
     else:
-        args.func()
+        args.func(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
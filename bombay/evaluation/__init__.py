@@ -1,5 +1,12 @@
 #bombay/evaluation/__init__.py
+from .metrics import recall_at_k, reciprocal_rank, latency_summary, exact_match, token_f1, rouge_l
+from .benchmark import BACKENDS, synthetic_dataset, load_embeddings, exact_neighbors, benchmark_vector_db, run_benchmark, import_time
+from .fakes import FakeEmbedding, FakeQueryModel
+from .runner import load_dataset, query_cost, evaluate_pipeline, compare_configurations, comparison_table
 
-"""
-아직작성안됨
-"""
\ No newline at end of file
+__all__ = [
+    "recall_at_k", "reciprocal_rank", "latency_summary", "exact_match", "token_f1", "rouge_l",
+    "BACKENDS", "synthetic_dataset", "load_embeddings", "exact_neighbors", "benchmark_vector_db", "run_benchmark", "import_time",
+    "FakeEmbedding", "FakeQueryModel",
+    "load_dataset", "query_cost", "evaluate_pipeline", "compare_configurations", "comparison_table"
+]
@@ -0,0 +1,273 @@
+#bombay/evaluation/benchmark.py
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from uuid import uuid4
+import numpy as np
+from .metrics import recall_at_k, reciprocal_rank, latency_summary
+from ..pipeline.vector_db import HNSWLib, NumpyFlatDB, ChromaDB
+from ..pipeline.sharded import ShardedVectorDB
+from ..pipeline.ivfpq import IVFPQDB
+
+# import 시간 측정 시 함께 불러왔는지 확인하는 무거운 백엔드 모듈
+HEAVY_MODULES = ('hnswlib', 'chromadb', 'openai', 'rich', 'pyfiglet')
+
+# 새 인터프리터에서 실행하는 측정 코드, sys.modules에 있으면 실제로 불러온 모듈이다
+_IMPORT_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': seconds, 'loaded': loaded}}))
+'''
+
+# 벤치마크 대상 벡터 DB 생성 함수 (dim, similarity, **params) -> VectorDB
+BACKENDS = {
+    'hnswlib': lambda dim, similarity, **params: HNSWLib(dim, similarity=similarity, **params),
+    'numpy': lambda dim, similarity, **params: NumpyFlatDB(dim, similarity=similarity, **params),
+    'sharded': lambda dim, similarity, **params: ShardedVectorDB(dim, similarity=similarity, **params),
+    'ivfpq': lambda dim, similarity, **params: IVFPQDB(dim, similarity=similarity, **params),
+    'chromadb': lambda dim, similarity, **params: ChromaDB(collection_name=f"bench-{uuid4().hex}", similarity=similarity, **params)
+}
+
+
+def synthetic_dataset(num_documents=10000, num_queries=200, dim=128, num_clusters=32, seed=0):
+    """
+    군집 구조가 있는 합성 임베딩을 만드는 함수
+    실제 임베딩처럼 군집을 이루도록 군집 중심 주변에 점을 뿌리고 단위 길이로 정규화한다.
+    (정규화된 벡터에서는 cosine, ip, l2의 최근접 이웃 순서가 같다)
+    :param num_documents: 문서 임베딩 수 (기본값: 10000)
+    :param num_queries: 쿼리 임베딩 수 (기본값: 200)
+    :param dim: 임베딩 차원 (기본값: 128)
+    :param num_clusters: 군집 수 (기본값: 32)
+    :param seed: 난수 시드 (기본값: 0)
+    :return: (문서 임베딩, 쿼리 임베딩) float32 배열 튜플
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim)).astype(np.float32)
+
+    def sample(count):
+        points = centers[rng.integers(num_clusters, size=count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(num_documents), sample(num_queries)
+
+def load_embeddings(path):
+    """
+    .npy 파일에서 임베딩을 불러오는 함수
+    :param path: .npy 파일 경로
+    :return: (개수 x 차원) float32 배열
+    """
+    return np.asarray(np.load(path), dtype=np.float32)
+
+def exact_neighbors(embeddings, queries, k, similarity='cosine', block_size=4096):
+    """
+    전수 검색으로 정답 최근접 이웃을 구하는 함수
+    :param embeddings: (문서 수 x 차원) 문서 임베딩
+    :param queries: (쿼리 수 x 차원) 쿼리 임베딩
+    :param k: 쿼리마다 구할 이웃 수
+    :param similarity: 유사도 측정 방식 ('cosine', 'ip', 'l2') (기본값: 'cosine')
+    :param block_size: 한 번에 처리할 쿼리 수 (기본값: 4096)
+    :return: (쿼리 수 x k) 문서 위치 배열 (가까운 순)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    if similarity == 'cosine':
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    k = min(k, len(embeddings))
+    squared_norms = np.einsum('ij,ij->i', embeddings, embeddings) if similarity == 'l2' else None
+    neighbors = []
+    for start in range(0, len(queries), block_size):
+        scores = queries[start:start + block_size] @ embeddings.T
+        distances = squared_norms - 2 * scores if similarity == 'l2' else -scores
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distances, candidates, axis=1), axis=1)
+        neighbors.append(np.take_along_axis(candidates, order, axis=1))
+    return np.concatenate(neighbors) if neighbors else np.empty((0, k), dtype=np.int64)
+
+def benchmark_vector_db(factory, embeddings, queries, k=10, ground_truth=None, similarity='cosine',
+                        batch_size=1000, name=None):
+    """
+    벡터 DB 하나의 구축 시간, 메모리, 검색 품질과 지연 시간을 측정하는 함수
+    VectorDB 인터페이스(add_documents, search_with_ids)만 사용하므로 모든 백엔드에 적용할 수 있다.
+    :param factory: 빈 VectorDB 인스턴스를 반환하는 함수
+    :param embeddings: (문서 수 x 차원) 문서 임베딩
+    :param queries: (쿼리 수 x 차원) 쿼리 임베딩
+    :param k: 쿼리마다 검색할 문서 수 (기본값: 10)
+    :param ground_truth: (쿼리 수 x k) 정답 문서 위치 (기본값: None, exact_neighbors로 계산)
+    :param similarity: 정답 계산에 사용할 유사도 측정 방식 (기본값: 'cosine')
+    :param batch_size: 구축 시 add_documents 한 번에 넣을 문서 수 (기본값: 1000)
+    :param name: 결과에 기록할 백엔드 이름 (기본값: None, 클래스 이름)
+    :return: 결과 딕셔너리 (build_time, peak_memory_mb, recall_at_k, mrr, qps, latency_ms 등)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    if ground_truth is None:
+        ground_truth = exact_neighbors(embeddings, queries, k, similarity)
+    ids = [str(i) for i in range(len(embeddings))]
+
+    with _MemoryMonitor() as memory:
+        start_time = time.perf_counter()
+        vector_db = factory()
+        for start in range(0, len(embeddings), batch_size):
+            end = start + batch_size
+            vector_db.add_documents(ids[start:end], embeddings[start:end], ids=ids[start:end])
+        build_time = time.perf_counter() - start_time
+
+    latencies = []
+    recalls = []
+    reciprocal_ranks = []
+    search_start = time.perf_counter()
+    for query, truth in zip(queries, ground_truth):
+        query_start = time.perf_counter()
+        results = vector_db.search_with_ids(query, k)
+        latencies.append(time.perf_counter() - query_start)
+        retrieved = [int(document_id) for document_id, _, _ in results]
+        recalls.append(recall_at_k(retrieved, truth.tolist(), k))
+        reciprocal_ranks.append(reciprocal_rank(retrieved, truth[:1].tolist()))
+    search_time = time.perf_counter() - search_start
+    if hasattr(vector_db, 'close'):
+        # 워커 프로세스나 쓰기 스레드를 가진 백엔드는 측정이 끝나면 정리한다
+        vector_db.close()
+
+    return {
+        'backend': name or type(vector_db).__name__,
+        'num_documents': len(embeddings),
+        'num_queries': len(queries),
+        'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        'k': k,
+        'build_time': build_time,
+        'build_docs_per_second': len(embeddings) / build_time if build_time else 0.0,
+        'peak_memory_mb': memory.peak_mb,
+        'memory_source': memory.source,
+        'recall_at_k': float(np.mean(recalls)) if recalls else 0.0,
+        'mrr': float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0,
+        'qps': len(queries) / search_time if search_time else 0.0,
+        'latency_ms': latency_summary(latencies)
+    }
+
+def run_benchmark(backends=('hnswlib', 'numpy'), embeddings=None, queries=None, k=10, similarity='cosine',
+                  backend_params=None, batch_size=1000, **dataset_kwargs):
+    """
+    여러 백엔드를 같은 데이터와 정답으로 측정하는 함수
+    :param backends: BACKENDS의 이름 리스트 (기본값: ('hnswlib', 'numpy'))
+    :param embeddings: 문서 임베딩 (기본값: None, synthetic_dataset으로 생성)
+    :param queries: 쿼리 임베딩 (기본값: None, synthetic_dataset으로 생성)
+    :param k: 쿼리마다 검색할 문서 수 (기본값: 10)
+    :param similarity: 유사도 측정 방식 (기본값: 'cosine')
+    :param backend_params: 백엔드 이름 -> 생성 인자 딕셔너리 (기본값: None)
+    :param batch_size: 구축 시 add_documents 한 번에 넣을 문서 수 (기본값: 1000)
+    :param **dataset_kwargs: synthetic_dataset 인자 (num_documents, num_queries, dim, num_clusters, seed)
+    :return: JSON으로 직렬화할 수 있는 결과 딕셔너리 (dataset, results)
+    """
+    backend_params = backend_params or {}
+    for backend in backends:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}")
+    if embeddings is None or queries is None:
+        embeddings, queries = synthetic_dataset(**dataset_kwargs)
+        source = 'synthetic'
+    else:
+        source = 'loaded'
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    dim = embeddings.shape[1]
+
+    truth_start = time.perf_counter()
+    ground_truth = exact_neighbors(embeddings, queries, k, similarity)
+    truth_time = time.perf_counter() - truth_start
+
+    results = []
+    for backend in backends:
+        params = backend_params.get(backend, {})
+        factory = lambda backend=backend, params=params: BACKENDS[backend](dim, similarity, **params)
+        result = benchmark_vector_db(factory, embeddings, queries, k, ground_truth, similarity, batch_size, name=backend)
+        result['params'] = params
+        results.append(result)
+    return {
+        'dataset': {
+            'source': source,
+            'num_documents': len(embeddings),
+            'num_queries': len(queries),
+            'dim': int(dim),
+            'similarity': similarity,
+            'k': k,
+            'ground_truth_time': truth_time
+        },
+        'results': results
+    }
+
+
+# 측정 구간의 최대 메모리 증가량
+class _MemoryMonitor:
+    def __init__(self, interval=0.005):
+        """
+        /proc/self/statm이 있으면 RSS를 주기적으로 읽고, 없으면 tracemalloc으로 Python 할당만 측정한다.
+        (hnswlib처럼 C++에서 직접 할당하는 메모리는 RSS로만 보인다)
+        :param interval: RSS 샘플링 간격(초) (기본값: 0.005)
+        """
+        self.interval = interval
+        self.source = 'rss' if os.path.exists('/proc/self/statm') else 'tracemalloc'
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.source == 'rss':
+            self._baseline = self._peak = self._rss()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        else:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.source == 'rss':
+            self._stop.set()
+            self._thread.join()
+            self._peak = max(self._peak, self._rss())
+            self.peak_mb = (self._peak - self._baseline) / 2 ** 20
+        else:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.peak_mb = peak / 2 ** 20
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self._rss())
+
+    @staticmethod
+    def _rss():
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def import_time(module='bombay', repeat=5, heavy_modules=HEAVY_MODULES):
+    """
+    새 인터프리터에서 모듈 import 시간을 측정하는 함수 (콜드 스타트 추적용)
+    매번 별도 프로세스를 띄우므로 이미 불러온 모듈의 캐시 영향을 받지 않는다.
+    :param module: 측정할 모듈 이름 (기본값: 'bombay')
+    :param repeat: 측정 횟수 (기본값: 5)
+    :param heavy_modules: import 후 실제로 불러왔는지 확인할 모듈 이름 (기본값: HEAVY_MODULES)
+    :return: JSON으로 직렬화할 수 있는 결과 딕셔너리 (module, repeat, import_ms, loaded_modules)
+    """
+    code = _IMPORT_PROBE.format(module=module, heavy=tuple(heavy_modules))
+    timings = []
+    loaded = set()
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+        loaded.update(probe['loaded'])
+    return {
+        'module': module,
+        'repeat': repeat,
+        'import_ms': latency_summary(timings),
+        'loaded_modules': sorted(loaded)
+    }
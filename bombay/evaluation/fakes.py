@@ -0,0 +1,51 @@
+#bombay/evaluation/fakes.py
+import time
+from ..plugins.custom_models import HashingEmbedding, ExtractiveQuery
+
+
+# 호출마다 API 지연을 흉내 낼 수 있는 해싱 임베딩 모델 (평가/CI용)
+class FakeEmbedding(HashingEmbedding):
+    def __init__(self, dim=256, latency=0.0):
+        """
+        단어만 특징으로 사용하는 HashingEmbedding 초기화
+        같은 단어를 많이 공유하는 텍스트일수록 코사인 유사도가 높다.
+        :param dim: 임베딩 차원 (기본값: 256)
+        :param latency: 호출마다 기다릴 시간(초), API 지연을 흉내 낼 때 사용 (기본값: 0.0)
+        """
+        super().__init__(dim=dim, ngram_range=None)
+        self.latency = latency
+        self.model = f"fake-hash-{dim}"
+
+    def embed(self, texts):
+        """
+        텍스트를 임베딩하는 메소드
+        :param texts: 임베딩할 텍스트 리스트
+        :return: 단위 길이로 정규화된 float32 임베딩 배열
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        return super().embed(texts)
+
+
+# 첫 번째 관련 문서를 그대로 답하는 질의 모델 (평가/CI용)
+class FakeQueryModel(ExtractiveQuery):
+    def __init__(self, latency=0.0):
+        """
+        관련 문서를 답변으로 돌려주는 질의 모델 초기화
+        토큰 사용량은 실제 프롬프트 구성과 비슷하게 count_tokens로 계산한다.
+        :param latency: 호출마다 기다릴 시간(초), API 지연을 흉내 낼 때 사용 (기본값: 0.0)
+        """
+        super().__init__()
+        self.latency = latency
+        self.model = 'fake-extractive'
+
+    def select_sentences(self, query, relevant_docs):
+        """
+        첫 번째 관련 문서를 답변으로 고르는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 첫 번째 관련 문서만 담은 리스트 (없으면 빈 리스트)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        return list(relevant_docs[:1])
@@ -1,5 +1,112 @@
 #bombay/evaluation/metrics.py
+from collections import Counter
+import re
+import unicodedata
+import numpy as np
 
-"""
-아직작성안됨
-"""
\ No newline at end of file
+# 답변 비교 시 지울 문장 부호
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def recall_at_k(retrieved, relevant, k):
+    """
+    recall@k를 계산하는 함수
+    :param retrieved: 검색된 문서 ID 리스트 (순위 순)
+    :param relevant: 정답 문서 ID 리스트
+    :param k: 평가할 검색 개수
+    :return: 상위 k개 안에 든 정답 비율 (정답이 k개보다 적으면 정답 수로 나눈다)
+    """
+    relevant = set(relevant)
+    if not relevant:
+        return 0.0
+    hits = len(set(list(retrieved)[:k]) & relevant)
+    return hits / min(k, len(relevant))
+
+def reciprocal_rank(retrieved, relevant):
+    """
+    첫 번째 정답 문서 순위의 역수를 계산하는 함수
+    :param retrieved: 검색된 문서 ID 리스트 (순위 순)
+    :param relevant: 정답 문서 ID 리스트
+    :return: 1 / 순위 (정답이 없으면 0.0)
+    """
+    relevant = set(relevant)
+    for rank, document_id in enumerate(retrieved, start=1):
+        if document_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+def latency_summary(latencies):
+    """
+    지연 시간 분포를 요약하는 함수
+    :param latencies: 지연 시간 리스트 (초)
+    :return: 밀리초 단위 딕셔너리 (mean, p50, p95, p99, max)
+    """
+    if len(latencies) == 0:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'mean': float(latencies.mean()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(latencies.max())
+    }
+
+def normalize_answer(text):
+    """
+    답변 비교를 위해 텍스트를 정규화하는 함수 (NFC, 소문자, 문장 부호 제거, 공백 정리)
+    :param text: 정규화할 텍스트
+    :return: 토큰 리스트
+    """
+    text = unicodedata.normalize('NFC', text or '').lower()
+    return _PUNCTUATION.sub(' ', text).split()
+
+def exact_match(prediction, reference):
+    """
+    정규화한 답변이 참조 답변과 같은지 확인하는 함수
+    :param prediction: 생성된 답변
+    :param reference: 참조 답변
+    :return: 같으면 1.0, 다르면 0.0
+    """
+    return float(normalize_answer(prediction) == normalize_answer(reference))
+
+def token_f1(prediction, reference):
+    """
+    생성된 답변과 참조 답변의 토큰 F1을 계산하는 함수
+    :param prediction: 생성된 답변
+    :param reference: 참조 답변
+    :return: 0.0 ~ 1.0 F1 점수
+    """
+    predicted, expected = normalize_answer(prediction), normalize_answer(reference)
+    if not predicted or not expected:
+        return float(predicted == expected)
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if common == 0:
+        return 0.0
+    precision = common / len(predicted)
+    recall = common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+def rouge_l(prediction, reference):
+    """
+    최장 공통 부분 수열(LCS) 기반 ROUGE-L F1을 계산하는 함수
+    :param prediction: 생성된 답변
+    :param reference: 참조 답변
+    :return: 0.0 ~ 1.0 F1 점수
+    """
+    predicted, expected = normalize_answer(prediction), normalize_answer(reference)
+    if not predicted or not expected:
+        return float(predicted == expected)
+    previous = [0] * (len(expected) + 1)
+    for predicted_token in predicted:
+        current = [0]
+        for j, expected_token in enumerate(expected):
+            current.append(previous[j] + 1 if predicted_token == expected_token else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if lcs == 0:
+        return 0.0
+    precision = lcs / len(predicted)
+    recall = lcs / len(expected)
+    return 2 * precision * recall / (precision + recall)
@@ -0,0 +1,172 @@
+#bombay/evaluation/runner.py
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+import numpy as np
+from .metrics import recall_at_k, reciprocal_rank, latency_summary, exact_match, token_f1, rouge_l
+
+# 비교표에 기본으로 표시할 지표
+DEFAULT_COMPARISON_METRICS = ('hit_rate', 'mrr', 'token_f1', 'rouge_l', 'latency_p50_ms', 'latency_p95_ms',
+                              'tokens_per_query', 'cost_per_query')
+
+
+def load_dataset(path):
+    """
+    JSONL 평가 데이터셋을 불러오는 함수
+    각 줄은 {"question": ..., "expected_ids": [...], "reference_answer": ...} 형식이다.
+    :param path: JSONL 파일 경로
+    :return: 평가 항목 딕셔너리 리스트
+    """
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def query_cost(usage, prices=None):
+    """
+    토큰 사용량으로 쿼리 한 건의 비용을 계산하는 함수
+    :param usage: search_and_answer 결과의 usage 딕셔너리
+    :param prices: 100만 토큰당 가격 딕셔너리 (embedding, prompt, completion) (기본값: None, 0으로 계산)
+    :return: 비용 (prices와 같은 통화 단위)
+    """
+    prices = prices or {}
+    return (
+        usage.get('embedding_tokens', 0) * prices.get('embedding', 0.0)
+        + usage.get('prompt_tokens', 0) * prices.get('prompt', 0.0)
+        + usage.get('completion_tokens', 0) * prices.get('completion', 0.0)
+    ) / 1e6
+
+def evaluate_pipeline(pipeline, dataset, k=3, concurrency=4, prices=None, name=None):
+    """
+    평가 데이터셋으로 RAG 파이프라인의 검색 적중률, 답변 품질, 지연 시간, 토큰과 비용을 측정하는 함수
+    질문은 스레드 풀에서 동시에 실행된다.
+    :param pipeline: RAGPipeline 인스턴스 (문서가 이미 추가되어 있어야 함)
+    :param dataset: 평가 항목 리스트 (question, expected_ids, reference_answer)
+    :param k: 질문마다 검색할 문서 수 (기본값: 3)
+    :param concurrency: 동시에 실행할 질문 수 (기본값: 4)
+    :param prices: 100만 토큰당 가격 딕셔너리 (embedding, prompt, completion) (기본값: None)
+    :param name: 결과에 기록할 설정 이름 (기본값: None)
+    :return: 결과 딕셔너리 (summary, items)
+    """
+    dataset = list(dataset)
+
+    def run(item):
+        result = pipeline.search_and_answer(item['question'], k=k)
+        return _score_item(item, result, k, prices)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        items = list(executor.map(run, dataset))
+    wall_time = time.perf_counter() - start_time
+    return {
+        'name': name,
+        'summary': _summarize(items, wall_time, k, concurrency),
+        'items': items
+    }
+
+def compare_configurations(configurations, documents, ids, dataset, k=3, concurrency=4, prices=None):
+    """
+    여러 파이프라인 설정을 같은 문서와 데이터셋으로 평가해 나란히 비교하는 함수
+    :param configurations: 설정 이름 -> 새 RAGPipeline을 반환하는 함수 딕셔너리
+    :param documents: 평가용 문서 리스트
+    :param ids: 문서 ID 리스트 (데이터셋의 expected_ids와 같은 ID)
+    :param dataset: 평가 항목 리스트
+    :param k: 질문마다 검색할 문서 수 (기본값: 3)
+    :param concurrency: 동시에 실행할 질문 수 (기본값: 4)
+    :param prices: 100만 토큰당 가격 딕셔너리 또는 설정 이름 -> 가격 딕셔너리 (기본값: None)
+    :return: 결과 딕셔너리 (configurations: 이름 -> evaluate_pipeline 결과, ingest_time: 이름 -> 적재 시간)
+    """
+    documents = list(documents)
+    ids = list(ids)
+    dataset = list(dataset)
+    results = {}
+    ingest_times = {}
+    for name, factory in configurations.items():
+        pipeline = factory()
+        start_time = time.perf_counter()
+        pipeline.sync_documents(documents, ids)
+        ingest_times[name] = time.perf_counter() - start_time
+        config_prices = prices[name] if prices and name in prices else prices
+        results[name] = evaluate_pipeline(pipeline, dataset, k, concurrency, config_prices, name)
+        if hasattr(pipeline, 'close'):
+            pipeline.close()
+    return {'configurations': results, 'ingest_time': ingest_times}
+
+def comparison_table(report, metrics=DEFAULT_COMPARISON_METRICS):
+    """
+    compare_configurations 결과를 설정별 한 줄씩 정렬된 텍스트 표로 만드는 함수
+    :param report: compare_configurations 결과
+    :param metrics: 표시할 summary 지표 이름 (기본값: DEFAULT_COMPARISON_METRICS)
+    :return: 텍스트 표
+    """
+    header = ['config'] + list(metrics)
+    rows = [header]
+    for name, result in report['configurations'].items():
+        summary = result['summary']
+        rows.append([name] + [_format(summary.get(metric)) for metric in metrics])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
+
+def _score_item(item, result, k, prices):
+    expected = list(item.get('expected_ids') or [])
+    retrieved = [document_id for document_id in result.get('document_ids', ()) if document_id is not None]
+    reference = item.get('reference_answer')
+    answer = result.get('answer') or ''
+    usage = result['usage']
+    return {
+        'question': item['question'],
+        'answer': answer,
+        'retrieved_ids': retrieved,
+        'hit': float(bool(set(retrieved[:k]) & set(expected))) if expected else None,
+        'recall_at_k': recall_at_k(retrieved, expected, k) if expected else None,
+        'reciprocal_rank': reciprocal_rank(retrieved, expected) if expected else None,
+        'exact_match': exact_match(answer, reference) if reference is not None else None,
+        'token_f1': token_f1(answer, reference) if reference is not None else None,
+        'rouge_l': rouge_l(answer, reference) if reference is not None else None,
+        'timings': result['timings'],
+        'usage': usage,
+        'cost': query_cost(usage, prices),
+        'cache_hit': result.get('cache_hit', False)
+    }
+
+def _summarize(items, wall_time, k, concurrency):
+    def mean(key):
+        values = [item[key] for item in items if item[key] is not None]
+        return float(np.mean(values)) if values else None
+
+    stages = sorted({stage for item in items for stage in item['timings']})
+    latency = {stage: latency_summary([item['timings'][stage] for item in items if stage in item['timings']])
+               for stage in stages}
+    tokens = {
+        key: int(sum(item['usage'].get(key, 0) for item in items))
+        for key in ('embedding_tokens', 'prompt_tokens', 'completion_tokens')
+    }
+    total_tokens = sum(tokens.values())
+    total_cost = sum(item['cost'] for item in items)
+    count = len(items)
+    return {
+        'queries': count,
+        'k': k,
+        'concurrency': concurrency,
+        'hit_rate': mean('hit'),
+        'recall_at_k': mean('recall_at_k'),
+        'mrr': mean('reciprocal_rank'),
+        'exact_match': mean('exact_match'),
+        'token_f1': mean('token_f1'),
+        'rouge_l': mean('rouge_l'),
+        'latency_ms': latency,
+        'latency_p50_ms': latency.get('total', {}).get('p50'),
+        'latency_p95_ms': latency.get('total', {}).get('p95'),
+        'qps': count / wall_time if wall_time else 0.0,
+        'tokens': tokens,
+        'tokens_per_query': total_tokens / count if count else 0.0,
+        'estimated_usage': any(item['usage'].get('estimated') for item in items),
+        'cost': total_cost,
+        'cost_per_query': total_cost / count if count else 0.0,
+        'cache_hit_rate': sum(item['cache_hit'] for item in items) / count if count else 0.0
+    }
+
+def _format(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
@@ -1,12 +1,18 @@
 # bombay/pipeline/__init__.py
-from .vector_db import VectorDB, HNSWLib, ChromaDB
+from .vector_db import VectorDB, HNSWLib, NumpyFlatDB, ChromaDB
+from .sharded import ShardedVectorDB
+from .ivfpq import IVFPQDB
 from .embedding_models import EmbeddingModel, OpenAIEmbedding
+from .embedding_cache import EmbeddingCache, CachedEmbedding
 from .query_models import QueryModel, OpenAIQuery
-from .rag_pipeline import RAGPipeline, create_pipeline, run_pipeline
+from .answer_cache import AnswerCache
+from .context import ContextBudgeter
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .rag_pipeline import RAGPipeline, AsyncRAGPipeline, create_pipeline, run_pipeline
 
 __all__ = [
-    "VectorDB", "HNSWLib", "ChromaDB",
-    "EmbeddingModel", "OpenAIEmbedding",
-    "QueryModel", "OpenAIQuery",
-    "RAGPipeline", "create_pipeline", "run_pipeline"
+    "VectorDB", "HNSWLib", "NumpyFlatDB", "ChromaDB", "ShardedVectorDB", "IVFPQDB",
+    "EmbeddingModel", "OpenAIEmbedding", "EmbeddingCache", "CachedEmbedding",
+    "QueryModel", "OpenAIQuery", "AnswerCache", "ContextBudgeter", "BM25Index", "reciprocal_rank_fusion",
+    "RAGPipeline", "AsyncRAGPipeline", "create_pipeline", "run_pipeline"
 ]
\ No newline at end of file
@@ -0,0 +1,168 @@
+# bombay/pipeline/answer_cache.py
+from collections import OrderedDict
+import threading
+import time
+import numpy as np
+
+
+# 의미 기반 답변 캐시
+class AnswerCache:
+    def __init__(self, similarity_threshold=0.95, ttl=3600, max_entries=1000, clock=time.monotonic):
+        """
+        의미 기반 답변 캐시 초기화
+        쿼리 임베딩의 코사인 유사도가 similarity_threshold 이상이고 검색 설정(params)이 같은 이전 쿼리가 있으면 그 답변을 재사용한다.
+        답변이 참조한 문서가 업데이트되거나 삭제되면 해당 항목은 무효화된다.
+        (새 문서 추가는 기존 항목을 무효화하지 않는다.)
+        :param similarity_threshold: 캐시 적중으로 볼 최소 코사인 유사도 (기본값: 0.95)
+        :param ttl: 항목 유효 시간(초), None이면 만료 없음 (기본값: 3600)
+        :param max_entries: 최대 항목 수, 넘으면 가장 오래 사용하지 않은 항목부터 삭제 (기본값: 1000)
+        :param clock: 현재 시각을 반환하는 함수 (기본값: time.monotonic)
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.by_document = {}
+        self.untracked = set()
+        self.matrix = None
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, query_embedding, params=None):
+        """
+        유사한 이전 쿼리의 결과를 찾는 메소드
+        만료된 항목을 먼저 삭제한 뒤 params가 같은 항목 중에서 가장 유사한 쿼리를 고른다.
+        :param query_embedding: 쿼리의 임베딩
+        :param params: 결과에 영향을 주는 검색 설정 (k, threshold 등), 저장할 때와 같아야 적중 (기본값: None)
+        :return: (캐시된 결과 딕셔너리, 유사도) 튜플 또는 None
+        """
+        query = self._normalize(query_embedding)
+        with self._lock:
+            self._expire()
+            if not self.entries or self.matrix is None or len(query) != self.matrix.shape[1]:
+                self.misses += 1
+                return None
+            keys = [key for key, entry in self.entries.items() if entry['params'] == params]
+            if not keys:
+                self.misses += 1
+                return None
+            slots = np.fromiter((self.entries[key]['slot'] for key in keys), dtype=np.int64, count=len(keys))
+            similarities = self.matrix[slots] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            key = keys[best]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]['result'], float(similarities[best])
+
+    def put(self, query_embedding, result, document_ids, params=None):
+        """
+        쿼리 결과를 캐시에 저장하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param result: 저장할 결과 딕셔너리
+        :param document_ids: 답변이 참조한 문서 ID 리스트 (ID를 알 수 없는 문서는 None)
+        :param params: 결과를 만든 검색 설정, lookup에서 같은 값일 때만 재사용 (기본값: None)
+        """
+        query = self._normalize(query_embedding)
+        with self._lock:
+            if self.matrix is None or len(query) != self.matrix.shape[1]:
+                self._reset(len(query))
+            if not self.free_slots:
+                self._expire()
+            if not self.free_slots:
+                self._evict(next(iter(self.entries)))
+            slot = self.free_slots.pop()
+            self.matrix[slot] = query
+            key = self._next_key
+            self._next_key += 1
+            document_ids = tuple(document_ids)
+            self.entries[key] = {
+                'slot': slot,
+                'created': self.clock(),
+                'params': params,
+                'result': result,
+                'document_ids': document_ids
+            }
+            for document_id in document_ids:
+                if document_id is None:
+                    self.untracked.add(key)
+                else:
+                    self.by_document.setdefault(document_id, set()).add(key)
+
+    def invalidate(self, document_ids):
+        """
+        문서를 참조한 캐시 항목을 무효화하는 메소드
+        참조 문서 ID를 알 수 없는 항목은 어떤 문서가 바뀌어도 함께 무효화된다.
+        :param document_ids: 업데이트되거나 삭제된 문서 ID 리스트
+        :return: 무효화된 항목 수
+        """
+        with self._lock:
+            keys = set(self.untracked)
+            for document_id in document_ids:
+                keys |= self.by_document.get(document_id, set())
+            for key in keys:
+                self._evict(key)
+            return len(keys)
+
+    def clear(self):
+        """
+        모든 캐시 항목을 삭제하는 메소드
+        """
+        with self._lock:
+            for key in list(self.entries):
+                self._evict(key)
+
+    def get_stats(self):
+        """
+        캐시 통계를 반환하는 메소드
+        :return: 적중/미적중 횟수, 적중률, 항목 수
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.entries)
+        }
+
+    def _reset(self, dim):
+        self.entries.clear()
+        self.by_document.clear()
+        self.untracked.clear()
+        self.matrix = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self.free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        now = self.clock()
+        for key in [key for key, entry in self.entries.items() if now - entry['created'] > self.ttl]:
+            self._evict(key)
+
+    def _evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.free_slots.append(entry['slot'])
+        self.untracked.discard(key)
+        for document_id in entry['document_ids']:
+            keys = self.by_document.get(document_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_document[document_id]
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
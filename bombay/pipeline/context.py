@@ -0,0 +1,82 @@
+# bombay/pipeline/context.py
+import hashlib
+import re
+from ..utils.preprocessing import preprocess_text, count_tokens, chunk_text
+
+# 중복 판단에 사용할 단어 (문장 부호 제외)
+_WORD = re.compile(r'\w+')
+
+
+# 검색 결과를 토큰 예산에 맞춰 프롬프트 컨텍스트로 묶는 단계
+class ContextBudgeter:
+    def __init__(self, max_tokens=3000, dedupe_threshold=0.9, min_truncated_tokens=32):
+        """
+        컨텍스트 예산 관리자 초기화
+        검색 결과를 순위(관련도) 순으로 훑으며 거의 같은 문서를 건너뛰고, 예산이 찰 때까지 문서를 담는다.
+        예산을 넘는 문서는 남은 토큰만큼 단어 경계에서 자르고, 그 뒤 문서는 버린다.
+        :param max_tokens: 관련 문서에 쓸 최대 토큰 수 (기본값: 3000)
+        :param dedupe_threshold: 중복으로 볼 단어 집합 Jaccard 유사도, None이면 완전히 같은 문서만 제거 (기본값: 0.9)
+        :param min_truncated_tokens: 자른 문서가 이보다 짧아지면 자르지 않고 버린다 (기본값: 32)
+        """
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive.")
+        self.max_tokens = max_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.min_truncated_tokens = min_truncated_tokens
+
+    def pack(self, results):
+        """
+        검색 결과를 토큰 예산에 맞게 정리하는 메소드
+        :param results: 관련도 순으로 정렬된 (문서 ID, 문서, 유사도) 튜플의 리스트
+        :return: (정리된 (문서 ID, 문서, 유사도) 튜플 리스트, 보고서 딕셔너리) 튜플
+                 보고서: candidates, documents, duplicates, dropped, truncated, tokens_before, tokens_after, tokens_saved
+        """
+        packed = []
+        seen_hashes = set()
+        seen_words = []
+        duplicates = dropped = truncated = 0
+        tokens_before = tokens_after = 0
+
+        for document_id, document, distance in results:
+            tokens = count_tokens(document)
+            tokens_before += tokens
+            normalized = preprocess_text(document).lower()
+            digest = hashlib.sha1(normalized.encode('utf-8')).digest()
+            words = frozenset(_WORD.findall(normalized))
+            if digest in seen_hashes or self._is_near_duplicate(words, seen_words):
+                duplicates += 1
+                continue
+
+            remaining = self.max_tokens - tokens_after
+            if tokens > remaining:
+                if remaining < min(self.min_truncated_tokens, self.max_tokens):
+                    dropped += 1
+                    continue
+                document = next(chunk_text(document, max_tokens=remaining, overlap=0), '')
+                tokens = count_tokens(document)
+                truncated += 1
+            seen_hashes.add(digest)
+            seen_words.append(words)
+            packed.append((document_id, document, distance))
+            tokens_after += tokens
+
+        return packed, {
+            'candidates': len(results),
+            'documents': len(packed),
+            'duplicates': duplicates,
+            'dropped': dropped,
+            'truncated': truncated,
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': tokens_before - tokens_after,
+            'max_tokens': self.max_tokens
+        }
+
+    def _is_near_duplicate(self, words, seen_words):
+        if self.dedupe_threshold is None or not words:
+            return False
+        for other in seen_words:
+            union = len(words | other)
+            if union and len(words & other) / union >= self.dedupe_threshold:
+                return True
+        return False
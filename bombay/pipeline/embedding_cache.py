@@ -0,0 +1,235 @@
+# bombay/pipeline/embedding_cache.py
+from collections import OrderedDict
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+from .embedding_models import EmbeddingModel
+
+# SQLite 한 쿼리에 넣을 최대 파라미터 수
+_SQL_CHUNK_SIZE = 500
+
+
+# 임베딩 저장소 (SQLite + 메모리 LRU)
+class EmbeddingCache:
+    def __init__(self, path=None, max_entries=1000000, memory_entries=10000):
+        """
+        임베딩 캐시 초기화
+        :param path: SQLite 파일 경로 (기본값: None, 메모리에만 저장)
+        :param max_entries: 디스크에 보관할 최대 임베딩 수, 넘으면 가장 오래 사용하지 않은 항목부터 삭제 (기본값: 1000000)
+        :param memory_entries: 메모리 LRU에 보관할 최대 임베딩 수 (기본값: 10000)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.memory = OrderedDict()
+        # 메모리 LRU에서 적중한 키, 다음 SQLite 작업 때 last_access를 한 번에 갱신한다
+        self._touched = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        if path:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            'key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_access INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)')
+        self._conn.commit()
+        self._count, self._clock = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(MAX(last_access), 0) FROM embeddings'
+        ).fetchone()
+
+    def __len__(self):
+        return self._count
+
+    def get_many(self, keys):
+        """
+        키에 해당하는 임베딩을 조회하는 메소드
+        :param keys: 조회할 키 리스트
+        :return: 키 -> float32 임베딩 딕셔너리 (캐시에 있는 키만 포함)
+        """
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self.memory.move_to_end(key)
+                    self._touched.add(key)
+                    found[key] = vector
+            flush = missing or len(self._touched) >= _SQL_CHUNK_SIZE
+            if flush:
+                self._flush_touched()
+            if missing:
+                self._clock += 1
+                for i in range(0, len(missing), _SQL_CHUNK_SIZE):
+                    chunk = missing[i:i + _SQL_CHUNK_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = self._conn.execute(
+                        f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                    if rows:
+                        self._conn.execute(
+                            f'UPDATE embeddings SET last_access = ? WHERE key IN ({",".join("?" * len(rows))})',
+                            [self._clock] + [key for key, _ in rows]
+                        )
+            if flush:
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        임베딩을 저장하는 메소드
+        :param items: (키, 임베딩) 튜플의 리스트
+        """
+        with self._lock:
+            # 삭제할 항목을 고르기 전에 메모리에서만 적중한 키의 사용 시각을 반영한다
+            self._flush_touched()
+            self._clock += 1
+            rows = []
+            for key, vector in items:
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), self._clock))
+            before = self._conn.total_changes
+            self._conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)', rows)
+            self._count += self._conn.total_changes - before
+            if self._count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM embeddings WHERE key IN '
+                    '(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)',
+                    (self._count - self.max_entries,)
+                )
+                self._count = self.max_entries
+            self._conn.commit()
+
+    def close(self):
+        """
+        SQLite 연결을 닫는 메소드
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        self._clock += 1
+        touched = list(self._touched)
+        self._touched.clear()
+        for i in range(0, len(touched), _SQL_CHUNK_SIZE):
+            chunk = touched[i:i + _SQL_CHUNK_SIZE]
+            self._conn.execute(
+                f'UPDATE embeddings SET last_access = ? WHERE key IN ({",".join("?" * len(chunk))})',
+                [self._clock] + chunk
+            )
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+
+# 임베딩 캐시 래퍼
+class CachedEmbedding(EmbeddingModel):
+    def __init__(self, embedding_model, cache=None, model_name=None):
+        """
+        캐시 임베딩 모델 초기화
+        :param embedding_model: 감쌀 임베딩 모델
+        :param cache: EmbeddingCache 인스턴스 또는 SQLite 파일 경로 (기본값: None, 메모리 캐시)
+        :param model_name: 캐시 키에 사용할 모델 이름 (기본값: None, embedding_model.model 또는 클래스 이름)
+        """
+        self.embedding_model = embedding_model
+        self.cache = cache if isinstance(cache, EmbeddingCache) else EmbeddingCache(cache)
+        self.model_name = model_name or getattr(embedding_model, 'model', None) or type(embedding_model).__name__
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, texts):
+        """
+        텍스트를 임베딩하는 메소드
+        캐시에 없는 텍스트만 원래 모델로 임베딩한다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: float32 임베딩 배열 (텍스트 수 x 차원)
+        """
+        texts = list(texts)
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            self._store(found, missing, self.embedding_model.embed(list(missing.values())))
+        return self._assemble(texts, keys, found, missing)
+
+    async def aembed(self, texts):
+        """
+        텍스트를 비동기로 임베딩하는 메소드
+        캐시에 없는 텍스트만 원래 모델의 aembed로 임베딩한다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: float32 임베딩 배열 (텍스트 수 x 차원)
+        """
+        texts = list(texts)
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            self._store(found, missing, await self.embedding_model.aembed(list(missing.values())))
+        return self._assemble(texts, keys, found, missing)
+
+    def get_dimension(self):
+        """
+        감싼 임베딩 모델의 임베딩 차원을 반환하는 메소드
+        :return: 임베딩의 차원
+        """
+        return self.embedding_model.get_dimension()
+
+    def known_dimension(self):
+        """
+        감싼 임베딩 모델의 API 호출 없이 알 수 있는 임베딩 차원을 반환하는 메소드
+        :return: 임베딩의 차원 또는 None
+        """
+        return self.embedding_model.known_dimension()
+
+    def get_stats(self):
+        """
+        캐시 통계를 반환하는 메소드
+        :return: 적중/미적중 횟수, 적중률, 저장된 임베딩 수
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self.cache)
+        }
+
+    def _lookup(self, texts):
+        keys = [self._key(text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        # 같은 입력 안에서 반복되는 텍스트는 한 번만 임베딩한다
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _store(self, found, missing, embeddings):
+        new_items = list(zip(missing.keys(), embeddings))
+        self.cache.put_many(new_items)
+        found.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in new_items)
+
+    def _assemble(self, texts, keys, found, missing):
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    def _key(self, text):
+        normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+        return hashlib.sha256(f"{self.model_name}\0{normalized}".encode('utf-8')).digest()
@@ -1,6 +1,22 @@
 # bombay/pipeline/embedding_models.py
 from abc import ABC, abstractmethod
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import random
+import threading
+import time
+from ..utils.imports import lazy_import
+from ..utils.logging import logger
+from ..utils.preprocessing import count_tokens
+
+openai = lazy_import('openai')
+
+# API 호출 없이 차원을 알 수 있는 OpenAI 임베딩 모델
+KNOWN_DIMENSIONS = {
+    'text-embedding-ada-002': 1536,
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072
+}
 
 class EmbeddingModel(ABC):
     @abstractmethod
@@ -11,40 +27,263 @@ class EmbeddingModel(ABC):
     def get_dimension(self):
         pass
 
+    async def aembed(self, texts):
+        """
+        텍스트를 비동기로 임베딩하는 메소드
+        기본 구현은 embed를 스레드에서 실행하므로 비동기 클라이언트가 있는 모델은 재정의한다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: 임베딩 리스트
+        """
+        return await asyncio.to_thread(self.embed, texts)
+
+    def known_dimension(self):
+        """
+        API 호출 없이 알 수 있는 임베딩 차원을 반환하는 메소드 (파이프라인 생성 시 사용)
+        기본 구현은 get_dimension을 호출하므로 차원을 알기 위해 요청을 보내야 하는 모델은 재정의한다.
+        :return: 임베딩 차원 또는 None (첫 임베딩 전에는 알 수 없는 경우)
+        """
+        return self.get_dimension()
+
 
 # OpenAI 임베딩 모델 어댑터
 class OpenAIEmbedding(EmbeddingModel):
-    def __init__(self, api_key, model):
+    def __init__(self, api_key, model, max_batch_size=2048, max_batch_tokens=250000, max_concurrency=4,
+                 max_retries=5, backoff_base=0.5, backoff_max=20.0, base_url=None):
         """
         OpenAI 임베딩 모델 초기화
         :param api_key: OpenAI API 키
         :param model: 사용할 OpenAI 임베딩 모델
+        :param max_batch_size: 요청 하나에 담을 최대 텍스트 개수 (기본값: 2048)
+        :param max_batch_tokens: 요청 하나에 담을 최대 토큰 수 (기본값: 250000)
+        :param max_concurrency: 동시에 보낼 최대 요청 수 (기본값: 4)
+        :param max_retries: 429/5xx 응답에 대한 최대 재시도 횟수 (기본값: 5)
+        :param backoff_base: 지수 백오프의 기본 대기 시간(초) (기본값: 0.5)
+        :param backoff_max: 최대 대기 시간(초) (기본값: 20.0)
+        :param base_url: API 엔드포인트 (기본값: None, OpenAI 기본 엔드포인트)
         """
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self._async_client = None
         self.model = model
-        self.dimension = None
+        self.dimension = KNOWN_DIMENSIONS.get(model)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'texts': 0,
+            'tokens': 0,
+            'elapsed': 0.0
+        }
 
     def embed(self, texts):
         """
         텍스트를 OpenAI 임베딩 모델로 임베딩하는 메소드
+        입력을 토큰 예산에 맞는 배치로 나누어 동시에 요청하고, 결과는 입력 순서대로 반환한다.
         :param texts: 임베딩할 텍스트 리스트
         :return: 임베딩 리스트
         """
-        response = self.client.embeddings.create(
-            input=texts,
-            model=self.model
-        )
-        embeddings = [data.embedding for data in response.data]
+        texts = list(texts)
+        if not texts:
+            return []
+        start_time = time.perf_counter()
+        batches = self._split_batches(texts)
+        embeddings = [None] * len(texts)
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            results = map(self._embed_batch, batches)
+            self._collect(results, embeddings)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                self._collect(executor.map(self._embed_batch, batches), embeddings)
+        with self._stats_lock:
+            self.stats['elapsed'] += time.perf_counter() - start_time
         if self.dimension is None:
             self.dimension = len(embeddings[0])
         return embeddings
 
+    async def aembed(self, texts):
+        """
+        텍스트를 AsyncOpenAI 클라이언트로 임베딩하는 메소드
+        embed와 같은 방식으로 배치를 나누고, 최대 max_concurrency개의 요청을 동시에 보낸다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: 임베딩 리스트
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        start_time = time.perf_counter()
+        semaphore = asyncio.Semaphore(max(self.max_concurrency, 1))
+
+        async def embed_batch(batch):
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(embed_batch(batch) for batch in self._split_batches(texts)))
+        embeddings = [None] * len(texts)
+        self._collect(results, embeddings)
+        with self._stats_lock:
+            self.stats['elapsed'] += time.perf_counter() - start_time
+        if self.dimension is None:
+            self.dimension = len(embeddings[0])
+        return embeddings
+
+    @property
+    def client(self):
+        """
+        OpenAI 클라이언트 (처음 사용할 때 생성)
+        """
+        if self._client is None:
+            # 재시도는 배치 단위로 직접 처리한다
+            self._client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def async_client(self):
+        """
+        AsyncOpenAI 클라이언트 (처음 사용할 때 생성)
+        """
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._async_client
+
+    def known_dimension(self):
+        """
+        API 호출 없이 알 수 있는 임베딩 차원을 반환하는 메소드
+        :return: KNOWN_DIMENSIONS에 있거나 이미 임베딩한 적이 있으면 차원, 아니면 None
+        """
+        return self.dimension
+
     def get_dimension(self):
         """
         OpenAI 임베딩 모델의 임베딩 차원을 반환하는 메소드
+        KNOWN_DIMENSIONS에 없는 모델은 샘플 문서를 한 번 임베딩해 차원을 확인한다.
         :return: 임베딩의 차원
         """
         if self.dimension is None:
             sample_document = 'This is a sample document to get embedding dimension.'
             self.dimension = len(self.embed([sample_document])[0])
-        return self.dimension
\ No newline at end of file
+        return self.dimension
+
+    def get_stats(self):
+        """
+        임베딩 처리량 통계를 반환하는 메소드
+        :return: 요청/재시도/실패 횟수, 처리한 텍스트·토큰 수와 초당 처리량
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        elapsed = stats['elapsed']
+        stats['texts_per_second'] = stats['texts'] / elapsed if elapsed else 0.0
+        stats['tokens_per_second'] = stats['tokens'] / elapsed if elapsed else 0.0
+        return stats
+
+    def _split_batches(self, texts):
+        """
+        텍스트를 개수와 토큰 예산에 맞는 연속 배치로 나누는 메소드
+        토큰 예산보다 큰 텍스트는 단독 배치가 된다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: (시작 위치, 텍스트 리스트, 토큰 수) 튜플의 리스트
+        """
+        batches = []
+        batch_start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            batch_len = i - batch_start
+            if batch_len and (batch_len >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append((batch_start, texts[batch_start:i], batch_tokens))
+                batch_start = i
+                batch_tokens = 0
+            batch_tokens += tokens
+        batches.append((batch_start, texts[batch_start:], batch_tokens))
+        return batches
+
+    @staticmethod
+    def _collect(results, embeddings):
+        for batch_start, batch_embeddings in results:
+            embeddings[batch_start:batch_start + len(batch_embeddings)] = batch_embeddings
+
+    def _embed_batch(self, batch):
+        """
+        배치 하나를 임베딩하는 메소드 (429/5xx/연결 오류 시 지수 백오프로 재시도)
+        :param batch: (시작 위치, 텍스트 리스트, 토큰 수) 튜플
+        :return: (시작 위치, 임베딩 리스트) 튜플
+        """
+        batch_start, texts, tokens = batch
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                response = self.client.embeddings.create(input=texts, model=self.model)
+                return batch_start, self._parse_response(response, texts, tokens)
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    async def _aembed_batch(self, batch):
+        batch_start, texts, tokens = batch
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                response = await self.async_client.embeddings.create(input=texts, model=self.model)
+                return batch_start, self._parse_response(response, texts, tokens)
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    def _parse_response(self, response, texts, tokens):
+        data = sorted(response.data, key=lambda item: item.index)
+        usage = getattr(response, 'usage', None)
+        with self._stats_lock:
+            self.stats['texts'] += len(texts)
+            self.stats['tokens'] += usage.prompt_tokens if usage is not None else tokens
+        return [item.embedding for item in data]
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _retry_delay(self, error, attempt):
+        """
+        재시도 전 대기 시간을 계산하는 메소드 (재시도할 수 없는 오류는 다시 발생시킨다)
+        :param error: 발생한 오류
+        :param attempt: 지금까지 재시도한 횟수
+        :return: 대기 시간(초)
+        """
+        if not self._is_retryable(error) or attempt >= self.max_retries:
+            self._count('failures')
+            raise error
+        delay = self._backoff_delay(error, attempt)
+        logger.warning(f"Embedding request failed ({error.__class__.__name__}), retrying in {delay:.2f}s")
+        self._count('retries')
+        return delay
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code == 429 or error.status_code >= 500
+        return True
+
+    def _backoff_delay(self, error, attempt):
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                retry_after = None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
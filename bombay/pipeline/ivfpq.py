@@ -0,0 +1,576 @@
+#bombay/pipeline/ivfpq.py
+import numpy as np
+from .vector_db import VectorDB, _LabelMap, _apply_threshold, _partition_ids, _record_hashes, _encode_ids, _decode_ids
+from .storage import write_sidecar, read_sidecar
+
+# 서브 양자화기 하나의 코드 수 (uint8 코드)
+_KSUB = 256
+
+
+def _nearest(data, centroids, block_size=16384):
+    """
+    각 벡터에 가장 가까운 중심(L2)의 번호를 반환하는 함수
+    :param data: (n x d) 배열
+    :param centroids: (k x d) 배열
+    :return: 길이 n의 중심 번호 배열
+    """
+    centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), block_size):
+        block = data[start:start + block_size]
+        # ||x||^2은 모든 중심에 같으므로 생략한다
+        assignments[start:start + len(block)] = np.argmin(centroid_norms - 2.0 * (block @ centroids.T), axis=1)
+    return assignments
+
+
+def kmeans(data, k, iterations=20, seed=0):
+    """
+    NumPy로 k-means(Lloyd) 군집화를 수행하는 함수
+    빈 군집은 무작위 데이터 점으로 다시 시작한다.
+    :param data: (n x d) 학습 데이터
+    :param k: 군집 수
+    :param iterations: 반복 횟수 (기본값: 20)
+    :param seed: 난수 시드 (기본값: 0)
+    :return: (k x d) float32 중심 배열
+    """
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=len(data) < k)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(data, centroids)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=k)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(data[order], starts, axis=0) / counts[filled, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty))]
+    return centroids
+
+
+# 역파일(IVF) 리스트 하나, 삭제는 마지막 항목과 자리를 바꿔 O(1)로 처리한다
+class _InvertedList:
+    def __init__(self, m):
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self.labels = np.empty(0, dtype=np.int32)
+        self.size = 0
+
+    def append(self, labels, codes):
+        end = self.size + len(labels)
+        if end > len(self.labels):
+            capacity = max(end, 2 * len(self.labels), 16)
+            grown_codes = np.empty((capacity, self.codes.shape[1]), dtype=np.uint8)
+            grown_codes[:self.size] = self.codes[:self.size]
+            grown_labels = np.empty(capacity, dtype=np.int32)
+            grown_labels[:self.size] = self.labels[:self.size]
+            self.codes, self.labels = grown_codes, grown_labels
+        positions = np.arange(self.size, end)
+        self.codes[positions] = codes
+        self.labels[positions] = labels
+        self.size = end
+        return positions
+
+    def remove(self, position):
+        """
+        position의 항목을 지우고, 그 자리로 옮겨진 마지막 항목의 label을 반환한다 (없으면 None)
+        """
+        last = self.size - 1
+        moved = None
+        if position != last:
+            self.codes[position] = self.codes[last]
+            self.labels[position] = self.labels[last]
+            moved = int(self.labels[position])
+        self.size = last
+        return moved
+
+
+# 원본 벡터 저장소 (학습 전 검색과 정확한 재정렬에 사용), path가 있으면 디스크의 memmap에 둔다
+class _RawVectors:
+    def __init__(self, dim, path=None):
+        self.dim = dim
+        self.path = path
+        self.rows = np.empty((0, dim), dtype=np.float32)
+        if path is not None:
+            open(path, 'wb').close()
+
+    def reserve(self, capacity):
+        if capacity <= len(self.rows):
+            return
+        capacity = max(capacity, 2 * len(self.rows))
+        if self.path is None:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:len(self.rows)] = self.rows
+            self.rows = grown
+        else:
+            if isinstance(self.rows, np.memmap):
+                self.rows.flush()
+            with open(self.path, 'r+b') as f:
+                f.truncate(capacity * self.dim * 4)
+            self.rows = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+
+# IVF-PQ 압축 벡터 DB
+class IVFPQDB(VectorDB):
+    _SPACES = ('cosine', 'ip', 'l2')
+
+    def __init__(self, dim=None, similarity='cosine', nlist=1024, m=None, nprobe=8, rerank=0, train_size=None,
+                 kmeans_iterations=20, max_train_points=65536, vectors_path=None, seed=0):
+        """
+        역파일(IVF) + 곱 양자화(PQ) 기반 압축 벡터 DB 초기화
+        벡터를 nlist개의 거친 군집으로 나누고, 군집 중심과의 잔차를 m개 부분 공간마다 256개 코드북 중 하나(1바이트)로 저장한다.
+        검색은 가까운 nprobe개 군집만 방문해 쿼리별 거리 표(ADC)로 근사 거리를 계산한다.
+        학습 전에는 원본 벡터를 전수 검색하고, 문서가 train_size개가 되면 자동으로 학습해 압축한다.
+        :param dim: 벡터의 차원 (기본값: None, 첫 문서를 추가할 때 정함)
+        :param similarity: 유사도 측정 방식 ('cosine', 'ip', 'l2') (기본값: 'cosine')
+        :param nlist: 거친 군집(역파일 리스트) 수 (기본값: 1024)
+        :param m: 부분 공간(벡터당 코드 바이트) 수, dim의 약수 (기본값: None, dim // 8로 float32 대비 32배 압축)
+        :param nprobe: 검색 시 방문할 군집 수 (기본값: 8)
+        :param rerank: 0보다 크면 k * rerank개의 근사 후보를 원본 벡터로 다시 정렬, 원본 벡터를 계속 보관한다 (기본값: 0)
+        :param train_size: 자동 학습을 시작할 문서 수 (기본값: None, max(nlist, 256) * 39)
+        :param kmeans_iterations: k-means 반복 횟수 (기본값: 20)
+        :param max_train_points: 학습에 사용할 최대 벡터 수 (기본값: 65536)
+        :param vectors_path: rerank용 원본 벡터를 메모리 대신 둘 memmap 파일 경로 (기본값: None)
+        :param seed: 학습 난수 시드 (기본값: 0)
+        """
+        super().__init__()
+        if similarity not in self._SPACES:
+            raise ValueError(f"Unsupported similarity: {similarity}")
+        self.dim = dim
+        self.similarity = similarity
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.train_size = train_size or max(nlist, _KSUB) * 39
+        self.kmeans_iterations = kmeans_iterations
+        self.max_train_points = max_train_points
+        self.vectors_path = vectors_path
+        self.seed = seed
+        self.id_map = _LabelMap()
+        self.content_hashes = {}
+        self.centroids = None
+        self.codebooks = None
+        self.lists = []
+        self.list_of = np.empty(0, dtype=np.int32)
+        self.positions = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self.raw = None if dim is None else self._new_raw(dim)
+        if dim is not None:
+            self._check_m()
+
+    def __len__(self):
+        return len(self.id_map)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def nbytes(self):
+        """
+        벡터 저장에 사용 중인 메모리 바이트 수 (memmap 원본 벡터 제외)
+        """
+        total = self.list_of.nbytes + self.positions.nbytes + self.alive.nbytes
+        total += sum(lst.codes.nbytes + lst.labels.nbytes for lst in self.lists)
+        if self.is_trained:
+            total += self.centroids.nbytes + self.codebooks.nbytes
+        if self.raw is not None and not isinstance(self.raw.rows, np.memmap):
+            total += self.raw.rows.nbytes
+        return total
+
+    def _new_raw(self, dim):
+        return _RawVectors(dim, self.vectors_path)
+
+    def _check_m(self):
+        if self.m is None:
+            self.m = max(1, self.dim // 8)
+            while self.dim % self.m:
+                self.m -= 1
+        if self.dim % self.m:
+            raise ValueError(f"m ({self.m}) must divide the vector dimension ({self.dim}).")
+
+    def _as_matrix(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings.reshape(-1, self.dim or embeddings.shape[-1])
+        if self.similarity == 'cosine':
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings = embeddings / norms
+        return embeddings
+
+    def _reserve(self, capacity):
+        if capacity <= len(self.alive):
+            return
+        capacity = max(capacity, 2 * len(self.alive))
+        self.list_of = np.concatenate([self.list_of, np.full(capacity - len(self.list_of), -1, dtype=np.int32)])
+        self.positions = np.concatenate([self.positions, np.zeros(capacity - len(self.positions), dtype=np.int32)])
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        if self.raw is not None:
+            self.raw.reserve(capacity)
+
+    def add_documents(self, documents, embeddings, ids=None):
+        """
+        문서와 임베딩을 추가하는 메소드
+        학습된 인덱스에서는 벡터를 PQ 코드로 압축해 가장 가까운 군집의 리스트에 넣는다.
+        :param documents: 추가할 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트 (기본값: None, 자동 증가 정수 ID 사용)
+        :return: 추가된 문서의 ID 리스트
+        """
+        embeddings = self._as_matrix(embeddings)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            self._check_m()
+            self.raw = self._new_raw(self.dim)
+        capacity = self.id_map.capacity
+        ids, labels = self.id_map.assign(len(documents), ids)
+        self._reserve(self.id_map.capacity)
+        self.documents.extend([None] * (self.id_map.capacity - capacity))
+        for label, document in zip(labels, documents):
+            self.documents[label] = document
+        self._store(np.array(labels, dtype=np.int64), embeddings)
+        if not self.is_trained and len(self.id_map) >= self.train_size:
+            self.train()
+        return ids
+
+    def update_document(self, document_id, document, embedding):
+        """
+        문서를 업데이트하는 메소드
+        :param document_id: 업데이트할 문서의 ID
+        :param document: 새로운 문서
+        :param embedding: 새로운 문서의 임베딩
+        """
+        label = self.id_map.label(document_id)
+        self.documents[label] = document
+        self._unlink(label)
+        self._store(np.array([label]), self._as_matrix([embedding]))
+        self.content_hashes.pop(document_id, None)
+
+    def delete_document(self, document_id):
+        """
+        문서를 삭제하는 메소드
+        :param document_id: 삭제할 문서의 ID
+        """
+        label = self.id_map.release(document_id)
+        self.documents[label] = None
+        self._unlink(label)
+        self.alive[label] = False
+        self.content_hashes.pop(document_id, None)
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        """
+        ids = list(ids)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        new, existing = _partition_ids(self.id_map, ids)
+        if existing:
+            labels = np.array([self.id_map.label(ids[i]) for i in existing], dtype=np.int64)
+            for label, i in zip(labels, existing):
+                self.documents[label] = documents[i]
+                self._unlink(label)
+            self._store(labels, self._as_matrix(embeddings[existing]))
+        if new:
+            self.add_documents([documents[i] for i in new], embeddings[new], ids=[ids[i] for i in new])
+        _record_hashes(self.content_hashes, ids, content_hashes)
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 내용 해시를 반환하는 메소드
+        :return: 문서 ID -> 내용 해시 딕셔너리 (해시 없이 추가된 문서는 None)
+        """
+        return {document_id: self.content_hashes.get(document_id) for document_id in self.id_map.id_to_label}
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        id_to_label = self.id_map.id_to_label
+        return [self.documents[id_to_label[document_id]] if document_id in id_to_label else None for document_id in ids]
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드
+        원본 벡터를 보관하지 않으면 군집 중심과 PQ 코드로 복원한 근사값을 반환한다.
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        labels = np.array([self.id_map.label(document_id) for document_id in ids], dtype=np.int64)
+        if self.raw is not None:
+            return np.array(self.raw.rows[labels], dtype=np.float32).reshape(len(labels), self.dim or 0)
+        vectors = np.empty((len(labels), self.dim), dtype=np.float32)
+        dsub = self.dim // self.m
+        for row, label in enumerate(labels):
+            list_id = self.list_of[label]
+            codes = self.lists[list_id].codes[self.positions[label]]
+            residual = self.codebooks[np.arange(self.m), codes].reshape(self.m * dsub)
+            vectors[row] = self.centroids[list_id] + residual
+        return vectors
+
+    def train(self, embeddings=None):
+        """
+        거친 군집 중심과 PQ 코드북을 k-means로 학습하고 저장된 벡터를 압축하는 메소드
+        rerank가 0이면 압축 후 원본 벡터를 버린다.
+        :param embeddings: 학습용 임베딩 (기본값: None, 저장된 벡터 중 최대 max_train_points개)
+        """
+        if self.is_trained:
+            raise ValueError("IVFPQDB is already trained.")
+        rng = np.random.default_rng(self.seed)
+        if embeddings is None:
+            if self.raw is None:
+                raise ValueError("IVFPQDB needs at least one vector to train.")
+            labels = np.flatnonzero(self.alive)
+            if len(labels) > self.max_train_points:
+                labels = np.sort(rng.choice(labels, self.max_train_points, replace=False))
+            data = np.array(self.raw.rows[labels], dtype=np.float32)
+        else:
+            data = self._as_matrix(embeddings)
+            if self.dim is None:
+                self.dim = data.shape[1]
+                self._check_m()
+                self.raw = self._new_raw(self.dim)
+            if len(data) > self.max_train_points:
+                data = data[rng.choice(len(data), self.max_train_points, replace=False)]
+        if len(data) == 0:
+            raise ValueError("IVFPQDB needs at least one vector to train.")
+
+        nlist = min(self.nlist, len(data))
+        centroids = kmeans(data, nlist, self.kmeans_iterations, self.seed)
+        residuals = data - centroids[_nearest(data, centroids)]
+        dsub = self.dim // self.m
+        codebooks = np.empty((self.m, _KSUB, dsub), dtype=np.float32)
+        for j in range(self.m):
+            codebooks[j] = kmeans(residuals[:, j * dsub:(j + 1) * dsub], _KSUB, self.kmeans_iterations, self.seed + j + 1)
+        self.nlist = nlist
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.lists = [_InvertedList(self.m) for _ in range(nlist)]
+
+        labels = np.flatnonzero(self.alive)
+        for start in range(0, len(labels), 65536):
+            block = labels[start:start + 65536]
+            self._encode(block, np.array(self.raw.rows[block], dtype=np.float32))
+        if not self.rerank:
+            self.raw = None
+
+    def _encode(self, labels, embeddings):
+        list_ids = _nearest(embeddings, self.centroids)
+        residuals = embeddings - self.centroids[list_ids]
+        dsub = self.dim // self.m
+        codes = np.empty((len(labels), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = _nearest(residuals[:, j * dsub:(j + 1) * dsub], self.codebooks[j])
+        for list_id in np.unique(list_ids):
+            selected = list_ids == list_id
+            self.positions[labels[selected]] = self.lists[list_id].append(labels[selected], codes[selected])
+            self.list_of[labels[selected]] = list_id
+
+    def _store(self, labels, embeddings):
+        if self.raw is not None:
+            self.raw.rows[labels] = embeddings
+        if self.is_trained:
+            self._encode(labels, embeddings)
+        self.alive[labels] = True
+
+    def _unlink(self, label):
+        list_id = self.list_of[label]
+        if list_id < 0:
+            return
+        moved = self.lists[list_id].remove(self.positions[label])
+        if moved is not None:
+            self.positions[moved] = self.positions[label]
+        self.list_of[label] = -1
+
+    def search(self, query_embedding, k=1, threshold=None):
+        """
+        쿼리 임베딩과 유사한 문서를 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: (문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch([query_embedding], k, threshold)[0]
+
+    def search_batch(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 검색하는 메소드
+        거리는 hnswlib과 같은 기준이다 (cosine/ip: 1 - 내적, l2: 제곱 거리).
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [
+            [(document, distance) for _, document, distance in results]
+            for results in self.search_batch_with_ids(query_embeddings, k, threshold)
+        ]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None):
+        """
+        쿼리 임베딩과 유사한 문서를 문서 ID와 함께 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch_with_ids([query_embedding], k, threshold)[0]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 문서 ID와 함께 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        queries = self._as_matrix(query_embeddings)
+        k = min(k, len(self.id_map))
+        if k == 0:
+            rows = [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(queries))]
+        elif self.is_trained:
+            rows = self._search_ivf(queries, k)
+        else:
+            labels = np.flatnonzero(self.alive)
+            rows = [self._exact_top(query, labels, k) for query in queries]
+        label_to_id = self.id_map.label_to_id
+        return [
+            [(label_to_id[label], self.documents[label], float(dist)) for label, dist in zip(row_labels, row_distances)]
+            for row_labels, row_distances in _apply_threshold([row[0] for row in rows], [row[1] for row in rows], threshold)
+        ]
+
+    def _exact_top(self, query, labels, k):
+        vectors = np.asarray(self.raw.rows[labels], dtype=np.float32)
+        if self.similarity == 'l2':
+            difference = vectors - query
+            distances = np.einsum('ij,ij->i', difference, difference)
+        else:
+            distances = 1.0 - vectors @ query
+        top = np.argsort(distances, kind='stable')[:k]
+        return labels[top], distances[top].astype(np.float32)
+
+    def _search_ivf(self, queries, k):
+        """
+        가까운 nprobe개 군집의 PQ 코드로 근사 거리를 계산(ADC)하고, rerank가 있으면 후보를 원본 벡터로 다시 정렬한다.
+        l2와 cosine은 군집별 잔차 q - c로 ||q_j - c_j - codebook_j[code_j]||^2 표를 만든다.
+        정규화된 벡터에서는 제곱 거리의 절반이 1 - 코사인 유사도이고, 내적 표보다 복원 오차에 덜 민감하다.
+        ip는 <q, c> + sum_j <q_j, codebook_j[code_j]>로 쿼리마다 거리 표 하나를 모든 군집에 쓴다.
+        """
+        dsub = self.dim // self.m
+        offsets = np.arange(self.m) * _KSUB
+        euclidean = self.similarity != 'ip'
+        if euclidean:
+            coarse = np.einsum('ij,ij->i', self.centroids, self.centroids)[None, :] - 2.0 * (queries @ self.centroids.T)
+        else:
+            coarse = -(queries @ self.centroids.T)
+        nprobe = min(self.nprobe, self.nlist)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        shortlist = k * self.rerank if self.rerank and self.raw is not None else k
+        scale = 0.5 if self.similarity == 'cosine' else 1.0
+        # ||r_j - b||^2 = ||r||^2의 j 성분 + ||b||^2 - 2<r_j, b>이므로 코드북 노름은 한 번만 계산한다
+        codebook_norms = np.einsum('jkd,jkd->jk', self.codebooks, self.codebooks)
+
+        rows = []
+        for query, query_probes, query_coarse in zip(queries, probes, coarse):
+            if not euclidean:
+                table = np.einsum('jkd,jd->jk', self.codebooks, query.reshape(self.m, dsub)).ravel()
+            labels, distances = [], []
+            for list_id in query_probes:
+                lst = self.lists[list_id]
+                if lst.size == 0:
+                    continue
+                codes = lst.codes[:lst.size].astype(np.intp) + offsets
+                if euclidean:
+                    residual = query - self.centroids[list_id]
+                    table = (codebook_norms - 2.0 * np.einsum('jkd,jd->jk', self.codebooks, residual.reshape(self.m, dsub))).ravel()
+                    distances.append(scale * (table[codes].sum(axis=1) + residual @ residual))
+                else:
+                    distances.append(1.0 - (table[codes].sum(axis=1) - query_coarse[list_id]))
+                labels.append(lst.labels[:lst.size])
+            if not labels:
+                rows.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+                continue
+            labels = np.concatenate(labels)
+            distances = np.concatenate(distances).astype(np.float32)
+            if len(labels) > shortlist:
+                keep = np.argpartition(distances, shortlist - 1)[:shortlist]
+                labels, distances = labels[keep], distances[keep]
+            if shortlist > k:
+                rows.append(self._exact_top(query, labels, k))
+            else:
+                order = np.argsort(distances, kind='stable')[:k]
+                rows.append((labels[order], distances[order]))
+        return rows
+
+    def save(self, path):
+        """
+        인덱스를 path에 sidecar 바이너리 파일로 저장하는 메소드
+        PQ 코드는 label 순서로, 원본 벡터는 보관 중일 때만 저장한다.
+        :param path: 인덱스 파일 경로
+        """
+        id_kind, arrays, strings = _encode_ids(self.id_map, self.documents, self.content_hashes)
+        capacity = self.id_map.capacity
+        arrays['alive'] = self.alive[:capacity]
+        if self.is_trained:
+            codes = np.zeros((capacity, self.m), dtype=np.uint8)
+            for lst in self.lists:
+                codes[lst.labels[:lst.size]] = lst.codes[:lst.size]
+            arrays.update(centroids=self.centroids, codebooks=self.codebooks, list_of=self.list_of[:capacity], codes=codes)
+        if self.raw is not None:
+            arrays['vectors'] = np.asarray(self.raw.rows[:capacity])
+        meta = {
+            'dim': self.dim,
+            'similarity': self.similarity,
+            'nlist': self.nlist,
+            'm': self.m,
+            'nprobe': self.nprobe,
+            'rerank': self.rerank,
+            'train_size': self.train_size,
+            'kmeans_iterations': self.kmeans_iterations,
+            'max_train_points': self.max_train_points,
+            'seed': self.seed,
+            'trained': self.is_trained,
+            'id_kind': id_kind,
+            'next_id': self.id_map.next_id
+        }
+        write_sidecar(path, meta, arrays=arrays, strings=strings)
+
+    @classmethod
+    def load(cls, path, nprobe=None, vectors_path=None):
+        """
+        save로 저장한 인덱스를 불러오는 클래스 메소드
+        :param path: 인덱스 파일 경로
+        :param nprobe: 검색 시 방문할 군집 수 (기본값: None, 저장할 때의 값)
+        :param vectors_path: 원본 벡터를 둘 memmap 파일 경로 (기본값: None, 메모리)
+        :return: IVFPQDB 인스턴스
+        """
+        meta, arrays = read_sidecar(path)
+        db = cls(meta['dim'], similarity=meta['similarity'], nlist=meta['nlist'], m=meta['m'],
+                 nprobe=nprobe or meta['nprobe'], rerank=meta['rerank'], train_size=meta['train_size'],
+                 kmeans_iterations=meta['kmeans_iterations'], max_train_points=meta['max_train_points'],
+                 vectors_path=vectors_path, seed=meta['seed'])
+        _decode_ids(db, meta, arrays)
+        capacity = db.id_map.capacity
+        db._reserve(capacity)
+        db.alive[:capacity] = arrays['alive']
+        if 'vectors' in arrays:
+            db.raw.rows[:capacity] = arrays['vectors']
+        else:
+            db.raw = None
+        if meta['trained']:
+            db.centroids = np.array(arrays['centroids'])
+            db.codebooks = np.array(arrays['codebooks'])
+            db.lists = [_InvertedList(db.m) for _ in range(db.nlist)]
+            list_of = np.asarray(arrays['list_of'])
+            codes = np.asarray(arrays['codes'])
+            for list_id in np.unique(list_of[list_of >= 0]):
+                labels = np.flatnonzero(list_of == list_id)
+                db.positions[labels] = db.lists[list_id].append(labels, codes[labels])
+                db.list_of[labels] = list_id
+        return db
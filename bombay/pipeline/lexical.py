@@ -0,0 +1,304 @@
+# bombay/pipeline/lexical.py
+from array import array
+import math
+import re
+import threading
+import numpy as np
+from .storage import write_sidecar, read_sidecar, MmapStrings
+from ..utils.preprocessing import preprocess_text
+
+# 색인 단어: 영숫자 단어와 'ERR-1042', 'v2.3.1' 같은 식별자
+_TOKEN = re.compile(r'\w+(?:[-_.:/#]\w+)*')
+# 식별자를 나눌 구분자
+_SEPARATOR = re.compile(r'[-_.:/#]')
+
+
+def tokenize(text):
+    """
+    BM25 색인에 사용할 단어로 텍스트를 나누는 함수
+    식별자는 전체('err-1042')와 각 부분('err', '1042')을 모두 단어로 낸다.
+    :param text: 텍스트
+    :return: 소문자 단어 리스트
+    """
+    terms = []
+    for token in _TOKEN.findall(preprocess_text(text).lower()):
+        terms.append(token)
+        parts = _SEPARATOR.split(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """
+    여러 검색 결과 순위를 Reciprocal Rank Fusion으로 합치는 함수
+    문서 점수는 각 순위 리스트에서 1 / (k + 순위)의 합이다.
+    :param rankings: 문서 ID 리스트(순위 순)의 리스트
+    :param k: 순위 상수, 클수록 하위 순위의 영향이 커진다 (기본값: 60)
+    :param limit: 반환할 최대 문서 수 (기본값: None, 전부)
+    :return: 점수 내림차순 (문서 ID, 점수) 튜플 리스트
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, document_id in enumerate(ranking, start=1):
+            scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:limit] if limit is not None else fused
+
+
+# 프로세스 내 BM25 역색인
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75, fast_path_margin=2.0, fast_path_max_terms=4, compact_ratio=0.5):
+        """
+        BM25 역색인 초기화
+        단어마다 문서 번호(uint32)와 단어 빈도(uint16)를 array 모듈의 연속 배열로 저장하고,
+        검색 시 NumPy로 복사 없이 읽어 점수를 계산한다.
+        삭제된 문서는 tombstone으로 남겨두었다가 compact_ratio를 넘으면 한 번에 정리한다.
+        (정리 전까지 문서 빈도(df)에는 삭제된 문서가 포함된다)
+        :param k1: 단어 빈도 포화 계수 (기본값: 1.2)
+        :param b: 문서 길이 정규화 계수 (기본값: 0.75)
+        :param fast_path_margin: 1위 점수가 2위의 몇 배 이상이어야 키워드 결과만으로 답할지, None이면 사용 안 함 (기본값: 2.0)
+        :param fast_path_max_terms: 키워드 결과만으로 답할 쿼리의 최대 단어 수 (기본값: 4)
+        :param compact_ratio: 삭제된 문서 비율이 이를 넘으면 역색인을 정리 (기본값: 0.5)
+        """
+        self.k1 = k1
+        self.b = b
+        self.fast_path_margin = fast_path_margin
+        self.fast_path_max_terms = fast_path_max_terms
+        self.compact_ratio = compact_ratio
+        self.postings = {}
+        self.ids = []
+        self.id_to_ordinal = {}
+        self.lengths = array('I')
+        self.alive = bytearray()
+        self.total_length = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.id_to_ordinal)
+
+    def __contains__(self, document_id):
+        return document_id in self.id_to_ordinal
+
+    def add_documents(self, documents, ids):
+        """
+        문서를 색인에 추가하는 메소드 (이미 있는 ID는 새 내용으로 교체)
+        :param documents: 문서 리스트
+        :param ids: 문서 ID 리스트
+        """
+        ids = list(ids)
+        if len(documents) != len(ids):
+            raise ValueError(f"Expected {len(documents)} ids, got {len(ids)}.")
+        with self._lock:
+            for document_id, document in zip(ids, documents):
+                if document_id in self.id_to_ordinal:
+                    self._remove(document_id)
+                self._add(document_id, document)
+            self._maybe_compact()
+
+    def update_document(self, document_id, document):
+        """
+        문서 내용을 교체하는 메소드 (없는 ID면 추가)
+        :param document_id: 문서의 ID
+        :param document: 새로운 문서
+        """
+        self.add_documents([document], [document_id])
+
+    def delete_document(self, document_id):
+        """
+        문서를 색인에서 삭제하는 메소드 (없는 ID는 무시)
+        :param document_id: 삭제할 문서의 ID
+        """
+        with self._lock:
+            if document_id in self.id_to_ordinal:
+                self._remove(document_id)
+                self._maybe_compact()
+
+    def search(self, query, k=10):
+        """
+        쿼리와 BM25 점수가 높은 문서를 찾는 메소드
+        :param query: 검색할 쿼리
+        :param k: 반환할 최대 문서 수 (기본값: 10)
+        :return: 점수 내림차순 (문서 ID, 점수) 튜플 리스트 (점수가 0인 문서 제외)
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            live = len(self.id_to_ordinal)
+            if not terms or live == 0 or k <= 0:
+                return []
+            count = len(self.ids)
+            lengths = np.frombuffer(self.lengths, dtype=np.uintc).astype(np.float32)
+            length_norm = self.k1 * (1.0 - self.b + self.b * lengths / (self.total_length / live or 1.0))
+            scores = np.zeros(count, dtype=np.float32)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                documents = np.frombuffer(posting[0], dtype=np.uintc)
+                frequencies = np.frombuffer(posting[1], dtype=np.ushort).astype(np.float32)
+                idf = math.log(1.0 + (live - len(documents) + 0.5) / (len(documents) + 0.5))
+                scores[documents] += idf * frequencies * (self.k1 + 1.0) / (frequencies + length_norm[documents])
+            scores[np.frombuffer(self.alive, dtype=np.uint8) == 0] = 0.0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+            return [(self.ids[ordinal], float(scores[ordinal])) for ordinal in candidates]
+
+    def confident(self, query, hits):
+        """
+        키워드 검색 결과만으로 답해도 될 만큼 확실한지 판단하는 메소드
+        짧은 쿼리의 모든 단어가 1위 문서에 있고, 1위 점수가 2위보다 fast_path_margin배 이상 높아야 한다.
+        :param query: 검색한 쿼리
+        :param hits: search의 반환값
+        :return: 확실하면 True
+        """
+        if self.fast_path_margin is None or not hits:
+            return False
+        words = set(_TOKEN.findall(preprocess_text(query).lower()))
+        if not words or len(words) > self.fast_path_max_terms:
+            return False
+        if len(hits) > 1 and hits[0][1] < self.fast_path_margin * hits[1][1]:
+            return False
+        with self._lock:
+            ordinal = self.id_to_ordinal.get(hits[0][0])
+            if ordinal is None:
+                return False
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if posting is None:
+                    return False
+                documents = np.frombuffer(posting[0], dtype=np.uintc)
+                position = np.searchsorted(documents, ordinal)
+                if position == len(documents) or documents[position] != ordinal:
+                    return False
+        return True
+
+    def compact(self):
+        """
+        삭제된 문서를 역색인에서 지우고 문서 번호를 다시 매기는 메소드
+        """
+        with self._lock:
+            self._compact()
+
+    def save(self, path):
+        """
+        색인을 바이너리 파일로 저장하는 메소드 (단어별 역색인을 CSR 형식으로 이어 붙인다)
+        :param path: 파일 경로
+        """
+        with self._lock:
+            self._compact()
+            live_ids = self.ids
+            if all(isinstance(document_id, (int, np.integer)) for document_id in live_ids):
+                id_kind = 'int'
+                arrays = {'ids': np.array(live_ids, dtype='<i8')}
+                strings = {}
+            elif all(isinstance(document_id, str) for document_id in live_ids):
+                id_kind = 'str'
+                arrays = {}
+                strings = {'ids': live_ids}
+            else:
+                raise ValueError("Document ids must be all integers or all strings to be saved.")
+
+            terms = list(self.postings)
+            offsets = np.zeros(len(terms) + 1, dtype='<u8')
+            np.cumsum([len(self.postings[term][0]) for term in terms], out=offsets[1:])
+            arrays.update({
+                'lengths': np.frombuffer(self.lengths, dtype=np.uintc).astype('<u4'),
+                'offsets': offsets,
+                'documents': np.concatenate([np.frombuffer(self.postings[term][0], dtype=np.uintc) for term in terms]
+                                            or [np.empty(0, dtype=np.uintc)]).astype('<u4'),
+                'frequencies': np.concatenate([np.frombuffer(self.postings[term][1], dtype=np.ushort) for term in terms]
+                                              or [np.empty(0, dtype=np.ushort)]).astype('<u2')
+            })
+            strings['terms'] = terms
+            meta = {
+                'k1': self.k1,
+                'b': self.b,
+                'fast_path_margin': self.fast_path_margin,
+                'fast_path_max_terms': self.fast_path_max_terms,
+                'compact_ratio': self.compact_ratio,
+                'id_kind': id_kind,
+                'total_length': self.total_length
+            }
+        write_sidecar(path, meta, arrays=arrays, strings=strings)
+
+    @classmethod
+    def load(cls, path):
+        """
+        save로 저장한 색인을 불러오는 클래스 메소드
+        :param path: 파일 경로
+        :return: BM25Index 인스턴스
+        """
+        meta, arrays = read_sidecar(path)
+        index = cls(k1=meta['k1'], b=meta['b'], fast_path_margin=meta['fast_path_margin'],
+                    fast_path_max_terms=meta['fast_path_max_terms'], compact_ratio=meta['compact_ratio'])
+        if meta['id_kind'] == 'int':
+            index.ids = arrays['ids'].tolist()
+        else:
+            index.ids = list(MmapStrings(arrays, 'ids'))
+        index.id_to_ordinal = {document_id: ordinal for ordinal, document_id in enumerate(index.ids)}
+        index.lengths = array('I', arrays['lengths'].astype(np.uintc).tobytes())
+        index.alive = bytearray(b'\1' * len(index.ids))
+        index.total_length = meta['total_length']
+
+        offsets = arrays['offsets'].tolist()
+        documents = arrays['documents'].astype(np.uintc)
+        frequencies = arrays['frequencies'].astype(np.ushort)
+        for i, term in enumerate(MmapStrings(arrays, 'terms')):
+            start, end = offsets[i], offsets[i + 1]
+            index.postings[term] = (array('I', documents[start:end].tobytes()), array('H', frequencies[start:end].tobytes()))
+        return index
+
+    def _add(self, document_id, document):
+        ordinal = len(self.ids)
+        frequencies = {}
+        terms = tokenize(document)
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, frequency in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('I'), array('H'))
+            # 문서 번호는 항상 증가하므로 역색인은 정렬된 상태를 유지한다
+            posting[0].append(ordinal)
+            posting[1].append(min(frequency, 0xFFFF))
+        self.ids.append(document_id)
+        self.id_to_ordinal[document_id] = ordinal
+        self.lengths.append(len(terms))
+        self.alive.append(1)
+        self.total_length += len(terms)
+
+    def _remove(self, document_id):
+        ordinal = self.id_to_ordinal.pop(document_id)
+        self.ids[ordinal] = None
+        self.alive[ordinal] = 0
+        self.total_length -= self.lengths[ordinal]
+        self.deleted += 1
+
+    def _maybe_compact(self):
+        if self.deleted and self.deleted > self.compact_ratio * len(self.ids):
+            self._compact()
+
+    def _compact(self):
+        if not self.deleted:
+            return
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        renumber = (np.cumsum(alive) - 1).astype(np.uintc)
+        for term in list(self.postings):
+            documents, frequencies = self.postings[term]
+            documents = np.frombuffer(documents, dtype=np.uintc)
+            keep = alive[documents]
+            if not keep.any():
+                del self.postings[term]
+                continue
+            self.postings[term] = (
+                array('I', renumber[documents[keep]].tobytes()),
+                array('H', np.frombuffer(frequencies, dtype=np.ushort)[keep].tobytes())
+            )
+        self.ids = [document_id for document_id in self.ids if document_id is not None]
+        self.id_to_ordinal = {document_id: ordinal for ordinal, document_id in enumerate(self.ids)}
+        self.lengths = array('I', np.frombuffer(self.lengths, dtype=np.uintc)[alive].tobytes())
+        self.alive = bytearray(b'\1' * len(self.ids))
+        self.deleted = 0
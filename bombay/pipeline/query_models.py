@@ -1,12 +1,73 @@
 # bombay/pipeline/query_models.py
 from abc import ABC, abstractmethod
-from openai import OpenAI
+import asyncio
+import contextvars
+from ..utils.imports import lazy_import
+
+openai = lazy_import('openai')
 
 class QueryModel(ABC):
     @abstractmethod
     def generate(self, query, relevant_docs):
         pass
 
+    async def agenerate(self, query, relevant_docs):
+        """
+        비동기로 답변을 생성하는 메소드
+        기본 구현은 generate를 스레드에서 실행하므로 비동기 클라이언트가 있는 모델은 재정의한다.
+        스레드에서 기록된 토큰 사용량은 호출한 태스크의 컨텍스트로 옮겨 get_last_usage로 볼 수 있게 한다.
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 생성된 답변
+        """
+        answer, usage = await asyncio.to_thread(self._generate_with_usage, query, relevant_docs)
+        self._set_usage(usage)
+        return answer
+
+    def _generate_with_usage(self, query, relevant_docs):
+        return self.generate(query, relevant_docs), self.get_last_usage()
+
+    def get_last_usage(self):
+        """
+        현재 컨텍스트(스레드 또는 asyncio 태스크)에서 마지막으로 생성한 답변의 토큰 사용량을 반환하는 메소드
+        같은 이벤트 루프에서 동시에 진행되는 요청끼리 섞이지 않도록 스레드 로컬 대신 ContextVar에 저장한다.
+        :return: {'prompt_tokens', 'completion_tokens'} 딕셔너리 또는 None (사용량을 알 수 없는 경우)
+        """
+        return self._usage_var().get()
+
+    def _set_usage(self, usage):
+        """
+        현재 컨텍스트의 토큰 사용량을 기록하는 메소드
+        :param usage: {'prompt_tokens', 'completion_tokens'} 딕셔너리 또는 None
+        """
+        self._usage_var().set(usage)
+
+    def _usage_var(self):
+        # 하위 클래스가 super().__init__()을 호출하지 않아도 되도록 처음 사용할 때 인스턴스마다 만든다
+        var = self.__dict__.get('_usage')
+        if var is None:
+            var = self.__dict__.setdefault('_usage', contextvars.ContextVar(f"{type(self).__name__}_usage", default=None))
+        return var
+
+    def generate_stream(self, query, relevant_docs):
+        """
+        답변을 토큰 단위로 생성하는 제너레이터 메소드
+        기본 구현은 generate의 결과를 한 번에 내보내므로 스트리밍을 지원하는 모델은 재정의한다.
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 답변 조각을 내보내는 제너레이터
+        """
+        yield self.generate(query, relevant_docs)
+
+    async def agenerate_stream(self, query, relevant_docs):
+        """
+        답변을 토큰 단위로 생성하는 비동기 제너레이터 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 답변 조각을 내보내는 비동기 제너레이터
+        """
+        yield await self.agenerate(query, relevant_docs)
+
 
 # GPT 기반 질의 모델 어댑터
 class OpenAIQuery(QueryModel):
@@ -16,9 +77,46 @@ class OpenAIQuery(QueryModel):
         :param api_key: OpenAI API 키
         :param model: 사용할 GPT 모델
         """
-        self.client = OpenAI(api_key=api_key)
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
         self.model = model
 
+    @property
+    def client(self):
+        """
+        OpenAI 클라이언트 (처음 사용할 때 생성)
+        """
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def async_client(self):
+        """
+        AsyncOpenAI 클라이언트 (처음 사용할 때 생성)
+        """
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    def build_messages(self, query, relevant_docs):
+        """
+        쿼리와 관련 문서로 채팅 메시지를 만드는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 채팅 메시지 리스트
+        """
+        relevant_docs_str = ' '.join(relevant_docs)
+        return [
+            {"role": "system", "content": f"Be sure to refer to Relevant documents to answer questions. Relevant documents: {relevant_docs_str} "},
+            {"role": "user", "content": f"questions: {query}"}
+        ]
+
     def generate(self, query, relevant_docs):
         """
         쿼리와 관련 문서를 사용하여 GPT로 답변을 생성하는 메소드
@@ -26,12 +124,80 @@ class OpenAIQuery(QueryModel):
         :param relevant_docs: 관련 문서 리스트
         :return: 생성된 답변
         """
-        relevant_docs_str = ' '.join(relevant_docs)
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": f"Be sure to refer to Relevant documents to answer questions. Relevant documents: {relevant_docs_str} "},
-                {"role": "user", "content": f"questions: {query}"}
-            ]
+            messages=self.build_messages(query, relevant_docs)
+        )
+        self._record_usage(response.usage)
+        return response.choices[0].message.content
+
+    async def agenerate(self, query, relevant_docs):
+        """
+        쿼리와 관련 문서를 사용하여 AsyncOpenAI 클라이언트로 답변을 생성하는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 생성된 답변
+        """
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self.build_messages(query, relevant_docs)
         )
-        return response.choices[0].message.content
\ No newline at end of file
+        self._record_usage(response.usage)
+        return response.choices[0].message.content
+
+    def generate_stream(self, query, relevant_docs):
+        """
+        쿼리와 관련 문서를 사용하여 GPT 답변을 스트리밍으로 생성하는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 도착하는 대로 답변 조각을 내보내는 제너레이터
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self.build_messages(query, relevant_docs),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        self._record_usage(None)
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                self._record_usage(chunk.usage)
+            token = self._chunk_content(chunk)
+            if token:
+                yield token
+
+    async def agenerate_stream(self, query, relevant_docs):
+        """
+        쿼리와 관련 문서를 사용하여 GPT 답변을 비동기 스트리밍으로 생성하는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 도착하는 대로 답변 조각을 내보내는 비동기 제너레이터
+        """
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self.build_messages(query, relevant_docs),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        self._record_usage(None)
+        async for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                self._record_usage(chunk.usage)
+            token = self._chunk_content(chunk)
+            if token:
+                yield token
+
+    @staticmethod
+    def _chunk_content(chunk):
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    def _record_usage(self, usage):
+        if usage is None:
+            self._set_usage(None)
+            return
+        self._set_usage({
+            'prompt_tokens': usage.prompt_tokens,
+            'completion_tokens': usage.completion_tokens
+        })
@@ -1,28 +1,73 @@
 # bombay/pipeline/rag_pipeline.py
 
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from .vector_db import VectorDB, HNSWLib, ChromaDB
+from .vector_db import VectorDB, HNSWLib, NumpyFlatDB, ChromaDB
+from .sharded import ShardedVectorDB
+from .ivfpq import IVFPQDB
 from .embedding_models import EmbeddingModel, OpenAIEmbedding
+from .embedding_cache import CachedEmbedding
 from .query_models import QueryModel, OpenAIQuery
+from .answer_cache import AnswerCache
+from .context import ContextBudgeter
+from .lexical import BM25Index, reciprocal_rank_fusion
+from ..plugins.registry import register_embedding_model, register_query_model, create_embedding_model, create_query_model
+from ..utils.config import Config
 from ..utils.logging import logger
-from ..utils.preprocessing import preprocess_text
+from ..utils.preprocessing import preprocess_text, count_tokens, content_hash, iter_chunks, iter_file_chunks, batched, DEFAULT_EXTENSIONS
+
+# RAGPipeline이 HNSWLib 생성자로 넘기는 인자
+_HNSW_PARAMS = ('num_threads', 'M', 'ef_construction', 'ef_search', 'growth_factor')
+_IVFPQ_PARAMS = ('nlist', 'm', 'nprobe', 'rerank', 'train_size', 'kmeans_iterations', 'vectors_path')
+# 하이브리드 검색에서 키워드/벡터 검색 각각 k의 몇 배까지 후보를 가져와 합칠지
+_HYBRID_OVERFETCH = 3
 
 # RAG 파이프라인 클래스
 class RAGPipeline:
-    def __init__(self, embedding_model, query_model, vector_db, similarity='cosine', **kwargs):
+    def __init__(self, embedding_model, query_model, vector_db, similarity='cosine', answer_cache=None,
+                 context_budgeter=None, lexical_index=None, rrf_k=60, reranker=None, overfetch=10, **kwargs):
         """
         RAG 파이프라인 초기화
         :param embedding_model: 임베딩 모델
         :param query_model: 질의 모델
         :param vector_db: 벡터 DB 이름 또는 인스턴스
         :param similarity: 유사도 측정 방식 (기본값: 'cosine')
-        :param **kwargs: 벡터 DB 초기화에 사용되는 추가 인자
+        :param answer_cache: 유사한 쿼리의 답변을 재사용하는 AnswerCache 인스턴스 (기본값: None)
+        :param context_budgeter: 검색 결과를 토큰 예산에 맞추는 ContextBudgeter 인스턴스 (기본값: None)
+        :param lexical_index: 벡터 검색과 함께 사용할 BM25Index 인스턴스, 문서 추가/수정/삭제 시 함께 갱신된다.
+                              index_path에서 인덱스를 불러왔고 index_path + '.bm25' 파일이 있으면 그 파일로 대체하며,
+                              파일이 없고 lexical_index가 비어 있으면 불러온 문서로 다시 만든다 (기본값: None)
+        :param rrf_k: 키워드/벡터 검색 결과를 합치는 Reciprocal Rank Fusion 상수 (기본값: 60)
+        :param reranker: 검색 후보를 다시 정렬하는 Reranker 인스턴스 (bombay.plugins 참고), similarity가 None이면 파이프라인의 similarity로 채운다 (기본값: None)
+        :param overfetch: reranker가 있을 때 k의 몇 배만큼 후보를 검색할지 (기본값: 10)
+        :param **kwargs: 벡터 DB 초기화에 사용되는 추가 인자 (index_path: HNSWLib 인덱스 파일 경로)
         """
         self.embedding_model = embedding_model
         self.query_model = query_model
         self.similarity = similarity
+        self.answer_cache = answer_cache
+        self.context_budgeter = context_budgeter
+        self.index_path = kwargs.pop('index_path', None)
+        self.index_loaded = False
         self.vector_db = self._initialize_vector_db(vector_db, **kwargs)
-        
+        self.lexical_index = lexical_index
+        self.rrf_k = rrf_k
+        self.reranker = reranker
+        self.overfetch = overfetch
+        if reranker is not None and getattr(reranker, 'similarity', 'unset') is None:
+            # 리랭킹 결과의 거리와 threshold가 벡터 검색과 같은 기준이 되도록 인덱스의 유사도 방식을 알려준다
+            reranker.similarity = similarity
+        if lexical_index is not None and self.index_loaded:
+            if os.path.exists(f"{self.index_path}.bm25"):
+                logger.info(f"Loading BM25 index from {self.index_path}.bm25")
+                self.lexical_index = BM25Index.load(f"{self.index_path}.bm25")
+            elif not len(lexical_index):
+                self._rebuild_lexical_index()
+
     def _initialize_vector_db(self, vector_db, **kwargs):
         """
         벡터 DB를 초기화하는 메소드
@@ -31,10 +76,35 @@ class RAGPipeline:
         :return: 초기화된 벡터 DB 인스턴스
         """
         if isinstance(vector_db, str):
+            hnsw_params = {key: kwargs[key] for key in _HNSW_PARAMS if key in kwargs}
             if vector_db.lower() == 'hnswlib':
-                return HNSWLib(self.embedding_model.get_dimension(), similarity=self.similarity)
+                if self.index_path and os.path.exists(f"{self.index_path}.docs"):
+                    logger.info(f"Loading HNSWLib index from {self.index_path}")
+                    self.index_loaded = True
+                    return HNSWLib.load(self.index_path, num_threads=hnsw_params.get('num_threads', -1),
+                                        ef_search=hnsw_params.get('ef_search'))
+                return HNSWLib(self._known_dimension(), similarity=self.similarity, **hnsw_params)
+            elif vector_db.lower() == 'numpy':
+                return NumpyFlatDB(self._known_dimension(), similarity=self.similarity,
+                                   dtype=kwargs.get('storage_dtype', 'float32'))
+            elif vector_db.lower() == 'sharded':
+                if self.index_path and os.path.exists(f"{self.index_path}.shards"):
+                    logger.info(f"Loading sharded index from {self.index_path}")
+                    self.index_loaded = True
+                    return ShardedVectorDB.load(self.index_path, **{key: hnsw_params[key] for key in ('num_threads', 'ef_search') if key in hnsw_params})
+                shard_backend = kwargs.get('shard_backend', 'hnswlib')
+                shard_params = hnsw_params if shard_backend == 'hnswlib' else {'dtype': kwargs.get('storage_dtype', 'float32')}
+                return ShardedVectorDB(self._known_dimension(), num_shards=kwargs.get('num_shards'), backend=shard_backend,
+                                       similarity=self.similarity, **shard_params)
+            elif vector_db.lower() == 'ivfpq':
+                if self.index_path and os.path.exists(self.index_path):
+                    logger.info(f"Loading IVF-PQ index from {self.index_path}")
+                    self.index_loaded = True
+                    return IVFPQDB.load(self.index_path, nprobe=kwargs.get('nprobe'), vectors_path=kwargs.get('vectors_path'))
+                ivfpq_params = {key: kwargs[key] for key in _IVFPQ_PARAMS if key in kwargs}
+                return IVFPQDB(self._known_dimension(), similarity=self.similarity, **ivfpq_params)
             elif vector_db.lower() == 'chromadb':
-                return ChromaDB(**kwargs)
+                return ChromaDB(similarity=self.similarity, **kwargs)
             else:
                 raise ValueError(f"Unsupported vector database: {vector_db}")
         elif isinstance(vector_db, VectorDB):
@@ -42,13 +112,167 @@ class RAGPipeline:
         else:
             raise ValueError(f"Unsupported vector database type: {type(vector_db)}")
 
-    def add_documents(self, documents):
+    def _known_dimension(self):
+        """
+        임베딩 API를 호출하지 않고 알 수 있는 임베딩 차원을 반환하는 메소드
+        None이면 벡터 DB는 첫 문서를 추가할 때 인덱스를 만든다.
+        """
+        if isinstance(self.embedding_model, EmbeddingModel):
+            return self.embedding_model.known_dimension()
+        return self.embedding_model.get_dimension()
+
+    def add_documents(self, documents, metadatas=None):
         """
         문서를 RAG 파이프라인에 추가하는 메소드
         :param documents: 추가할 문서 리스트
+        :param metadatas: 문서 메타데이터 딕셔너리 리스트, HNSWLib과 ChromaDB만 해당 (기본값: None)
+        :return: 추가된 문서의 ID 리스트
         """
         embeddings = self.embedding_model.embed(documents)
-        self.vector_db.add_documents(documents, np.array(embeddings))
+        if metadatas is None:
+            ids = self.vector_db.add_documents(documents, np.array(embeddings))
+        else:
+            ids = self.vector_db.add_documents(documents, np.array(embeddings), metadatas=metadatas)
+        self._index_lexical(documents, ids)
+        return ids
+
+    def _rebuild_lexical_index(self, batch_size=1000):
+        """
+        '.bm25' 파일 없이 불러온 인덱스의 문서로 lexical_index를 다시 만드는 메소드
+        사이드카 파일이 없던 이전 버전의 인덱스도 하이브리드 검색이 조용히 벡터 검색으로만 동작하지 않게 한다.
+        :param batch_size: 한 번에 벡터 DB에서 읽을 문서 수 (기본값: 1000)
+        """
+        try:
+            ids = list(self.vector_db.get_content_hashes())
+        except NotImplementedError:
+            logger.warning(f"BM25 index {self.index_path}.bm25 not found and {type(self.vector_db).__name__} cannot list its documents; "
+                           "hybrid search will only use vector results for existing documents.")
+            return
+        logger.warning(f"BM25 index {self.index_path}.bm25 not found, rebuilding it from {len(ids)} stored documents")
+        for batch in batched(ids, batch_size):
+            documents = self.vector_db.get_documents(batch)
+            found = [(document_id, document) for document_id, document in zip(batch, documents) if document is not None]
+            self._index_lexical([document for _, document in found], [document_id for document_id, _ in found])
+
+    def _index_lexical(self, documents, ids):
+        if self.lexical_index is not None:
+            self.lexical_index.add_documents(documents, ids)
+
+    def ingest(self, documents, max_tokens=512, overlap=64, batch_size=256, workers=1, embed_concurrency=2, progress=None):
+        """
+        문서를 청크로 나누어 배치 단위로 임베딩하고 벡터 DB에 추가하는 메소드
+        documents는 제너레이터여도 되며, 청크 분할, 임베딩 요청, 벡터 DB 삽입이 서로 겹쳐 실행된다.
+        메모리에는 최대 embed_concurrency + 1개의 배치만 올라간다.
+        :param documents: 추가할 문서 텍스트의 이터러블
+        :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+        :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+        :param batch_size: 한 번에 임베딩할 청크 수 (기본값: 256)
+        :param workers: 청크 분할에 사용할 프로세스 수 (기본값: 1, 현재 프로세스에서 처리)
+        :param embed_concurrency: 동시에 진행할 임베딩 배치 수 (기본값: 2)
+        :param progress: 배치마다 진행 상황 딕셔너리를 받아 호출되는 함수 (기본값: None)
+        :return: 진행 상황 딕셔너리 (sources, chunks, tokens, elapsed, chunks_per_second)
+        """
+        chunks = iter_chunks(documents, max_tokens, overlap, workers=workers)
+        return self._ingest_chunks(chunks, batch_size, embed_concurrency, progress)
+
+    def ingest_files(self, paths, max_tokens=512, overlap=64, batch_size=256, extensions=DEFAULT_EXTENSIONS,
+                     encoding='utf-8', workers=1, embed_concurrency=2, progress=None):
+        """
+        파일과 디렉터리를 한 줄씩 읽어 청크로 나누고 배치 단위로 벡터 DB에 추가하는 메소드
+        :param paths: 파일 또는 디렉터리 경로, 또는 경로 리스트
+        :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+        :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+        :param batch_size: 한 번에 임베딩할 청크 수 (기본값: 256)
+        :param extensions: 디렉터리에서 읽을 파일 확장자 튜플 (기본값: ('.txt', '.md'))
+        :param encoding: 파일 인코딩 (기본값: 'utf-8')
+        :param workers: 파일 읽기와 청크 분할에 사용할 프로세스 수 (기본값: 1, 현재 프로세스에서 처리)
+        :param embed_concurrency: 동시에 진행할 임베딩 배치 수 (기본값: 2)
+        :param progress: 배치마다 진행 상황 딕셔너리를 받아 호출되는 함수 (기본값: None)
+        :return: 진행 상황 딕셔너리 (sources, chunks, tokens, elapsed, chunks_per_second)
+        """
+        chunks = iter_file_chunks(paths, max_tokens, overlap, extensions, encoding, workers=workers)
+        return self._ingest_chunks(chunks, batch_size, embed_concurrency, progress)
+
+    def _ingest_chunks(self, chunks, batch_size, embed_concurrency, progress):
+        """
+        청크를 배치로 묶어 임베딩하고 벡터 DB에 추가하는 메소드
+        현재 스레드가 청크를 만드는 동안 임베딩 요청은 스레드 풀에서 진행되고,
+        완료된 배치는 들어온 순서대로 벡터 DB에 추가된다.
+        """
+        start_time = time.perf_counter()
+        stats = {'sources': 0, 'chunks': 0, 'tokens': 0, 'elapsed': 0.0, 'chunks_per_second': 0.0}
+        last_source = None
+        pending = deque()
+
+        def insert(texts, future):
+            ids = self.vector_db.add_documents(texts, np.asarray(future.result(), dtype=np.float32))
+            self._index_lexical(texts, ids)
+            stats['chunks'] += len(texts)
+            stats['tokens'] += sum(count_tokens(text) for text in texts)
+            stats['elapsed'] = time.perf_counter() - start_time
+            stats['chunks_per_second'] = stats['chunks'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            logger.debug(f"Ingested {stats['chunks']} chunks from {stats['sources']} sources")
+            if progress is not None:
+                progress(dict(stats))
+
+        with ThreadPoolExecutor(max_workers=max(embed_concurrency, 1)) as executor:
+            for batch in batched(chunks, batch_size):
+                texts = []
+                for source, chunk in batch:
+                    if source != last_source:
+                        stats['sources'] += 1
+                        last_source = source
+                    texts.append(chunk)
+                pending.append((texts, executor.submit(self.embedding_model.embed, texts)))
+                if len(pending) >= max(embed_concurrency, 1):
+                    insert(*pending.popleft())
+            while pending:
+                insert(*pending.popleft())
+        return stats
+
+    def sync_documents(self, documents, ids, batch_size=256):
+        """
+        문서 집합을 벡터 DB와 동기화하는 메소드
+        문서 ID마다 내용 해시를 저장해 두고, 새 문서와 내용이 바뀐 문서만 임베딩해 upsert하며
+        documents에 없는 ID는 벡터 DB에서 삭제한다.
+        :param documents: 문서 리스트
+        :param ids: 문서에 해당하는 ID 리스트
+        :param batch_size: 한 번에 임베딩할 문서 수 (기본값: 256)
+        :return: 처리 결과 딕셔너리 (added, updated, deleted, unchanged)
+        """
+        documents = list(documents)
+        ids = list(ids)
+        if len(documents) != len(ids):
+            raise ValueError(f"Expected {len(documents)} ids, got {len(ids)}.")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in input.")
+
+        stored = self.vector_db.get_content_hashes()
+        hashes = [content_hash(document) for document in documents]
+        changed = [i for i, (document_id, digest) in enumerate(zip(ids, hashes)) if stored.get(document_id) != digest]
+        incoming = set(ids)
+        removed = [document_id for document_id in stored if document_id not in incoming]
+
+        for batch in batched(changed, batch_size):
+            texts = [documents[i] for i in batch]
+            embeddings = np.asarray(self.embedding_model.embed(texts), dtype=np.float32)
+            self.vector_db.upsert_documents(texts, embeddings, [ids[i] for i in batch], [hashes[i] for i in batch])
+            self._index_lexical(texts, [ids[i] for i in batch])
+        if removed:
+            self.vector_db.delete_documents(removed)
+            if self.lexical_index is not None:
+                for document_id in removed:
+                    self.lexical_index.delete_document(document_id)
+
+        updated = [ids[i] for i in changed if ids[i] in stored]
+        if self.answer_cache is not None and (updated or removed):
+            self.answer_cache.invalidate(updated + removed)
+        return {
+            'added': len(changed) - len(updated),
+            'updated': len(updated),
+            'deleted': len(removed),
+            'unchanged': len(ids) - len(changed)
+        }
 
     def update_document(self, document_id, document):
         """
@@ -58,6 +282,10 @@ class RAGPipeline:
         """
         embedding = self.embedding_model.embed([document])[0]
         self.vector_db.update_document(document_id, document, embedding)
+        if self.lexical_index is not None:
+            self.lexical_index.update_document(document_id, document)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate([document_id])
 
     def delete_document(self, document_id):
         """
@@ -65,55 +293,454 @@ class RAGPipeline:
         :param document_id: 삭제할 문서의 ID
         """
         self.vector_db.delete_document(document_id)
+        if self.lexical_index is not None:
+            self.lexical_index.delete_document(document_id)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate([document_id])
 
-    def search_and_answer(self, query, k=1, threshold=None):
+    def search_batch(self, queries, k=1, threshold=None):
+        """
+        여러 쿼리를 한 번에 임베딩하고 검색하는 메소드
+        :param queries: 검색할 쿼리 리스트
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        if not queries:
+            return []
+        query_embeddings = np.array(self.embedding_model.embed(list(queries)))
+        return self.vector_db.search_batch(query_embeddings, k, threshold)
+
+    def tune_ef(self, queries, k=10, target_recall=0.95):
+        """
+        샘플 쿼리로 목표 recall@k를 만족하는 가장 작은 ef_search를 찾아 설정하는 메소드 (HNSWLib만 해당)
+        :param queries: 조정에 사용할 쿼리 리스트 (인덱스에 없는 실제 질문 샘플)
+        :param k: recall을 계산할 검색 개수 (기본값: 10)
+        :param target_recall: 목표 recall@k (기본값: 0.95)
+        :return: 결과 딕셔너리 (ef, recall, latency, trials)
+        """
+        if not hasattr(self.vector_db, 'tune_ef'):
+            raise ValueError(f"{type(self.vector_db).__name__} does not support ef tuning.")
+        query_embeddings = np.asarray(self.embedding_model.embed(list(queries)), dtype=np.float32)
+        return self.vector_db.tune_ef(query_embeddings, k, target_recall)
+
+    def save(self, path=None):
+        """
+        벡터 DB 인덱스를 파일로 저장하는 메소드 (save를 지원하는 벡터 DB만 해당)
+        lexical_index가 있으면 path + '.bm25' 파일에 함께 저장한다.
+        :param path: 인덱스 파일 경로 (기본값: None, 파이프라인 생성 시 지정한 index_path)
+        """
+        path = path or self.index_path
+        if path is None:
+            return
+        if not hasattr(self.vector_db, 'save'):
+            raise ValueError(f"{type(self.vector_db).__name__} does not support saving to a file.")
+        self.vector_db.save(path)
+        if self.lexical_index is not None:
+            self.lexical_index.save(f"{path}.bm25")
+
+    def search_and_answer(self, query, k=1, threshold=None, stream=False, where=None):
         """
         쿼리를 검색하고 관련 문서를 사용하여 답변을 생성하는 메소드
+        결과에는 단계별 소요 시간(embed, search, prompt, generate, total, 초 단위), 토큰 수와
+        사용한 백엔드 이름이 함께 담긴다.
+        lexical_index가 있으면 키워드 검색 결과와 벡터 검색 결과를 Reciprocal Rank Fusion으로 합치고,
+        키워드 결과가 충분히 확실하면(BM25Index.confident) 쿼리 임베딩 없이 키워드 결과만으로 답한다.
+        reranker가 있으면 k * overfetch개의 후보를 검색해 다시 정렬한 뒤 상위 k개만 컨텍스트로 넘긴다.
+        (검색 -> 리랭킹 -> 컨텍스트 예산 -> 생성 순서)
+        where가 있으면 메타데이터 조건에 맞는 문서만 벡터 검색하며, 키워드 검색과 답변 캐시는 사용하지 않는다.
+        :param query: 검색할 쿼리
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값, 벡터 검색 결과에만 적용 (기본값: None)
+        :param stream: True이면 답변 대신 답변 조각을 내보내는 제너레이터를 'answer_stream'으로 반환 (기본값: False)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (HNSWLib, ChromaDB만 해당) (기본값: None)
+        :return: 검색 결과 딕셔너리 (query, relevant_docs, distances, document_ids, answer 또는 answer_stream,
+                 cache_hit, retrieval, timings, usage, backends, context_budgeter가 있으면 context)
+                 reranker가 있으면 timings에 rerank 단계가 추가된다.
+                 retrieval은 'vector', 'hybrid', 'lexical' 중 하나이며, 키워드 검색으로만 찾은 문서의 유사도는 None이다.
+        """
+        start_time = time.perf_counter()
+        lexical_hits = self._lexical_search(query, k) if where is None else None
+        lexical_done = time.perf_counter()
+        query_embedding = None
+        if self._lexical_fast_path(query, lexical_hits):
+            embed_done = lexical_done
+            results, retrieval = self._lexical_results(lexical_hits, k), 'lexical'
+            search_done = time.perf_counter()
+        else:
+            query_embedding = self.embedding_model.embed([query])[0]
+            embed_done = time.perf_counter()
+            cached = self.answer_cache.lookup(query_embedding, self._cache_params(k, threshold)) if self._uses_cache(where) else None
+            if cached is not None:
+                result = self._cached_result(query, cached, start_time, embed_done)
+                if stream:
+                    result['answer_stream'] = iter((result['answer'],))
+                return result
+            depth = self._candidate_depth(k, lexical_hits)
+            results = self._vector_search(query_embedding, depth, threshold, where)
+            results, retrieval = self._fuse(results, lexical_hits, depth)
+            search_done = time.perf_counter()
+            results = self._rerank(query_embedding, results, k)
+        rerank_done = time.perf_counter()
+        relevant_docs, distances, document_ids, report = self._build_context(results[:k])
+        prompt_done = time.perf_counter()
+
+        result = self._new_result(query, relevant_docs, distances, document_ids, report, retrieval,
+                                  [start_time, lexical_done, embed_done, search_done, rerank_done, prompt_done])
+        cache_key = (query_embedding, self._cache_params(k, threshold)) if self._uses_cache(where) and query_embedding is not None else None
+        if stream:
+            stream_tokens = self.query_model.generate_stream(query, relevant_docs)
+            result['answer_stream'] = self._timed_stream(stream_tokens, result, start_time, cache_key)
+        else:
+            answer = self.query_model.generate(query, relevant_docs)
+            self._finish_result(result, answer, start_time, cache_key)
+        return result
+
+    def _uses_cache(self, where):
+        # 조건부 검색의 답변은 다른 조건의 쿼리에 재사용하면 안 되므로 캐시하지 않는다
+        return self.answer_cache is not None and where is None
+
+    def _cache_params(self, k, threshold):
+        # 같은 쿼리라도 k, threshold, 키워드 결합/리랭킹 설정이 다르면 다른 문서와 답변이 나오므로 캐시 키에 포함한다
+        return (k, threshold, self.lexical_index is not None, self.rrf_k, self.reranker, self.overfetch, self.context_budgeter)
+
+    def _vector_search(self, query_embedding, k, threshold, where):
+        if where is None:
+            return self.vector_db.search_with_ids(query_embedding, k, threshold)
+        return self.vector_db.search_with_ids(query_embedding, k, threshold, where=where)
+
+    def _lexical_search(self, query, k):
+        """
+        키워드 검색 후보를 찾는 메소드
+        :return: (문서 ID, BM25 점수) 튜플 리스트 또는 lexical_index가 없으면 None
+        """
+        if self.lexical_index is None:
+            return None
+        return self.lexical_index.search(query, max(k * _HYBRID_OVERFETCH, self._candidate_depth(k)))
+
+    def _lexical_fast_path(self, query, lexical_hits):
+        return bool(lexical_hits) and self.lexical_index.confident(query, lexical_hits)
+
+    def _candidate_depth(self, k, lexical_hits=None):
+        """
+        리랭킹과 결과 합치기 전에 가져올 후보 수를 정하는 메소드
+        """
+        depth = k * self.overfetch if self.reranker is not None else k
+        if lexical_hits:
+            depth = max(depth, k * _HYBRID_OVERFETCH)
+        return depth
+
+    def _rerank(self, query_embedding, results, k):
+        """
+        reranker로 후보를 다시 정렬해 상위 k개를 고르는 메소드 (reranker가 없으면 앞에서 k개)
+        :param query_embedding: 쿼리의 임베딩
+        :param results: (문서 ID, 문서, 유사도) 튜플 리스트
+        :param k: 반환할 문서 수
+        :return: (문서 ID, 문서, 유사도) 튜플 리스트
+        """
+        if self.reranker is None or not results:
+            return results[:k]
+        embeddings = None
+        if getattr(self.reranker, 'uses_embeddings', True):
+            embeddings = self.vector_db.get_embeddings([document_id for document_id, _, _ in results])
+        return self.reranker.rerank(query_embedding, results, embeddings, k)
+
+    def _lexical_results(self, lexical_hits, k):
+        """
+        키워드 검색 결과를 (문서 ID, 문서, None) 튜플 리스트로 만드는 메소드
+        """
+        ids = [document_id for document_id, _ in lexical_hits[:k]]
+        documents = self.vector_db.get_documents(ids)
+        return [(document_id, document, None) for document_id, document in zip(ids, documents) if document is not None]
+
+    def _fuse(self, results, lexical_hits, k):
+        """
+        벡터 검색 결과와 키워드 검색 결과를 Reciprocal Rank Fusion으로 합치는 메소드
+        :param results: 벡터 검색의 (문서 ID, 문서, 유사도) 튜플 리스트
+        :param lexical_hits: 키워드 검색의 (문서 ID, BM25 점수) 튜플 리스트 또는 None
+        :param k: 반환할 최대 후보 수
+        :return: ((문서 ID, 문서, 유사도) 튜플 리스트, 검색 방식) 튜플
+        """
+        if not lexical_hits:
+            return results[:k], 'vector'
+        by_id = {document_id: (document, distance) for document_id, document, distance in results}
+        fused = reciprocal_rank_fusion([list(by_id), [document_id for document_id, _ in lexical_hits]], self.rrf_k, k)
+        missing = [document_id for document_id, _ in fused if document_id not in by_id]
+        if missing:
+            by_id.update((document_id, (document, None))
+                         for document_id, document in zip(missing, self.vector_db.get_documents(missing)) if document is not None)
+        return [(document_id,) + by_id[document_id] for document_id, _ in fused if document_id in by_id], 'hybrid'
+
+    def _build_context(self, results):
+        """
+        검색 결과를 질의 모델에 넘길 관련 문서와 유사도로 정리하는 메소드 (prompt 단계)
+        context_budgeter가 있으면 중복 제거와 토큰 예산 적용을 거친다.
+        :param results: (문서 ID, 문서, 유사도) 튜플의 리스트
+        :return: (관련 문서 튜플, 유사도 튜플, 문서 ID 튜플, 컨텍스트 보고서 또는 None)
+        """
+        report = None
+        if self.context_budgeter is not None:
+            results, report = self.context_budgeter.pack(results)
+        document_ids = tuple(document_id for document_id, _, _ in results)
+        relevant_docs = tuple(document for _, document, _ in results)
+        distances = tuple(distance for _, _, distance in results)
+        return relevant_docs, distances, document_ids, report
+
+    def _new_result(self, query, relevant_docs, distances, document_ids, report, retrieval, checkpoints):
+        # 키워드 검색 시간은 search 단계에 포함한다
+        start_time, lexical_done, embed_done, search_done, rerank_done, prompt_done = checkpoints
+        result = {
+            'query': query,
+            'relevant_docs': relevant_docs,
+            'distances': distances,
+            'document_ids': document_ids,
+            'cache_hit': False,
+            'retrieval': retrieval,
+            'timings': {
+                'embed': embed_done - lexical_done,
+                'search': (lexical_done - start_time) + (search_done - embed_done),
+                'prompt': prompt_done - rerank_done
+            },
+            'backends': {
+                'embedding_model': _backend_name(self.embedding_model),
+                'query_model': _backend_name(self.query_model),
+                'vector_db': _backend_name(self.vector_db)
+            }
+        }
+        if self.reranker is not None:
+            result['timings']['rerank'] = rerank_done - search_done
+        if report is not None:
+            result['context'] = report
+        return result
+
+    def _cached_result(self, query, cached, start_time, embed_done):
+        cached_result, similarity = cached
+        now = time.perf_counter()
+        return {
+            'query': query,
+            'relevant_docs': cached_result['relevant_docs'],
+            'distances': cached_result['distances'],
+            'document_ids': cached_result['document_ids'],
+            'answer': cached_result['answer'],
+            'cache_hit': True,
+            'cached_query': cached_result['query'],
+            'cache_similarity': similarity,
+            'timings': {
+                'embed': embed_done - start_time,
+                'cache': now - embed_done,
+                'total': now - start_time
+            },
+            'usage': {
+                'embedding_tokens': count_tokens(query),
+                'prompt_tokens': 0,
+                'completion_tokens': 0,
+                'estimated': False
+            },
+            'backends': {
+                'embedding_model': _backend_name(self.embedding_model),
+                'query_model': _backend_name(self.query_model),
+                'vector_db': _backend_name(self.vector_db)
+            }
+        }
+
+    def _finish_result(self, result, answer, start_time, cache_key=None):
+        """
+        생성 단계가 끝난 뒤 답변, 소요 시간과 토큰 수를 결과에 기록하는 메소드
+        답변 캐시가 있으면 결과를 캐시에 저장한다.
+        :param result: 검색 결과 딕셔너리
+        :param answer: 생성된 답변
+        :param start_time: 검색을 시작한 시각 (time.perf_counter)
+        :param cache_key: 답변 캐시에 저장할 (쿼리 임베딩, 검색 설정) 튜플 (기본값: None, 저장 안 함)
+        """
+        timings = result['timings']
+        generate_start = start_time + sum(timings.get(stage, 0.0) for stage in ('embed', 'search', 'rerank', 'prompt'))
+        now = time.perf_counter()
+        timings['generate'] = now - generate_start
+        timings['total'] = now - start_time
+        result['answer'] = answer
+        result['usage'] = self._usage(result['query'], result['relevant_docs'], answer)
+        logger.debug(f"search_and_answer timings: {timings}")
+        if self.answer_cache is not None and cache_key is not None:
+            cached_result = {key: result[key] for key in ('query', 'relevant_docs', 'distances', 'document_ids', 'answer')}
+            query_embedding, params = cache_key
+            self.answer_cache.put(query_embedding, cached_result, result['document_ids'], params)
+
+    def _usage(self, query, relevant_docs, answer):
+        """
+        토큰 수를 계산하는 메소드
+        질의 모델이 API 사용량을 알려주면 그 값을, 아니면 count_tokens 근사값을 사용한다.
+        """
+        usage = {
+            'embedding_tokens': count_tokens(query),
+            'prompt_tokens': count_tokens(query) + sum(count_tokens(document) for document in relevant_docs),
+            'completion_tokens': count_tokens(answer) if isinstance(answer, str) else 0,
+            'estimated': True
+        }
+        reported = self.query_model.get_last_usage() if isinstance(self.query_model, QueryModel) else None
+        if reported is not None:
+            usage['prompt_tokens'] = reported['prompt_tokens']
+            usage['completion_tokens'] = reported['completion_tokens']
+            usage['estimated'] = False
+        return usage
+
+    def _timed_stream(self, stream_tokens, result, start_time, cache_key):
+        tokens = []
+        for token in stream_tokens:
+            if not tokens:
+                result['timings']['first_token'] = time.perf_counter() - start_time
+            tokens.append(token)
+            yield token
+        self._finish_result(result, ''.join(tokens), start_time, cache_key)
+
+
+# 비동기 RAG 파이프라인 클래스
+class AsyncRAGPipeline(RAGPipeline):
+    def __init__(self, embedding_model, query_model, vector_db, similarity='cosine', search_workers=4, **kwargs):
+        """
+        비동기 RAG 파이프라인 초기화
+        임베딩과 답변 생성은 모델의 aembed/agenerate로 기다리고, 벡터 검색은 스레드 풀에서 실행하여
+        이벤트 루프를 막지 않는다.
+        :param embedding_model: 임베딩 모델
+        :param query_model: 질의 모델
+        :param vector_db: 벡터 DB 이름 또는 인스턴스
+        :param similarity: 유사도 측정 방식 (기본값: 'cosine')
+        :param search_workers: 벡터 검색에 사용할 스레드 수 (기본값: 4)
+        :param **kwargs: 벡터 DB 초기화에 사용되는 추가 인자
+        """
+        super().__init__(embedding_model, query_model, vector_db, similarity, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix='bombay-search')
+
+    async def aadd_documents(self, documents):
+        """
+        문서를 비동기로 RAG 파이프라인에 추가하는 메소드
+        :param documents: 추가할 문서 리스트
+        :return: 추가된 문서의 ID 리스트
+        """
+        embeddings = await self.embedding_model.aembed(documents)
+        loop = asyncio.get_running_loop()
+        ids = await loop.run_in_executor(self.executor, self.vector_db.add_documents, documents, np.array(embeddings))
+        self._index_lexical(documents, ids)
+        return ids
+
+    async def asearch_and_answer(self, query, k=1, threshold=None, stream=False, where=None):
+        """
+        쿼리를 비동기로 검색하고 관련 문서를 사용하여 답변을 생성하는 메소드
         :param query: 검색할 쿼리
         :param k: 검색할 문서의 개수 (기본값: 1)
         :param threshold: 유사도 임계값 (기본값: None)
-        :return: (쿼리, 관련 문서, 유사도, 답변)
-        튜플
+        :param stream: True이면 답변 대신 답변 조각을 내보내는 비동기 제너레이터를 'answer_stream'으로 반환 (기본값: False)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+        :return: 검색 결과 딕셔너리 (search_and_answer와 같은 구성)
         """
+        start_time = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        lexical_hits = None
+        if self.lexical_index is not None and where is None:
+            lexical_hits = await loop.run_in_executor(self.executor, self._lexical_search, query, k)
+        lexical_done = time.perf_counter()
+        query_embedding = None
+        if self._lexical_fast_path(query, lexical_hits):
+            embed_done = lexical_done
+            results = await loop.run_in_executor(self.executor, self._lexical_results, lexical_hits, k)
+            retrieval = 'lexical'
+            search_done = time.perf_counter()
+        else:
+            query_embedding = (await self.embedding_model.aembed([query]))[0]
+            embed_done = time.perf_counter()
+            cached = self.answer_cache.lookup(query_embedding, self._cache_params(k, threshold)) if self._uses_cache(where) else None
+            if cached is not None:
+                result = self._cached_result(query, cached, start_time, embed_done)
+                if stream:
+                    result['answer_stream'] = _single_token_stream(result['answer'])
+                return result
+            depth = self._candidate_depth(k, lexical_hits)
+            results = await loop.run_in_executor(self.executor, self._vector_search, query_embedding,
+                                                 depth, threshold, where)
+            results, retrieval = await loop.run_in_executor(self.executor, self._fuse, results, lexical_hits, depth)
+            search_done = time.perf_counter()
+            if self.reranker is not None:
+                results = await loop.run_in_executor(self.executor, self._rerank, query_embedding, results, k)
+        rerank_done = time.perf_counter()
+        relevant_docs, distances, document_ids, report = self._build_context(results[:k])
+        prompt_done = time.perf_counter()
+
+        result = self._new_result(query, relevant_docs, distances, document_ids, report, retrieval,
+                                  [start_time, lexical_done, embed_done, search_done, rerank_done, prompt_done])
+        cache_key = (query_embedding, self._cache_params(k, threshold)) if self._uses_cache(where) and query_embedding is not None else None
+        if stream:
+            stream_tokens = self.query_model.agenerate_stream(query, relevant_docs)
+            result['answer_stream'] = self._atimed_stream(stream_tokens, result, start_time, cache_key)
+        else:
+            answer = await self.query_model.agenerate(query, relevant_docs)
+            self._finish_result(result, answer, start_time, cache_key)
+        return result
+
+    async def _atimed_stream(self, stream_tokens, result, start_time, cache_key):
+        tokens = []
+        async for token in stream_tokens:
+            if not tokens:
+                result['timings']['first_token'] = time.perf_counter() - start_time
+            tokens.append(token)
+            yield token
+        self._finish_result(result, ''.join(tokens), start_time, cache_key)
+
+    def close(self):
+        """
+        검색 스레드 풀을 종료하는 메소드
+        """
+        self.executor.shutdown(wait=False)
 
 
+# 기본 제공 OpenAI 모델 팩토리 (로컬 모델은 bombay/plugins/custom_models.py에서 등록)
+register_embedding_model('openai', lambda api_key, model='text-embedding-ada-002', **options: OpenAIEmbedding(api_key, model, **options))
+register_query_model('gpt-3', lambda api_key, model='gpt-3.5-turbo': OpenAIQuery(api_key, model))
 
 
 # RAG 파이프라인 생성 함수
-def create_pipeline(embedding_model_name, query_model_name, vector_db, api_key, similarity='cosine', use_persistent_storage=False, **kwargs):
+def create_pipeline(embedding_model_name, query_model_name, vector_db, api_key=None, similarity='cosine', use_persistent_storage=False, embedding_cache_path=None, use_async=False, config_path=None,
+                    embedding_model_options=None, query_model_options=None, **kwargs):
     """
     RAG 파이프라인을 생성하는 함수
+    모델 이름은 bombay.plugins의 모델 레지스트리에서 찾는다 ('openai', 'gpt-3', 로컬 모델 'hashing', 'extractive',
+    register_embedding_model/register_query_model로 등록한 모델과 'bombay.embedding_models'/'bombay.query_models' entry point).
     :param embedding_model_name: 임베딩 모델 이름
     :param query_model_name: 질의 모델 이름
     :param vector_db: 벡터 DB 이름 또는 인스턴스
-    :param api_key: OpenAI API 키
+    :param api_key: OpenAI API 키 (로컬 모델만 사용하면 필요 없음, 기본값: None)
     :param similarity: 유사도 측정 방식 (기본값: 'cosine')
     :param use_persistent_storage: 영구 저장소 사용 여부 (기본값: False)
-    :param **kwargs: 벡터 DB 초기화에 사용되는 추가 인자
+    :param embedding_cache_path: 임베딩 캐시 SQLite 파일 경로 (기본값: None, 캐시 사용 안 함)
+    :param use_async: 비동기 메소드를 제공하는 AsyncRAGPipeline 생성 여부 (기본값: False)
+    :param config_path: 설정 파일 경로 (기본값: None, 패키지의 bombay/config.yaml)
+    :param embedding_model_options: 임베딩 모델 팩토리에 넘길 인자 딕셔너리 (예: {'model': 'text-embedding-3-small'}, {'dim': 256})
+    :param query_model_options: 질의 모델 팩토리에 넘길 인자 딕셔너리 (예: {'model': 'gpt-4o-mini'}, {'max_sentences': 3})
+    :param **kwargs: 벡터 DB 초기화에 사용되는 추가 인자 (index_path: HNSWLib 인덱스 파일 경로, 있으면 불러옴,
+                     M, ef_construction, ef_search, num_threads, growth_factor: HNSWLib 파라미터로 설정 파일 값보다 우선,
+                     storage_dtype: NumpyFlatDB 저장 자료형, num_shards, shard_backend: ShardedVectorDB 샤드 수와 샤드 벡터 DB,
+                     nlist, m, nprobe, rerank, train_size, kmeans_iterations, vectors_path: IVFPQDB 파라미터, answer_cache: AnswerCache 인스턴스,
+                     context_budgeter: ContextBudgeter 인스턴스, lexical_index: BM25Index 인스턴스, rrf_k: RRF 상수,
+                     reranker: Reranker 인스턴스, overfetch: 리랭킹 후보 배수)
     :return: 생성된 RAG 파이프라인
     """
-    embedding_models = {
-        'openai': OpenAIEmbedding(api_key, 'text-embedding-ada-002')
-    }
-    query_models = {
-        'gpt-3': OpenAIQuery(api_key, 'gpt-3.5-turbo')
-    }
-
-    embedding_model = embedding_models.get(embedding_model_name)
-    query_model = query_models.get(query_model_name)
+    # 선택한 모델의 클라이언트만 만들도록 레지스트리에는 팩토리가 등록되어 있다
+    embedding_model = create_embedding_model(embedding_model_name, api_key, **(embedding_model_options or {}))
+    query_model = create_query_model(query_model_name, api_key, **(query_model_options or {}))
 
-    if embedding_model is None:
-        raise ValueError(f"Unsupported embedding model: {embedding_model_name}")
-    if query_model is None:
-        raise ValueError(f"Unsupported query model: {query_model_name}")
+    if embedding_cache_path is not None:
+        embedding_model = CachedEmbedding(embedding_model, embedding_cache_path)
 
+    pipeline_class = AsyncRAGPipeline if use_async else RAGPipeline
+    if isinstance(vector_db, str) and vector_db.lower() == 'hnswlib':
+        config = Config(config_path) if config_path else Config()
+        for key, value in (config.get('hnswlib') or {}).items():
+            kwargs.setdefault(key, value)
     if isinstance(vector_db, str) and vector_db.lower() == 'chromadb':
-        return RAGPipeline(embedding_model, query_model, vector_db, similarity, use_persistent_storage=use_persistent_storage, **kwargs)
+        return pipeline_class(embedding_model, query_model, vector_db, similarity, use_persistent_storage=use_persistent_storage, **kwargs)
     else:
-        return RAGPipeline(embedding_model, query_model, vector_db, similarity, **kwargs)
+        return pipeline_class(embedding_model, query_model, vector_db, similarity, **kwargs)
 
 # RAG 파이프라인 실행 함수
-def run_pipeline(pipeline, documents, query, k=1, threshold=None):
+def run_pipeline(pipeline, documents, query, k=1, threshold=None, stream=False, where=None):
     """
     RAG 파이프라인을 실행하는 함수
     :param pipeline: RAG 파이프라인 인스턴스
@@ -121,14 +748,19 @@ def run_pipeline(pipeline, documents, query, k=1, threshold=None):
     :param query: 사용자 쿼리
     :param k: 검색할 문서의 개수 (기본값: 1)
     :param threshold: 유사도 임계값 (기본값: None)
-    :return: 검색 결과 (쿼리, 관련 문서, 유사도, 답변)
+    :param stream: True이면 답변 대신 답변 조각을 내보내는 제너레이터를 'answer_stream'으로 반환 (기본값: False)
+    :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+    :return: 검색 결과 딕셔너리 (RAGPipeline.search_and_answer 참고)
     """
-    query_embedding = pipeline.embedding_model.embed([query])[0]
-    relevant_docs, distances = zip(*pipeline.vector_db.search(query_embedding, k, threshold))
-    answer = pipeline.query_model.generate(query, relevant_docs)
-    return {
-        'query': query,
-        'relevant_docs': relevant_docs,
-        'distances': distances,
-        'answer': answer
-    }
\ No newline at end of file
+    return pipeline.search_and_answer(query, k, threshold, stream=stream, where=where)
+
+
+async def _single_token_stream(answer):
+    yield answer
+
+
+def _backend_name(component):
+    model = getattr(component, 'model', None)
+    if isinstance(model, str):
+        return f"{type(component).__name__}:{model}"
+    return type(component).__name__
@@ -0,0 +1,455 @@
+#bombay/pipeline/sharded.py
+import heapq
+import multiprocessing
+import threading
+import weakref
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from itertools import islice
+import numpy as np
+from .vector_db import VectorDB, HNSWLib, NumpyFlatDB
+from .storage import write_sidecar, read_sidecar
+
+# 샤드로 사용할 수 있는 벡터 DB
+SHARD_BACKENDS = {
+    'hnswlib': HNSWLib,
+    'numpy': NumpyFlatDB
+}
+
+
+def shard_of(document_id, num_shards):
+    """
+    문서 ID가 속한 샤드 번호를 반환하는 함수
+    str의 hash()는 프로세스마다 달라지므로 정수 ID는 나머지, 그 외에는 CRC32를 사용한다.
+    :param document_id: 문서 ID
+    :param num_shards: 샤드 수
+    :return: 샤드 번호
+    """
+    if isinstance(document_id, (int, np.integer)):
+        return int(document_id) % num_shards
+    return zlib.crc32(str(document_id).encode('utf-8')) % num_shards
+
+
+def _shard_worker(conn, backend, dim, similarity, params, path):
+    """
+    샤드 하나를 소유하고 부모 프로세스의 (메소드 이름, 인자, 키워드 인자) 요청을 처리하는 워커 프로세스 함수
+    """
+    try:
+        db_class = SHARD_BACKENDS[backend]
+        if path is None:
+            db = db_class(dim, similarity=similarity, **params)
+        else:
+            load_params = {key: params[key] for key in ('num_threads', 'ef_search') if key in params}
+            db = db_class.load(path, **load_params)
+    except Exception as e:
+        conn.send((False, e))
+        return
+    conn.send((True, None))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        method, args, kwargs = request
+        try:
+            reply = (True, getattr(db, method)(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # 피클할 수 없는 예외는 메시지만 전달한다
+            conn.send((False, RuntimeError(f"{type(reply[1]).__name__}: {reply[1]} ({e})")))
+
+
+def _shutdown(processes, connections):
+    for conn in connections:
+        try:
+            conn.send(None)
+        except (OSError, ValueError):
+            pass
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+    for conn in connections:
+        conn.close()
+
+
+# 여러 프로세스에 문서를 나눠 저장하는 샤딩 벡터 DB
+class ShardedVectorDB(VectorDB):
+    def __init__(self, dim=None, num_shards=None, backend='hnswlib', similarity='cosine', start_method='spawn', **params):
+        """
+        문서를 ID 해시로 나눠 샤드마다 워커 프로세스 하나가 HNSWLib 또는 NumpyFlatDB를 소유하는 벡터 DB 초기화
+        검색은 모든 샤드에 동시에 보내고(scatter) 샤드별 상위 k개를 힙으로 병합(gather)하므로
+        인덱스 용량과 구축/검색 처리량이 코어 수에 맞춰 늘어난다.
+        :param dim: 벡터의 차원 (기본값: None, 첫 문서를 추가할 때 정함)
+        :param num_shards: 샤드(워커 프로세스) 수 (기본값: None, CPU 코어 수)
+        :param backend: 샤드 벡터 DB ('hnswlib', 'numpy') (기본값: 'hnswlib')
+        :param similarity: 유사도 측정 방식 (기본값: 'cosine')
+        :param start_method: multiprocessing 시작 방식 (기본값: 'spawn')
+        :param **params: 샤드 벡터 DB 생성 인자 (HNSWLib은 num_threads를 지정하지 않으면 샤드당 1 스레드)
+        """
+        super().__init__()
+        if backend not in SHARD_BACKENDS:
+            raise ValueError(f"Unsupported shard backend: {backend}")
+        self.num_shards = num_shards or multiprocessing.cpu_count()
+        self.backend = backend
+        self.dim = dim
+        self.similarity = similarity
+        if backend == 'hnswlib':
+            # 샤드 프로세스끼리 코어를 나눠 쓰므로 샤드 안에서는 스레드를 늘리지 않는다
+            params.setdefault('num_threads', 1)
+        self.params = params
+        self.next_id = 0
+        self._start(start_method, paths=[None] * self.num_shards)
+
+    def _start(self, start_method, paths):
+        self.start_method = start_method
+        context = multiprocessing.get_context(start_method)
+        # 쓰기는 하나씩 처리하고, 검색은 샤드 파이프에 요청을 이어 보내 다른 요청의 응답을 기다리지 않는다
+        self._write_lock = threading.Lock()
+        self._send_locks = [threading.Lock() for _ in paths]
+        self._recv_locks = [threading.Lock() for _ in paths]
+        self._pending = [deque() for _ in paths]
+        self._connections = []
+        self._processes = []
+        for path in paths:
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_worker, daemon=True,
+                                      args=(child_conn, self.backend, self.dim, self.similarity, self.params, path))
+            process.start()
+            child_conn.close()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+        self._finalizer = weakref.finalize(self, _shutdown, self._processes, self._connections)
+        for conn in self._connections:
+            self._receive(conn)
+
+    def close(self):
+        """
+        워커 프로세스를 종료하는 메소드
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(self._broadcast('__len__'))
+
+    @staticmethod
+    def _receive(conn):
+        ok, result = conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def _send(self, shard, request):
+        future = Future()
+        with self._send_locks[shard]:
+            # 워커는 요청을 받은 순서대로 응답하므로 보내기 전에 대기열에 넣어 응답과 순서를 맞춘다
+            self._pending[shard].append(future)
+            try:
+                self._connections[shard].send(request)
+            except BaseException:
+                self._pending[shard].pop()
+                raise
+        return future
+
+    def _wait(self, shard, future):
+        # 응답을 받는 스레드가 대기열 맨 앞의 요청에 결과를 채우므로 다른 스레드의 응답도 대신 받아 준다
+        while not future.done():
+            with self._recv_locks[shard]:
+                if future.done():
+                    break
+                reply = self._connections[shard].recv()
+                self._pending[shard].popleft().set_result(reply)
+        ok, result = future.result()
+        if not ok:
+            raise result
+        return result
+
+    def _scatter(self, requests):
+        """
+        샤드 번호 -> (메소드 이름, 인자, 키워드 인자) 요청을 동시에 보내고 응답을 모으는 메소드
+        :return: 샤드 번호 -> 결과 딕셔너리
+        """
+        futures = {shard: self._send(shard, request) for shard, request in requests.items()}
+        # 모든 샤드의 응답을 받은 뒤 첫 오류를 다시 일으킨다
+        results, error = {}, None
+        for shard, future in futures.items():
+            try:
+                results[shard] = self._wait(shard, future)
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return results
+
+    def _broadcast(self, method, *args, **kwargs):
+        results = self._scatter({shard: (method, args, kwargs) for shard in range(self.num_shards)})
+        return [results[shard] for shard in range(self.num_shards)]
+
+    def _group(self, ids):
+        """
+        문서 ID 위치를 샤드별로 묶는 메소드
+        :return: 샤드 번호 -> 위치 리스트 딕셔너리
+        """
+        groups = {}
+        for i, document_id in enumerate(ids):
+            groups.setdefault(shard_of(document_id, self.num_shards), []).append(i)
+        return groups
+
+    def _assign_ids(self, count, ids):
+        if ids is None:
+            return list(range(self.next_id, self.next_id + count))
+        ids = list(ids)
+        if len(ids) != count:
+            raise ValueError(f"Expected {count} ids, got {len(ids)}.")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in input.")
+        return ids
+
+    def _advance_next_id(self, ids):
+        for document_id in ids:
+            if isinstance(document_id, (int, np.integer)) and document_id >= self.next_id:
+                self.next_id = int(document_id) + 1
+
+    def _scatter_documents(self, method, documents, embeddings, ids, extra=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        requests = {}
+        for shard, positions in self._group(ids).items():
+            kwargs = {key: [values[i] for i in positions] for key, values in (extra or {}).items() if values is not None}
+            requests[shard] = (method, ([documents[i] for i in positions], embeddings[positions], [ids[i] for i in positions]), kwargs)
+        return self._scatter(requests)
+
+    def add_documents(self, documents, embeddings, ids=None, metadatas=None):
+        """
+        문서를 ID 해시에 따라 샤드에 나눠 추가하는 메소드
+        :param documents: 추가할 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트 (기본값: None, 자동 증가 정수 ID 사용)
+        :param metadatas: 문서 메타데이터 딕셔너리 리스트 (기본값: None, HNSWLib 샤드만 지원)
+        :return: 추가된 문서의 ID 리스트
+        """
+        if not documents:
+            return []
+        with self._write_lock:
+            given = ids is not None
+            ids = self._assign_ids(len(documents), ids)
+            # 한 샤드에서만 실패해 나머지 샤드에 일부 문서가 추가되지 않도록 보내기 전에 기존 ID를 확인한다
+            # (자동 ID는 next_id가 지금까지의 정수 ID보다 크므로 확인하지 않는다)
+            if given:
+                for document_id, exists in zip(ids, self._gather_by_id('has_ids', ids)):
+                    if exists:
+                        raise ValueError(f"Document with id {document_id} already exists.")
+            self._scatter_documents('add_documents', documents, embeddings, ids, {'metadatas': metadatas})
+            self._advance_next_id(ids)
+            if self.dim is None:
+                self.dim = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1).shape[1]
+        return ids
+
+    def update_document(self, document_id, document, embedding, metadata=None):
+        """
+        문서를 업데이트하는 메소드
+        :param document_id: 업데이트할 문서의 ID
+        :param document: 새로운 문서
+        :param embedding: 새로운 문서의 임베딩
+        :param metadata: 새로운 메타데이터 (기본값: None, 기존 메타데이터 유지)
+        """
+        kwargs = {} if metadata is None else {'metadata': metadata}
+        shard = shard_of(document_id, self.num_shards)
+        with self._write_lock:
+            self._scatter({shard: ('update_document', (document_id, document, embedding), kwargs)})
+
+    def delete_document(self, document_id):
+        """
+        문서를 삭제하는 메소드
+        :param document_id: 삭제할 문서의 ID
+        """
+        shard = shard_of(document_id, self.num_shards)
+        with self._write_lock:
+            self._scatter({shard: ('delete_document', (document_id,), {})})
+
+    def delete_documents(self, ids):
+        """
+        여러 문서를 샤드별로 묶어 샤드마다 한 번의 요청으로 삭제하는 메소드
+        :param ids: 삭제할 문서 ID 리스트
+        """
+        ids = list(ids)
+        with self._write_lock:
+            self._scatter({
+                shard: ('delete_documents', ([ids[i] for i in positions],), {})
+                for shard, positions in self._group(ids).items()
+            })
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None, metadatas=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        :param metadatas: 문서 메타데이터 딕셔너리 리스트 (기본값: None)
+        """
+        with self._write_lock:
+            ids = self._assign_ids(len(documents), ids)
+            if ids:
+                self._scatter_documents('upsert_documents', documents, embeddings, ids,
+                                        {'content_hashes': content_hashes, 'metadatas': metadatas})
+                self._advance_next_id(ids)
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 내용 해시를 반환하는 메소드
+        :return: 문서 ID -> 내용 해시 딕셔너리
+        """
+        hashes = {}
+        for shard_hashes in self._broadcast('get_content_hashes'):
+            hashes.update(shard_hashes)
+        return hashes
+
+    def _gather_by_id(self, method, ids):
+        ids = list(ids)
+        groups = self._group(ids)
+        results = self._scatter({shard: (method, ([ids[i] for i in positions],), {}) for shard, positions in groups.items()})
+        ordered = [None] * len(ids)
+        for shard, positions in groups.items():
+            for i, value in zip(positions, results[shard]):
+                ordered[i] = value
+        return ordered
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        return self._gather_by_id('get_documents', ids)
+
+    def get_metadatas(self, ids):
+        """
+        문서 ID로 메타데이터를 조회하는 메소드 (HNSWLib 샤드만 지원)
+        :param ids: 문서 ID 리스트
+        :return: 메타데이터 딕셔너리 리스트
+        """
+        return self._gather_by_id('get_metadatas', ids)
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        rows = self._gather_by_id('get_embeddings', ids)
+        if not rows:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.vstack([np.asarray(row, dtype=np.float32) for row in rows])
+
+    def search(self, query_embedding, k=1, threshold=None, where=None):
+        """
+        모든 샤드에서 쿼리 임베딩과 유사한 문서를 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건, HNSWLib 샤드만 지원 (기본값: None)
+        :return: (문서, 유사도) 튜플의 리스트
+        """
+        return [(document, distance) for _, document, distance in self.search_with_ids(query_embedding, k, threshold, where)]
+
+    def search_batch(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        여러 쿼리 임베딩을 모든 샤드에서 한 번에 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [
+            [(document, distance) for _, document, distance in results]
+            for results in self.search_batch_with_ids(query_embeddings, k, threshold, where)
+        ]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None, where=None):
+        """
+        모든 샤드에서 쿼리 임베딩과 유사한 문서를 문서 ID와 함께 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch_with_ids([query_embedding], k, threshold, where)[0]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        쿼리 배치를 모든 샤드에 동시에 보내고, 거리순으로 정렬된 샤드별 상위 k개를 힙으로 병합하는 메소드
+        각 샤드는 자기 문서 중 상위 k개를 반환하므로 병합한 상위 k개는 단일 인덱스 검색 결과와 같다.
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        query_embeddings = query_embeddings.reshape(-1, self.dim or query_embeddings.shape[-1])
+        kwargs = {} if where is None else {'where': where}
+        shard_results = self._broadcast('search_batch_with_ids', query_embeddings, k, threshold, **kwargs)
+        return [
+            list(islice(heapq.merge(*rows, key=lambda result: result[2]), k))
+            for rows in zip(*shard_results)
+        ]
+
+    def set_ef(self, ef_search):
+        """
+        모든 HNSWLib 샤드의 검색 탐색 폭을 바꾸는 메소드
+        :param ef_search: 검색 시 탐색 폭
+        """
+        with self._write_lock:
+            self._broadcast('set_ef', ef_search)
+
+    def save(self, path):
+        """
+        샤드를 path + '.shard{번호}'에, 샤드 구성은 path + '.shards'에 저장하는 메소드 (HNSWLib 샤드만 지원)
+        :param path: 인덱스 파일 경로
+        """
+        with self._write_lock:
+            self._scatter({shard: ('save', (f"{path}.shard{shard}",), {}) for shard in range(self.num_shards)})
+        meta = {
+            'num_shards': self.num_shards,
+            'backend': self.backend,
+            'dim': self.dim,
+            'similarity': self.similarity,
+            'next_id': self.next_id,
+            'params': self.params
+        }
+        write_sidecar(f"{path}.shards", meta)
+
+    @classmethod
+    def load(cls, path, start_method='spawn', **params):
+        """
+        save로 저장한 샤드들을 워커 프로세스마다 불러오는 클래스 메소드
+        :param path: 인덱스 파일 경로
+        :param start_method: multiprocessing 시작 방식 (기본값: 'spawn')
+        :param **params: 저장할 때의 샤드 생성 인자 대신 사용할 값 (num_threads, ef_search)
+        :return: ShardedVectorDB 인스턴스
+        """
+        meta, _ = read_sidecar(f"{path}.shards")
+        db = cls.__new__(cls)
+        VectorDB.__init__(db)
+        db.num_shards = meta['num_shards']
+        db.backend = meta['backend']
+        db.dim = meta['dim']
+        db.similarity = meta['similarity']
+        db.next_id = meta['next_id']
+        db.params = dict(meta['params'], **params)
+        db._start(start_method, paths=[f"{path}.shard{shard}" for shard in range(db.num_shards)])
+        return db
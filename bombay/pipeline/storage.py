@@ -0,0 +1,140 @@
+# bombay/pipeline/storage.py
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+_MAGIC = b'BOMBAY01'
+_ALIGNMENT = 8
+
+
+def write_sidecar(path, meta, arrays=None, strings=None):
+    """
+    메타데이터와 배열을 하나의 바이너리 파일로 저장하는 함수
+    파일 구조: 매직 바이트 | 헤더 길이(uint32) | JSON 헤더 | 8바이트 정렬된 배열 섹션들
+    임시 파일에 먼저 쓰고 교체하므로 같은 경로를 mmap으로 열어둔 상태에서도 안전하다.
+    :param path: 저장할 파일 경로
+    :param meta: JSON으로 저장할 메타데이터 딕셔너리
+    :param arrays: 이름 -> numpy 배열 딕셔너리 (기본값: None)
+    :param strings: 이름 -> 문자열(또는 None) 리스트 딕셔너리 (기본값: None)
+    """
+    arrays = dict(arrays or {})
+    for name, values in (strings or {}).items():
+        arrays.update(_encode_strings(name, values))
+
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        sections[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += _aligned(array.nbytes)
+
+    header = json.dumps({'meta': meta, 'sections': sections}).encode('utf-8')
+    prefix = len(_MAGIC) + 4 + len(header)
+    padding = _aligned(prefix) - prefix
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * padding)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b'\0' * (_aligned(array.nbytes) - array.nbytes))
+    os.replace(tmp_path, path)
+
+
+def read_sidecar(path):
+    """
+    write_sidecar로 저장한 파일을 mmap으로 여는 함수
+    배열은 복사 없이 mmap 위의 읽기 전용 뷰로 반환된다.
+    :param path: 파일 경로
+    :return: (메타데이터, 이름 -> 배열 딕셔너리) 튜플
+    """
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(_MAGIC)] != _MAGIC:
+        buffer.close()
+        raise ValueError(f"{path} is not a bombay sidecar file.")
+    header_length = struct.unpack_from('<I', buffer, len(_MAGIC))[0]
+    header_start = len(_MAGIC) + 4
+    header = json.loads(buffer[header_start:header_start + header_length].decode('utf-8'))
+    data_start = _aligned(header_start + header_length)
+
+    arrays = {}
+    for name, section in header['sections'].items():
+        dtype = np.dtype(section['dtype'])
+        count = int(np.prod(section['shape'], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + section['offset'])
+        arrays[name] = array.reshape(section['shape'])
+    return header['meta'], arrays
+
+
+def _aligned(size):
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _encode_strings(name, values):
+    encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return {
+        f'{name}.offsets': offsets,
+        f'{name}.present': np.array([value is not None for value in values], dtype=np.uint8),
+        f'{name}.data': np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    }
+
+
+# mmap 기반 문자열 리스트
+class MmapStrings:
+    def __init__(self, arrays, name):
+        """
+        sidecar 파일에 저장된 문자열 리스트를 mmap 위에서 여는 클래스
+        저장된 문자열은 조회할 때마다 디코딩하고, 변경/추가된 항목만 메모리에 보관한다.
+        :param arrays: read_sidecar가 반환한 배열 딕셔너리
+        :param name: 문자열 섹션 이름
+        """
+        self._offsets = arrays[f'{name}.offsets']
+        self._present = arrays[f'{name}.present']
+        self._data = arrays[f'{name}.data']
+        self._base_length = len(self._present)
+        self._overrides = {}
+        self._appended = []
+
+    def __len__(self):
+        return self._base_length + len(self._appended)
+
+    def __getitem__(self, index):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index >= self._base_length:
+            return self._appended[index - self._base_length]
+        if index in self._overrides:
+            return self._overrides[index]
+        if not self._present[index]:
+            return None
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._data[start:end].tobytes().decode('utf-8')
+
+    def __setitem__(self, index, value):
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index >= self._base_length:
+            self._appended[index - self._base_length] = value
+        else:
+            self._overrides[index] = value
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def extend(self, values):
+        self._appended.extend(values)
+
+    def append(self, value):
+        self._appended.append(value)
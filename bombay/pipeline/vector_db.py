@@ -1,11 +1,18 @@
 #bombay/pipeline/vector_db.py
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 import numpy as np
-import hnswlib
-import chromadb
-from chromadb.config import Settings
 from uuid import uuid4
 import os
+import time
+from .storage import write_sidecar, read_sidecar, MmapStrings
+from ..utils.imports import lazy_import
+
+# 백엔드 라이브러리는 처음 사용할 때 불러온다
+hnswlib = lazy_import('hnswlib')
+chromadb = lazy_import('chromadb')
 
 class VectorDB(ABC):
     @abstractmethod
@@ -28,36 +35,858 @@ class VectorDB(ABC):
     def search(self, query_embedding, k=1, threshold=None):
         pass
 
+    def search_batch(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 한 번에 검색하는 메소드
+        기본 구현은 쿼리마다 search를 호출하므로 행렬 검색을 지원하는 벡터 DB는 재정의한다.
+        :param query_embeddings: 쿼리 임베딩 리스트
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [self.search(query_embedding, k, threshold) for query_embedding in query_embeddings]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None):
+        """
+        쿼리 임베딩과 유사한 문서를 문서 ID와 함께 검색하는 메소드
+        기본 구현은 문서 ID를 알 수 없으므로 ID 자리에 None을 넣는다.
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return [(None, document, distance) for document, distance in self.search(query_embedding, k, threshold)]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 문서 ID와 함께 한 번에 검색하는 메소드
+        기본 구현은 쿼리마다 search_with_ids를 호출한다.
+        :param query_embeddings: 쿼리 임베딩 리스트
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [self.search_with_ids(query_embedding, k, threshold) for query_embedding in query_embeddings]
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 내용 해시를 반환하는 메소드 (sync_documents에서 사용)
+        :return: 문서 ID -> 내용 해시 딕셔너리 (해시 없이 추가된 문서는 None)
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support content hashes.")
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support upserts.")
+
+    def delete_documents(self, ids):
+        """
+        여러 문서를 삭제하는 메소드
+        기본 구현은 문서마다 delete_document를 호출하므로 일괄 삭제를 지원하는 벡터 DB는 재정의한다.
+        :param ids: 삭제할 문서 ID 리스트
+        """
+        for document_id in ids:
+            self.delete_document(document_id)
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드 (키워드 검색 결과의 본문을 가져올 때 사용)
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support lookups by id.")
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드 (리랭커에서 사용)
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support embedding lookups.")
+
+def _apply_threshold(labels, distances, threshold):
+    """
+    행별 검색 결과에서 유사도 임계값을 넘는 항목을 제거하는 함수
+    :param labels: (쿼리 수 x k) label 배열
+    :param distances: (쿼리 수 x k) 거리 배열
+    :param threshold: 유사도 임계값 (None이면 그대로 반환)
+    :return: 쿼리별 (label 배열, 거리 배열) 튜플의 리스트
+    """
+    rows = []
+    for row_labels, row_distances in zip(labels, distances):
+        if threshold is not None:
+            mask = row_distances <= threshold
+            row_labels = row_labels[mask]
+            row_distances = row_distances[mask]
+        rows.append((row_labels, row_distances))
+    return rows
+
+
+def _partition_ids(id_map, ids):
+    """
+    ID 리스트를 새 문서와 이미 있는 문서의 위치로 나누는 함수
+    :param id_map: _LabelMap 인스턴스
+    :param ids: 문서 ID 리스트
+    :return: (새 문서 위치 리스트, 기존 문서 위치 리스트) 튜플
+    """
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate ids in input.")
+    new, existing = [], []
+    for i, document_id in enumerate(ids):
+        (existing if document_id in id_map else new).append(i)
+    return new, existing
+
+
+def _record_hashes(content_hashes, ids, hashes):
+    for document_id, content_hash in zip(ids, hashes if hashes is not None else [None] * len(ids)):
+        if content_hash is None:
+            content_hashes.pop(document_id, None)
+        else:
+            content_hashes[document_id] = content_hash
+
+
+# 문서 ID <-> label 매핑
+class _LabelMap:
+    def __init__(self):
+        """
+        문서 ID와 인덱스 내부 label 간의 양방향 매핑 초기화
+        삭제된 label은 tombstone으로 남겨두고 이후 추가 시 재사용한다.
+        """
+        self.label_to_id = []
+        self.id_to_label = {}
+        self.free_labels = []
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.id_to_label)
+
+    def __contains__(self, document_id):
+        return document_id in self.id_to_label
+
+    @property
+    def capacity(self):
+        """
+        지금까지 할당된 label의 개수 (tombstone 포함)
+        """
+        return len(self.label_to_id)
+
+    def assign(self, count, ids=None):
+        """
+        새 문서들에 ID와 label을 할당하는 메소드
+        :param count: 추가할 문서의 개수
+        :param ids: 문서 ID 리스트 (기본값: None, 자동 증가 정수 ID 사용)
+        :return: (문서 ID 리스트, label 리스트) 튜플
+        """
+        if ids is None:
+            ids = list(range(self.next_id, self.next_id + count))
+        else:
+            ids = list(ids)
+            if len(ids) != count:
+                raise ValueError(f"Expected {count} ids, got {len(ids)}.")
+            if len(set(ids)) != count:
+                raise ValueError("Duplicate ids in input.")
+            for document_id in ids:
+                if document_id in self.id_to_label:
+                    raise ValueError(f"Document with id {document_id} already exists.")
+        for document_id in ids:
+            if isinstance(document_id, (int, np.integer)) and document_id >= self.next_id:
+                self.next_id = int(document_id) + 1
+
+        reused = min(len(self.free_labels), count)
+        labels = [self.free_labels.pop() for _ in range(reused)]
+        labels.extend(range(len(self.label_to_id), len(self.label_to_id) + count - reused))
+        self.label_to_id.extend([None] * (count - reused))
+        for document_id, label in zip(ids, labels):
+            self.label_to_id[label] = document_id
+            self.id_to_label[document_id] = label
+        return ids, labels
+
+    def label(self, document_id):
+        """
+        문서 ID에 해당하는 label을 반환하는 메소드
+        :param document_id: 문서의 ID
+        :return: label
+        """
+        label = self.id_to_label.get(document_id)
+        if label is None:
+            raise ValueError(f"Document with id {document_id} not found.")
+        return label
+
+    def release(self, document_id):
+        """
+        문서 ID의 label을 해제하고 재사용 목록에 넣는 메소드
+        :param document_id: 삭제할 문서의 ID
+        :return: 해제된 label
+        """
+        label = self.label(document_id)
+        del self.id_to_label[document_id]
+        self.label_to_id[label] = None
+        self.free_labels.append(label)
+        return label
+
+
+def _encode_ids(id_map, documents, content_hashes):
+    """
+    문서, 문서 ID, 내용 해시를 sidecar 파일에 저장할 형태로 바꾸는 함수
+    :return: (ID 종류, 배열 딕셔너리, 문자열 딕셔너리) 튜플
+    """
+    label_to_id = id_map.label_to_id
+    live_ids = [document_id for document_id in label_to_id if document_id is not None]
+    if all(isinstance(document_id, (int, np.integer)) for document_id in live_ids):
+        id_kind = 'int'
+        arrays = {'ids': np.array([-1 if document_id is None else document_id for document_id in label_to_id], dtype='<i8')}
+        strings = {'documents': documents}
+    elif all(isinstance(document_id, str) for document_id in live_ids):
+        id_kind = 'str'
+        arrays = {}
+        strings = {'documents': documents, 'ids': label_to_id}
+    else:
+        raise ValueError("Document ids must be all integers or all strings to be saved.")
+    strings['hashes'] = [content_hashes.get(document_id) for document_id in label_to_id]
+    return id_kind, arrays, strings
+
+
+def _decode_ids(db, meta, arrays):
+    """
+    _encode_ids로 저장한 문서, ID 매핑, 내용 해시를 벡터 DB에 복원하는 함수 (문서는 mmap으로 연다)
+    """
+    db.documents = MmapStrings(arrays, 'documents')
+    if meta['id_kind'] == 'int':
+        present = arrays['documents.present'].astype(bool)
+        label_to_id = [None if not alive else document_id for document_id, alive in zip(arrays['ids'].tolist(), present)]
+    else:
+        label_to_id = list(MmapStrings(arrays, 'ids'))
+    id_map = db.id_map
+    id_map.label_to_id = label_to_id
+    id_map.id_to_label = {document_id: label for label, document_id in enumerate(label_to_id) if document_id is not None}
+    id_map.free_labels = [label for label, document_id in enumerate(label_to_id) if document_id is None]
+    id_map.next_id = meta['next_id']
+    if 'hashes.present' in arrays:
+        db.content_hashes = {
+            document_id: content_hash
+            for document_id, content_hash in zip(label_to_id, MmapStrings(arrays, 'hashes'))
+            if document_id is not None and content_hash is not None
+        }
+
+
+# where 조건의 비교 연산자
+_COMPARISONS = {
+    '$eq': np.equal,
+    '$ne': np.not_equal,
+    '$gt': np.greater,
+    '$gte': np.greater_equal,
+    '$lt': np.less,
+    '$lte': np.less_equal
+}
+
+
+def _metadata_kind(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return 'num'
+    if isinstance(value, str):
+        return 'str'
+    raise ValueError(f"Unsupported metadata value: {value!r} (expected str, int, float or bool)")
+
+
+# label 순서의 열(column) 단위 메타데이터 저장소
+class _MetadataColumns:
+    def __init__(self):
+        """
+        메타데이터를 (키, 자료형)마다 label 길이의 배열 하나로 저장한다.
+        문자열은 사전 인코딩한 int32 코드(-1: 없음), 숫자와 bool은 float64 값(NaN: 없음)으로 저장하므로
+        where 조건은 열마다 NumPy 비교 한 번으로 label 비트맵이 된다.
+        """
+        self.columns = {}
+        self.capacity = 0
+
+    def reserve(self, capacity):
+        """
+        label 수만큼 열을 늘리는 메소드
+        :param capacity: 필요한 label 수
+        """
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for column in self.columns.values():
+            column['values'] = self._grow(column['values'], capacity)
+        self.capacity = capacity
+
+    def set(self, label, metadata):
+        """
+        label의 메타데이터를 교체하는 메소드
+        :param label: 문서 label
+        :param metadata: 메타데이터 딕셔너리 (None이면 삭제)
+        """
+        self.clear(label)
+        for key, value in (metadata or {}).items():
+            kind = _metadata_kind(value)
+            column = self.columns.get((key, kind))
+            if column is None:
+                column = self.columns[(key, kind)] = self._new_column(kind, self.capacity)
+            if kind == 'str':
+                code = column['lookup'].get(value)
+                if code is None:
+                    code = column['lookup'][value] = len(column['vocab'])
+                    column['vocab'].append(value)
+                column['values'][label] = code
+            else:
+                column['values'][label] = float(value)
+
+    def clear(self, label):
+        """
+        label의 메타데이터를 지우는 메소드
+        :param label: 문서 label
+        """
+        for (_, kind), column in self.columns.items():
+            column['values'][label] = -1 if kind == 'str' else np.nan
+
+    def get(self, label):
+        """
+        label의 메타데이터를 딕셔너리로 복원하는 메소드
+        :param label: 문서 label
+        :return: 메타데이터 딕셔너리 (없으면 None)
+        """
+        metadata = {}
+        for (key, kind), column in self.columns.items():
+            value = column['values'][label]
+            if kind == 'str':
+                if value >= 0:
+                    metadata[key] = column['vocab'][value]
+            elif not np.isnan(value):
+                if kind == 'bool':
+                    metadata[key] = bool(value)
+                else:
+                    metadata[key] = int(value) if float(value).is_integer() else float(value)
+        return metadata or None
+
+    def mask(self, where, count):
+        """
+        ChromaDB where 조건을 label 비트맵으로 만드는 메소드
+        {"key": value}, {"key": {"$eq"|"$ne"|"$gt"|"$gte"|"$lt"|"$lte"|"$in"|"$nin": value}},
+        {"$and": [...]}, {"$or": [...]}를 지원하며, 키가 없는 문서는 어떤 조건에도 맞지 않는다.
+        :param where: 검색 조건 딕셔너리
+        :param count: 비트맵 길이 (label 수)
+        :return: 조건에 맞는 label이 True인 bool 배열
+        """
+        if not isinstance(where, dict) or not where:
+            raise ValueError(f"Invalid where clause: {where!r}")
+        result = np.ones(count, dtype=bool)
+        for key, condition in where.items():
+            if key in ('$and', '$or'):
+                if not isinstance(condition, list) or not condition:
+                    raise ValueError(f"{key} expects a non-empty list of conditions.")
+                masks = [self.mask(clause, count) for clause in condition]
+                result &= np.logical_and.reduce(masks) if key == '$and' else np.logical_or.reduce(masks)
+            elif key.startswith('$'):
+                raise ValueError(f"Unsupported where operator: {key}")
+            else:
+                result &= self._field_mask(key, condition, count)
+        return result
+
+    def _field_mask(self, key, condition, count):
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        result = np.ones(count, dtype=bool)
+        for operator, operand in condition.items():
+            if operator in ('$in', '$nin'):
+                if not isinstance(operand, list):
+                    raise ValueError(f"{operator} expects a list of values.")
+                matched = np.zeros(count, dtype=bool)
+                for value in operand:
+                    matched |= self._compare(key, '$eq', value, count)
+                result &= matched if operator == '$in' else self._present(key, count) & ~matched
+            elif operator == '$ne':
+                result &= self._present(key, count) & ~self._compare(key, '$eq', operand, count)
+            elif operator in _COMPARISONS:
+                result &= self._compare(key, operator, operand, count)
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+        return result
+
+    def _compare(self, key, operator, value, count):
+        kind = _metadata_kind(value)
+        column = self.columns.get((key, kind))
+        if column is None:
+            return np.zeros(count, dtype=bool)
+        values = column['values'][:count]
+        if kind == 'str':
+            if operator != '$eq':
+                raise ValueError(f"Operator {operator} is not supported for string values.")
+            return values == column['lookup'].get(value, -2)
+        if kind == 'bool' and operator != '$eq':
+            raise ValueError(f"Operator {operator} is not supported for boolean values.")
+        # NaN(값 없음)과의 비교는 항상 False이다
+        return _COMPARISONS[operator](values, float(value))
+
+    def _present(self, key, count):
+        present = np.zeros(count, dtype=bool)
+        for (column_key, kind), column in self.columns.items():
+            if column_key == key:
+                values = column['values'][:count]
+                present |= values >= 0 if kind == 'str' else ~np.isnan(values)
+        return present
+
+    @staticmethod
+    def _new_column(kind, capacity):
+        if kind == 'str':
+            return {'values': np.full(capacity, -1, dtype=np.int32), 'vocab': [], 'lookup': {}}
+        return {'values': np.full(capacity, np.nan, dtype=np.float64)}
+
+    @staticmethod
+    def _grow(values, capacity):
+        grown = np.full(capacity, -1 if values.dtype == np.int32 else np.nan, dtype=values.dtype)
+        grown[:len(values)] = values
+        return grown
+
+
 # Hnswlib 벡터 DB 어댑터
 class HNSWLib(VectorDB):
-    def __init__(self, dim, similarity='cosine'):
+    def __init__(self, dim, similarity='cosine', num_threads=-1, M=16, ef_construction=200, ef_search=50, growth_factor=2.0,
+                 filter_exact_limit=2048):
         """
         Hnswlib 벡터 DB 초기화
-        :param dim: 벡터의 차원
+        :param dim: 벡터의 차원, None이면 첫 문서를 추가할 때 임베딩에서 정하고 인덱스도 그때 만든다
         :param similarity: 유사도 측정 방식 (기본값: 'cosine')
+        :param num_threads: add_items와 knn_query에 사용할 스레드 수 (기본값: -1, 모든 코어)
+        :param M: 노드당 최대 연결 수 (기본값: 16)
+        :param ef_construction: 인덱스 구축 시 탐색 폭 (기본값: 200)
+        :param ef_search: 검색 시 탐색 폭, k보다 작으면 k를 사용 (기본값: 50)
+        :param growth_factor: 용량이 부족할 때 인덱스 크기를 늘리는 배수, 1.0이면 필요한 만큼만 늘림 (기본값: 2.0)
+        :param filter_exact_limit: where 조건에 맞는 문서가 이 수 이하이면 그래프 대신 해당 문서만 전수 검색 (기본값: 2048)
         """
         super().__init__()
-        self.index = hnswlib.Index(space=similarity, dim=dim)
+        if growth_factor < 1.0:
+            raise ValueError("growth_factor must be at least 1.0.")
+        self.dim = dim
+        self.index = None if dim is None else hnswlib.Index(space=similarity, dim=dim)
         self.similarity = similarity
-        self.document_ids = []
+        self.num_threads = num_threads
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.growth_factor = growth_factor
+        self.filter_exact_limit = filter_exact_limit
+        self.id_map = _LabelMap()
+        self.content_hashes = {}
+        self.metadata = _MetadataColumns()
 
-    def add_documents(self, documents, embeddings):
+    def __len__(self):
+        return len(self.id_map)
+
+    def add_documents(self, documents, embeddings, ids=None, metadatas=None):
         """
         문서와 임베딩을 Hnswlib 벡터 DB에 추가하는 메소드
+        삭제로 비어 있는 label이 있으면 먼저 재사용한다.
         :param documents: 추가할 문서 리스트
         :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트 (기본값: None, 자동 증가 정수 ID 사용)
+        :param metadatas: 문서 메타데이터 딕셔너리 리스트, 값은 str, int, float, bool (기본값: None)
+        :return: 추가된 문서의 ID 리스트
         """
+        embeddings = np.float32(embeddings)
+        if metadatas is not None and len(metadatas) != len(documents):
+            raise ValueError(f"Expected {len(documents)} metadatas, got {len(metadatas)}.")
+        if self.index is None:
+            self.dim = embeddings.shape[-1]
+            self.index = hnswlib.Index(space=self.similarity, dim=self.dim)
+        capacity = self.id_map.capacity
+        ids, labels = self.id_map.assign(len(documents), ids)
+        new_count = self.id_map.capacity - capacity
+
+        required = self.index.element_count + new_count
         if self.index.max_elements == 0:
-            self.index.init_index(max_elements=len(documents), ef_construction=2000, M=64)
-        elif self.index.element_count + len(documents) > self.index.max_elements:
-            self.index.resize_index(self.index.element_count + len(documents))
+            self.index.init_index(max_elements=max(new_count, 1), ef_construction=self.ef_construction, M=self.M)
+            self.index.set_ef(self.ef_search)
+        elif required > self.index.max_elements:
+            # 배치마다 재할당하지 않도록 용량을 배수로 늘린다
+            self.index.resize_index(max(required, int(self.index.max_elements * self.growth_factor)))
 
-        embeddings = np.float32(embeddings)
-        ids = np.arange(len(self.document_ids), len(self.document_ids) + len(documents))
+        self.documents.extend([None] * new_count)
+        for label, document in zip(labels, documents):
+            self.documents[label] = document
+        self.metadata.reserve(self.id_map.capacity)
+        if metadatas is not None:
+            for label, metadata in zip(labels, metadatas):
+                self.metadata.set(label, metadata)
+        # tombstone label에 다시 add_items 하면 hnswlib이 해당 슬롯을 복구하고 벡터를 갱신한다
+        self.index.add_items(embeddings, labels, num_threads=self.num_threads)
+        return ids
+
+    def update_document(self, document_id, document, embedding, metadata=None):
+        """
+        문서를 업데이트하는 메소드
+        :param document_id: 업데이트할 문서의 ID
+        :param document: 새로운 문서
+        :param embedding: 새로운 문서의 임베딩
+        :param metadata: 새로운 메타데이터 (기본값: None, 기존 메타데이터 유지)
+        """
+        label = self.id_map.label(document_id)
+        self.documents[label] = document
+        self.index.add_items(np.float32([embedding]), [label])
+        if metadata is not None:
+            self.metadata.set(label, metadata)
+        self.content_hashes.pop(document_id, None)
+
+    def delete_document(self, document_id):
+        """
+        문서를 삭제하는 메소드
+        :param document_id: 삭제할 문서의 ID
+        """
+        label = self.id_map.release(document_id)
+        self.documents[label] = None
+        self.index.mark_deleted(label)
+        self.metadata.clear(label)
+        self.content_hashes.pop(document_id, None)
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None, metadatas=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드
+        기존 문서는 같은 label에 add_items 한 번으로 벡터를 덮어쓴다.
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        :param metadatas: 문서 메타데이터 딕셔너리 리스트 (기본값: None, 기존 문서의 메타데이터 유지)
+        """
+        ids = list(ids)
+        embeddings = np.float32(embeddings).reshape(len(ids), -1)
+        new, existing = _partition_ids(self.id_map, ids)
+        if existing:
+            labels = [self.id_map.label(ids[i]) for i in existing]
+            for label, i in zip(labels, existing):
+                self.documents[label] = documents[i]
+                if metadatas is not None:
+                    self.metadata.set(label, metadatas[i])
+            self.index.add_items(embeddings[existing], labels, num_threads=self.num_threads)
+        if new:
+            self.add_documents([documents[i] for i in new], embeddings[new], ids=[ids[i] for i in new],
+                               metadatas=[metadatas[i] for i in new] if metadatas is not None else None)
+        _record_hashes(self.content_hashes, ids, content_hashes)
+
+    def get_metadatas(self, ids):
+        """
+        문서 ID로 메타데이터를 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: 메타데이터 딕셔너리 리스트 (메타데이터가 없으면 None)
+        """
+        return [self.metadata.get(self.id_map.label(document_id)) for document_id in ids]
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 내용 해시를 반환하는 메소드
+        :return: 문서 ID -> 내용 해시 딕셔너리 (해시 없이 추가된 문서는 None)
+        """
+        return {document_id: self.content_hashes.get(document_id) for document_id in self.id_map.id_to_label}
+
+    def has_ids(self, ids):
+        """
+        문서 ID가 저장되어 있는지 확인하는 메소드 (문서 본문을 옮기지 않고 ID만 확인할 때 사용)
+        :param ids: 문서 ID 리스트
+        :return: ID별 저장 여부 리스트
+        """
+        return [document_id in self.id_map for document_id in ids]
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        id_to_label = self.id_map.id_to_label
+        return [self.documents[id_to_label[document_id]] if document_id in id_to_label else None for document_id in ids]
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드 (cosine 공간에서는 정규화된 벡터)
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        labels = [self.id_map.label(document_id) for document_id in ids]
+        if not labels:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.float32(self.index.get_items(labels))
+
+    def search(self, query_embedding, k=1, threshold=None, where=None):
+        """
+        쿼리 임베딩과 유사한 문서를 Hnswlib 벡터 DB에서 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+        :return: (문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch([query_embedding], k, threshold, where)[0]
 
-        self.documents.extend(documents)
-        self.document_ids.extend(ids)
-        self.index.add_items(embeddings, ids)
+    def search_batch(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        여러 쿼리 임베딩을 한 번의 knn_query로 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [
+            [(self.documents[label], dist) for label, dist in zip(labels, distances)]
+            for labels, distances in self._search_labels(query_embeddings, k, threshold, where)
+        ]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None, where=None):
+        """
+        쿼리 임베딩과 유사한 문서를 문서 ID와 함께 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch_with_ids([query_embedding], k, threshold, where)[0]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        여러 쿼리 임베딩을 한 번의 knn_query로 문서 ID와 함께 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 메타데이터 검색 조건, ChromaDB where 형식 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        label_to_id = self.id_map.label_to_id
+        return [
+            [(label_to_id[label], self.documents[label], dist) for label, dist in zip(labels, distances)]
+            for labels, distances in self._search_labels(query_embeddings, k, threshold, where)
+        ]
+
+    def _search_labels(self, query_embeddings, k, threshold, where=None):
+        """
+        where가 있으면 메타데이터 열로 label 비트맵을 만들어 조건에 맞는 문서만 검색한다.
+        맞는 문서가 filter_exact_limit 이하이면 그 문서들만 전수 검색하고,
+        많으면 hnswlib filter 콜백으로 그래프 탐색 중에 걸러내므로 어느 쪽이든 조건에 맞는 k개를 돌려준다.
+        """
+        query_embeddings = self._as_queries(query_embeddings)
+        allowed = None
+        if where is not None:
+            allowed = self.metadata.mask(where, self.id_map.capacity)
+            candidates = np.flatnonzero(allowed)
+            k = min(k, len(candidates))
+        else:
+            k = min(k, len(self.id_map))
+        if k == 0:
+            return [(np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float32)) for _ in range(len(query_embeddings))]
+        if allowed is None:
+            labels, distances = self.index.knn_query(query_embeddings, k=k, num_threads=self.num_threads)
+        elif len(candidates) <= self.filter_exact_limit:
+            labels, distances = self._exact_search(query_embeddings, candidates.astype(np.uint64), k)
+        else:
+            labels, distances = self.index.knn_query(query_embeddings, k=k, num_threads=self.num_threads,
+                                                     filter=allowed.__getitem__)
+        return _apply_threshold(labels, distances, threshold)
+
+    def set_ef(self, ef_search):
+        """
+        검색 시 탐색 폭을 바꾸는 메소드
+        :param ef_search: 검색 시 탐색 폭
+        """
+        self.ef_search = ef_search
+        if self.index is not None and self.index.max_elements > 0:
+            self.index.set_ef(ef_search)
+
+    def tune_ef(self, query_embeddings, k=10, target_recall=0.95, candidates=(10, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512)):
+        """
+        목표 recall@k를 만족하는 가장 작은 ef_search를 찾아 설정하는 메소드
+        저장된 벡터를 전수 검색한 결과를 정답으로 삼아 후보 ef를 작은 값부터 측정한다.
+        목표에 도달하는 후보가 없으면 recall이 가장 높은 ef를 사용한다.
+        :param query_embeddings: 조정에 사용할 쿼리 임베딩 (인덱스에 없는 쿼리 샘플)
+        :param k: recall을 계산할 검색 개수 (기본값: 10)
+        :param target_recall: 목표 recall@k (기본값: 0.95)
+        :param candidates: 시도할 ef 값 (기본값: 10 ~ 512)
+        :return: 결과 딕셔너리 (ef, recall, latency, trials)
+        """
+        query_embeddings = self._as_queries(query_embeddings)
+        k = min(k, len(self.id_map))
+        if k == 0 or len(query_embeddings) == 0:
+            raise ValueError("tune_ef needs at least one stored document and one query.")
+        truth = self._exact_labels(query_embeddings, k)
+
+        trials = []
+        for ef in sorted(set(max(ef, k) for ef in candidates)):
+            self.index.set_ef(ef)
+            start_time = time.perf_counter()
+            labels, _ = self.index.knn_query(query_embeddings, k=k, num_threads=self.num_threads)
+            latency = (time.perf_counter() - start_time) / len(query_embeddings)
+            recall = float(np.mean([len(set(found) & set(expected)) / k for found, expected in zip(labels.tolist(), truth)]))
+            trials.append({'ef': ef, 'recall': recall, 'latency': latency})
+            if recall >= target_recall:
+                break
+
+        reached = [trial for trial in trials if trial['recall'] >= target_recall]
+        best = reached[0] if reached else max(trials, key=lambda trial: trial['recall'])
+        self.set_ef(best['ef'])
+        return dict(best, trials=trials)
+
+    def _as_queries(self, query_embeddings):
+        query_embeddings = np.float32(query_embeddings)
+        return query_embeddings.reshape(-1, self.dim or query_embeddings.shape[-1])
+
+    def _exact_labels(self, query_embeddings, k):
+        labels = np.fromiter(self.id_map.id_to_label.values(), dtype=np.uint64, count=len(self.id_map))
+        return self._exact_search(query_embeddings, labels, k)[0].tolist()
+
+    def _exact_search(self, query_embeddings, labels, k):
+        """
+        주어진 label의 벡터만 전수 검색하는 메소드 (거리는 hnswlib과 같은 기준)
+        :return: ((쿼리 수 x k) label 배열, (쿼리 수 x k) 거리 배열) 튜플
+        """
+        vectors = np.float32(self.index.get_items(labels)).reshape(len(labels), -1)
+        if self.similarity == 'cosine':
+            query_embeddings = query_embeddings / np.maximum(np.linalg.norm(query_embeddings, axis=1, keepdims=True), 1e-12)
+        scores = query_embeddings @ vectors.T
+        if self.similarity == 'l2':
+            distances = np.einsum('ij,ij->i', query_embeddings, query_embeddings)[:, None] \
+                + np.einsum('ij,ij->i', vectors, vectors)[None, :] - 2 * scores
+        else:
+            distances = 1.0 - scores
+        top = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return labels[top], np.take_along_axis(distances, top, axis=1).astype(np.float32)
+
+    def save(self, path):
+        """
+        인덱스를 파일로 저장하는 메소드
+        hnswlib 그래프는 path에, 문서와 ID 매핑은 path + '.docs' 바이너리 파일에 저장된다.
+        :param path: 인덱스 파일 경로
+        """
+        id_kind, arrays, strings = _encode_ids(self.id_map, self.documents, self.content_hashes)
+        columns = []
+        for i, ((key, kind), column) in enumerate(self.metadata.columns.items()):
+            columns.append({'key': key, 'kind': kind})
+            arrays[f'metadata.{i}'] = column['values'][:self.id_map.capacity]
+            if kind == 'str':
+                strings[f'metadata.{i}.vocab'] = column['vocab']
+
+        meta = {
+            'space': self.similarity,
+            'dim': self.dim,
+            'id_kind': id_kind,
+            'next_id': self.id_map.next_id,
+            'labels': self.id_map.capacity,
+            'initialized': self.index is not None and self.index.max_elements > 0,
+            'M': self.M,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search,
+            'growth_factor': self.growth_factor,
+            'filter_exact_limit': self.filter_exact_limit,
+            'metadata': columns
+        }
+        # 초기화되지 않은 hnswlib 인덱스는 저장할 수 없으므로 sidecar만 기록한다
+        if meta['initialized']:
+            tmp_path = f"{path}.tmp"
+            self.index.save_index(tmp_path)
+            os.replace(tmp_path, path)
+        write_sidecar(f"{path}.docs", meta, arrays=arrays, strings=strings)
+
+    @classmethod
+    def load(cls, path, num_threads=-1, ef_search=None):
+        """
+        save로 저장한 인덱스를 불러오는 클래스 메소드
+        문서 텍스트는 메모리로 읽지 않고 mmap으로 열어 필요할 때 디코딩한다.
+        M, ef_construction, growth_factor는 저장할 때의 값을 사용한다.
+        :param path: 인덱스 파일 경로
+        :param num_threads: add_items와 knn_query에 사용할 스레드 수 (기본값: -1, 모든 코어)
+        :param ef_search: 검색 시 탐색 폭 (기본값: None, 저장할 때의 값)
+        :return: HNSWLib 인스턴스
+        """
+        meta, arrays = read_sidecar(f"{path}.docs")
+        db = cls(meta['dim'], similarity=meta['space'], num_threads=num_threads,
+                 M=meta.get('M', 16), ef_construction=meta.get('ef_construction', 200),
+                 ef_search=ef_search or meta.get('ef_search', 50), growth_factor=meta.get('growth_factor', 2.0),
+                 filter_exact_limit=meta.get('filter_exact_limit', 2048))
+        if meta['initialized']:
+            db.index.load_index(path)
+            db.index.set_ef(db.ef_search)
+        _decode_ids(db, meta, arrays)
+        db.metadata.capacity = db.id_map.capacity
+        for i, column in enumerate(meta.get('metadata', [])):
+            values = np.array(arrays[f'metadata.{i}'])
+            if column['kind'] == 'str':
+                vocab = list(MmapStrings(arrays, f'metadata.{i}.vocab'))
+                db.metadata.columns[(column['key'], 'str')] = {
+                    'values': values, 'vocab': vocab, 'lookup': {value: code for code, value in enumerate(vocab)}
+                }
+            else:
+                db.metadata.columns[(column['key'], column['kind'])] = {'values': values}
+        return db
+
+# NumPy 전수 검색 벡터 DB
+class NumpyFlatDB(VectorDB):
+    _DTYPES = ('float32', 'float16', 'int8')
+    _SPACES = ('cosine', 'ip', 'l2')
+
+    def __init__(self, dim, similarity='cosine', dtype='float32', initial_capacity=1024, block_size=65536):
+        """
+        NumPy 행렬 기반 전수(brute-force) 벡터 DB 초기화
+        임베딩을 연속된 행렬에 저장하고 행렬곱 한 번으로 정확한 최근접 이웃을 찾는다.
+        :param dim: 벡터의 차원, None이면 첫 문서를 추가할 때 임베딩에서 정한다
+        :param similarity: 유사도 측정 방식 ('cosine', 'ip', 'l2') (기본값: 'cosine')
+        :param dtype: 저장 자료형 ('float32', 'float16', 'int8') (기본값: 'float32')
+        :param initial_capacity: 초기 행 수, 부족하면 두 배씩 늘린다 (기본값: 1024)
+        :param block_size: 검색 시 한 번에 float32로 변환할 최대 행 수 (기본값: 65536)
+        """
+        super().__init__()
+        if similarity not in self._SPACES:
+            raise ValueError(f"Unsupported similarity: {similarity}")
+        if dtype not in self._DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.dim = dim
+        self.similarity = similarity
+        self.dtype = np.dtype(dtype)
+        self.block_size = block_size
+        self.id_map = _LabelMap()
+        self.content_hashes = {}
+        capacity = max(initial_capacity, 1)
+        # 차원을 모르면 행렬은 첫 추가 때 만든다
+        self.vectors = np.zeros((capacity, dim or 0), dtype=self.dtype)
+        self.scales = np.ones(capacity, dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return len(self.id_map)
+
+    @property
+    def nbytes(self):
+        """
+        임베딩 저장에 사용 중인 바이트 수
+        """
+        return self.vectors.nbytes + self.scales.nbytes + self.norms.nbytes + self.alive.nbytes
+
+    def add_documents(self, documents, embeddings, ids=None):
+        """
+        문서와 임베딩을 추가하는 메소드
+        :param documents: 추가할 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트 (기본값: None, 자동 증가 정수 ID 사용)
+        :return: 추가된 문서의 ID 리스트
+        """
+        embeddings = self._as_matrix(embeddings)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            self.vectors = np.zeros((len(self.vectors), self.dim), dtype=self.dtype)
+        capacity = self.id_map.capacity
+        ids, labels = self.id_map.assign(len(documents), ids)
+        self._reserve(self.id_map.capacity)
+        self.documents.extend([None] * (self.id_map.capacity - capacity))
+        for label, document in zip(labels, documents):
+            self.documents[label] = document
+        self._store(np.array(labels, dtype=np.int64), embeddings)
+        return ids
 
     def update_document(self, document_id, document, embedding):
         """
@@ -66,54 +895,220 @@ class HNSWLib(VectorDB):
         :param document: 새로운 문서
         :param embedding: 새로운 문서의 임베딩
         """
-        if document_id in self.document_ids:
-            index = self.document_ids.index(document_id)
-            self.documents[index] = document
-            self.index.mark_deleted(index)
-            self.index.add_items([embedding], [index])
-        else:
-            raise ValueError(f"Document with id {document_id} not found.")
+        label = self.id_map.label(document_id)
+        self.documents[label] = document
+        self._store(np.array([label]), self._as_matrix([embedding]))
+        self.content_hashes.pop(document_id, None)
 
     def delete_document(self, document_id):
         """
         문서를 삭제하는 메소드
         :param document_id: 삭제할 문서의 ID
         """
-        if document_id in self.document_ids:
-            index = self.document_ids.index(document_id)
-            del self.documents[index]
-            del self.document_ids[index]
-            self.index.mark_deleted(index)
-        else:
-            raise ValueError(f"Document with id {document_id} not found.")
+        label = self.id_map.release(document_id)
+        self.documents[label] = None
+        self.alive[label] = False
+        self.content_hashes.pop(document_id, None)
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        """
+        ids = list(ids)
+        embeddings = self._as_matrix(embeddings)
+        new, existing = _partition_ids(self.id_map, ids)
+        if existing:
+            labels = [self.id_map.label(ids[i]) for i in existing]
+            for label, i in zip(labels, existing):
+                self.documents[label] = documents[i]
+            self._store(np.array(labels, dtype=np.int64), embeddings[existing])
+        if new:
+            self.add_documents([documents[i] for i in new], embeddings[new], ids=[ids[i] for i in new])
+        _record_hashes(self.content_hashes, ids, content_hashes)
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 내용 해시를 반환하는 메소드
+        :return: 문서 ID -> 내용 해시 딕셔너리 (해시 없이 추가된 문서는 None)
+        """
+        return {document_id: self.content_hashes.get(document_id) for document_id in self.id_map.id_to_label}
+
+    def has_ids(self, ids):
+        """
+        문서 ID가 저장되어 있는지 확인하는 메소드 (문서 본문을 옮기지 않고 ID만 확인할 때 사용)
+        :param ids: 문서 ID 리스트
+        :return: ID별 저장 여부 리스트
+        """
+        return [document_id in self.id_map for document_id in ids]
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        id_to_label = self.id_map.id_to_label
+        return [self.documents[id_to_label[document_id]] if document_id in id_to_label else None for document_id in ids]
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드 (int8 저장이면 복원한 근사값)
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        labels = np.array([self.id_map.label(document_id) for document_id in ids], dtype=np.int64)
+        vectors = self.vectors[labels].astype(np.float32)
+        if self.dtype == np.int8:
+            vectors *= self.scales[labels, None]
+        return vectors
 
     def search(self, query_embedding, k=1, threshold=None):
         """
-        쿼리 임베딩과 유사한 문서를 Hnswlib 벡터 DB에서 검색하는 메소드
+        쿼리 임베딩과 유사한 문서를 검색하는 메소드
         :param query_embedding: 쿼리의 임베딩
         :param k: 검색할 문서의 개수 (기본값: 1)
         :param threshold: 유사도 임계값 (기본값: None)
         :return: (문서, 유사도) 튜플의 리스트
         """
-        indices, distances = self.index.knn_query([query_embedding], k=k)
-        indices = indices[0]
-        distances = distances[0]
-        if threshold is not None:
-            mask = distances <= threshold
-            indices = indices[mask]
-            distances = distances[mask]
-        return [(self.documents[self.document_ids[idx]], dist) for idx, dist in zip(indices, distances)]
+        return self.search_batch([query_embedding], k, threshold)[0]
+
+    def search_batch(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 행렬곱 한 번과 argpartition으로 검색하는 메소드
+        거리는 hnswlib과 같은 기준이다 (cosine/ip: 1 - 내적, l2: 제곱 거리).
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        labels, distances = self._knn(self._as_matrix(query_embeddings, normalize=False), k)
+        return [
+            [(self.documents[label], dist) for label, dist in zip(row_labels, row_distances)]
+            for row_labels, row_distances in _apply_threshold(labels, distances, threshold)
+        ]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None):
+        """
+        쿼리 임베딩과 유사한 문서를 문서 ID와 함께 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return self.search_batch_with_ids([query_embedding], k, threshold)[0]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None):
+        """
+        여러 쿼리 임베딩을 행렬곱 한 번으로 문서 ID와 함께 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트 또는 (쿼리 수 x 차원) 배열
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        labels, distances = self._knn(self._as_matrix(query_embeddings, normalize=False), k)
+        label_to_id = self.id_map.label_to_id
+        return [
+            [(label_to_id[label], self.documents[label], dist) for label, dist in zip(row_labels, row_distances)]
+            for row_labels, row_distances in _apply_threshold(labels, distances, threshold)
+        ]
+
+    def _knn(self, queries, k):
+        count = self.id_map.capacity
+        k = min(k, len(self.id_map))
+        if k == 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if self.similarity == 'cosine':
+            queries = self._normalize(queries)
+
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, self.block_size):
+            end = min(start + self.block_size, count)
+            block = self.vectors[start:end]
+            if self.dtype != np.float32:
+                block = block.astype(np.float32)
+            np.matmul(queries, block.T, out=scores[:, start:end])
+            if self.dtype == np.int8:
+                scores[:, start:end] *= self.scales[start:end]
+
+        if self.similarity == 'l2':
+            distances = np.einsum('ij,ij->i', queries, queries)[:, None] + self.norms[:count] - 2 * scores
+        else:
+            distances = np.subtract(1.0, scores, out=scores)
+        distances[:, ~self.alive[:count]] = np.inf
+
+        if k < count:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(count), (len(queries), count))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+    def _as_matrix(self, embeddings, normalize=True):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings.reshape(-1, self.dim or embeddings.shape[-1])
+        if normalize and self.similarity == 'cosine':
+            embeddings = self._normalize(embeddings)
+        return embeddings
+
+    @staticmethod
+    def _normalize(embeddings):
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def _reserve(self, count):
+        capacity = len(self.vectors)
+        if count <= capacity:
+            return
+        capacity = max(count, capacity * 2)
+        self.vectors = self._grow(self.vectors, capacity)
+        self.scales = self._grow(self.scales, capacity, fill=1.0)
+        self.norms = self._grow(self.norms, capacity)
+        self.alive = self._grow(self.alive, capacity)
+
+    @staticmethod
+    def _grow(array, capacity, fill=0):
+        grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _store(self, labels, embeddings):
+        self.norms[labels] = np.einsum('ij,ij->i', embeddings, embeddings)
+        if self.dtype == np.int8:
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.scales[labels] = scales
+            self.vectors[labels] = np.rint(embeddings / scales[:, None]).astype(np.int8)
+        else:
+            self.vectors[labels] = embeddings
+        self.alive[labels] = True
 
 # ChromaDB 클래스
 class ChromaDB(VectorDB):
-    def __init__(self, collection_name='default', use_persistent_storage=False, embedding_function=None):
+    # 클라이언트가 최대 배치 크기를 알려주지 않을 때 사용하는 값
+    DEFAULT_BATCH_SIZE = 5000
+
+    def __init__(self, collection_name='default', use_persistent_storage=False, embedding_function=None, max_batch_size=None,
+                 pipeline_depth=2, similarity=None):
         """
         ChromaDB 초기화
         :param collection_name: 컬렉션 이름 (기본값: 'default')
         :param use_persistent_storage: 영구 저장소 사용 여부 (기본값: False)
         :param embedding_function: 임베딩 함수 (기본값: None)
+        :param max_batch_size: 쓰기/검색 요청 하나에 담을 최대 항목 수 (기본값: None, 클라이언트의 get_max_batch_size)
+        :param pipeline_depth: 동시에 진행 중일 수 있는 쓰기 배치 수, 1이면 배치마다 완료를 기다림 (기본값: 2)
+        :param similarity: 새 컬렉션의 거리 공간 ('cosine', 'l2', 'ip'), 'hnsw:space' 메타데이터로 지정 (기본값: None, ChromaDB 기본값 l2)
+                           이미 있는 컬렉션을 사용하면 무시된다.
         """
         super().__init__()
+        if similarity is not None and similarity not in ('cosine', 'l2', 'ip'):
+            raise ValueError(f"Unsupported similarity: {similarity}")
         self.persist_directory = './chromadb_persist' if use_persistent_storage else None
         self.embedding_function = embedding_function
         if self.persist_directory:
@@ -121,29 +1116,109 @@ class ChromaDB(VectorDB):
             self.client = chromadb.PersistentClient(path=self.persist_directory)
         else:
             self.client = chromadb.Client()
+        self.max_batch_size = max_batch_size or self._client_batch_size()
+        self.pipeline_depth = pipeline_depth
+        self._executor = None
         
         try:
-            self.collection = self.client.create_collection(name=collection_name, embedding_function=embedding_function)
+            self.collection = self.client.create_collection(name=collection_name, embedding_function=embedding_function,
+                                                            metadata={'hnsw:space': similarity} if similarity is not None else None)
         except chromadb.db.base.UniqueConstraintError:
             print(f"Collection '{collection_name}' already exists. Using existing collection.")
             self.collection = self.client.get_collection(name=collection_name, embedding_function=embedding_function)
 
+    def close(self):
+        """
+        쓰기 스레드를 종료하는 메소드 (이후 쓰기에서 필요하면 다시 만든다)
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _client_batch_size(self):
+        size = getattr(self.client, 'get_max_batch_size', None)
+        size = size() if callable(size) else None
+        return size if isinstance(size, int) and size > 0 else self.DEFAULT_BATCH_SIZE
+
+    def _write(self, method, batches):
+        """
+        배치별 collection 쓰기 요청을 순서대로 보내는 메소드
+        쓰기 전용 스레드 하나가 요청을 처리하는 동안 다음 배치를 준비하고, 진행 중인 배치는 pipeline_depth개로 제한해 메모리를 일정하게 유지한다.
+        :param method: collection 메소드 이름 ('add', 'upsert', 'update', 'delete')
+        :param batches: 메소드 키워드 인자 딕셔너리의 이터러블
+        """
+        write = getattr(self.collection, method)
+        if self.pipeline_depth <= 1:
+            for batch in batches:
+                write(**batch)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chromadb-writer')
+        pending = deque()
+        try:
+            for batch in batches:
+                pending.append(self._executor.submit(write, **batch))
+                if len(pending) >= self.pipeline_depth:
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _row_batches(self, ids, documents, embeddings, metadatas):
+        """
+        (ID, 문서, 임베딩, 메타데이터) 행을 max_batch_size개씩 collection 쓰기 인자로 묶는 제너레이터
+        입력은 이터러블이어도 되며 한 번에 한 배치만 메모리에 만든다.
+        길이를 알 수 있는 입력은 첫 배치를 쓰기 전에 길이를 비교하고, 이터레이터는 길이가 다르면 끝에서 ValueError를 일으킨다.
+        :param ids: 문서 ID 리스트 (None이면 UUID 생성)
+        """
+        columns = {'embeddings': embeddings, 'ids': ids, 'metadatas': metadatas}
+        if hasattr(documents, '__len__'):
+            for name, values in columns.items():
+                if values is not None and hasattr(values, '__len__') and len(values) != len(documents):
+                    raise ValueError(f"Expected {len(documents)} {name}, got {len(values)}.")
+        # 주어진 열만 strict하게 묶어 이터레이터 길이가 달라도 행이 조용히 잘리지 않게 한다
+        given = [values for values in (ids, metadatas) if values is not None]
+        rows = zip(documents, embeddings, *given, strict=True)
+        while True:
+            batch = [row for _, row in zip(range(self.max_batch_size), rows)]
+            if not batch:
+                return
+            batch_columns = list(zip(*batch))
+            optional = iter(batch_columns[2:])
+            yield {
+                'ids': list(next(optional)) if ids is not None else [str(uuid4()) for _ in batch],
+                'documents': list(batch_columns[0]),
+                'embeddings': np.asarray(batch_columns[1], dtype=np.float32),
+                'metadatas': list(next(optional)) if metadatas is not None else None
+            }
+
     def add_documents(self, documents, embeddings, metadatas=None, ids=None):
         """
         문서와 임베딩을 ChromaDB에 추가하는 메소드
-        :param documents: 추가할 문서 리스트
-        :param embeddings: 문서에 해당하는 임베딩 리스트
+        max_batch_size개씩 나눠 추가하므로 클라이언트의 최대 배치 크기보다 많은 문서도 한 번에 넘길 수 있다.
+        :param documents: 추가할 문서 리스트 (이터러블 가능)
+        :param embeddings: 문서에 해당하는 임베딩 리스트 (이터러블 가능)
         :param metadatas: 문서 메타데이터 리스트 (기본값: None)
-        :param ids: 문서 ID 리스트 (기본값: None)
+        :param ids: 문서 ID 리스트 (기본값: None, UUID 생성)
+        :return: 추가된 문서의 ID 리스트
         """
-        if ids is None:
-            ids = [str(uuid4()) for _ in range(len(documents))]
-        self.collection.add(
-            documents=documents,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
-        )
+        added = []
+
+        def batches():
+            for batch in self._row_batches(ids, documents, embeddings, metadatas):
+                added.extend(batch['ids'])
+                yield batch
+
+        self._write('add', batches())
+        return added
 
     def update_document(self, document_id, document=None, embedding=None, metadata=None):
         """
@@ -153,13 +1228,39 @@ class ChromaDB(VectorDB):
         :param embedding: 새로운 문서의 임베딩 (기본값: None)
         :param metadata: 새로운 문서의 메타데이터 (기본값: None)
         """
-        self.collection.update(
-            ids=[document_id],
-            documents=[document] if document else None,
-            embeddings=[embedding] if embedding else None,
-            metadatas=[metadata] if metadata else None
+        self.update_documents(
+            [document_id],
+            documents=[document] if document is not None else None,
+            embeddings=[embedding] if embedding is not None else None,
+            metadatas=[metadata] if metadata is not None else None
         )
 
+    def update_documents(self, ids, documents=None, embeddings=None, metadatas=None):
+        """
+        여러 문서를 max_batch_size개씩 collection.update로 업데이트하는 메소드
+        None인 항목(documents, embeddings, metadatas)은 기존 값을 유지한다.
+        :param ids: 업데이트할 문서 ID 리스트
+        :param documents: 새로운 문서 리스트 (기본값: None)
+        :param embeddings: 새로운 임베딩 리스트 (기본값: None)
+        :param metadatas: 새로운 메타데이터 리스트 (기본값: None)
+        """
+        ids = list(ids)
+        for name, values in (('documents', documents), ('embeddings', embeddings), ('metadatas', metadatas)):
+            if values is not None and len(values) != len(ids):
+                raise ValueError(f"Expected {len(ids)} {name}, got {len(values)}.")
+
+        def batches():
+            for start in range(0, len(ids), self.max_batch_size):
+                end = start + self.max_batch_size
+                yield {
+                    'ids': ids[start:end],
+                    'documents': list(documents[start:end]) if documents is not None else None,
+                    'embeddings': np.asarray(embeddings[start:end], dtype=np.float32) if embeddings is not None else None,
+                    'metadatas': list(metadatas[start:end]) if metadatas is not None else None
+                }
+
+        self._write('update', batches())
+
     def delete_document(self, document_id):
         """
         문서를 삭제하는 메소드
@@ -167,6 +1268,76 @@ class ChromaDB(VectorDB):
         """
         self.collection.delete(ids=[document_id])
 
+    def delete_documents(self, ids):
+        """
+        여러 문서를 max_batch_size개씩 collection.delete로 삭제하는 메소드
+        :param ids: 삭제할 문서 ID 리스트
+        """
+        ids = list(ids)
+        self._write('delete', ({'ids': ids[start:start + self.max_batch_size]} for start in range(0, len(ids), self.max_batch_size)))
+
+    def upsert_documents(self, documents, embeddings, ids, content_hashes=None, metadatas=None):
+        """
+        ID가 이미 있으면 업데이트하고 없으면 추가하는 메소드 (max_batch_size개씩 collection.upsert로 처리)
+        내용 해시는 메타데이터의 'content_hash' 키에 저장된다.
+        :param documents: 문서 리스트
+        :param embeddings: 문서에 해당하는 임베딩 리스트
+        :param ids: 문서 ID 리스트
+        :param content_hashes: 문서 내용 해시 리스트 (기본값: None)
+        :param metadatas: 문서 메타데이터 리스트 (기본값: None)
+        """
+        if content_hashes is not None:
+            metadatas = [
+                dict(metadata or {}, content_hash=content_hash)
+                for metadata, content_hash in zip(metadatas if metadatas is not None else repeat(None), content_hashes, strict=metadatas is not None)
+            ]
+        self._write('upsert', self._row_batches(ids, documents, embeddings, metadatas))
+
+    def get_content_hashes(self):
+        """
+        저장된 모든 문서 ID와 메타데이터의 내용 해시를 반환하는 메소드 (max_batch_size개씩 나눠 조회)
+        :return: 문서 ID -> 내용 해시 딕셔너리 (해시가 없는 문서는 None)
+        """
+        hashes = {}
+        offset = 0
+        while True:
+            results = self.collection.get(include=['metadatas'], limit=self.max_batch_size, offset=offset)
+            metadatas = results.get('metadatas') or [None] * len(results['ids'])
+            for document_id, metadata in zip(results['ids'], metadatas):
+                hashes[document_id] = (metadata or {}).get('content_hash')
+            if len(results['ids']) < self.max_batch_size:
+                return hashes
+            offset += len(results['ids'])
+
+    def get_documents(self, ids):
+        """
+        문서 ID로 문서를 조회하는 메소드 (collection.get 한 번으로 처리)
+        :param ids: 문서 ID 리스트
+        :return: 문서 리스트 (없는 ID는 None)
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=['documents'])
+        found = dict(zip(results['ids'], results['documents']))
+        return [found.get(document_id) for document_id in ids]
+
+    def get_embeddings(self, ids):
+        """
+        문서 ID로 저장된 임베딩을 조회하는 메소드
+        :param ids: 문서 ID 리스트
+        :return: (문서 수 x 차원) float32 배열
+        """
+        ids = list(ids)
+        if not ids:
+            return np.empty((0, 0), dtype=np.float32)
+        results = self.collection.get(ids=ids, include=['embeddings'])
+        found = dict(zip(results['ids'], results['embeddings']))
+        missing = [document_id for document_id in ids if document_id not in found]
+        if missing:
+            raise ValueError(f"Document with id {missing[0]} not found.")
+        return np.asarray([found[document_id] for document_id in ids], dtype=np.float32)
+
     def search(self, query_embedding, k=1, threshold=None, where=None):
         """
         쿼리 임베딩과 유사한 문서를 ChromaDB에서 검색하는 메소드
@@ -176,11 +1347,58 @@ class ChromaDB(VectorDB):
         :param where: 검색 조건 (기본값: None)
         :return: (문서, 유사도) 튜플의 리스트
         """
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k,
-            where=where
-        )
-        distances = results['distances'][0][:k]
-        documents = results['documents'][0][:k]
-        return list(zip(documents, distances))
\ No newline at end of file
+        return [(document, distance) for _, document, distance in self.search_with_ids(query_embedding, k, threshold, where)]
+
+    def search_with_ids(self, query_embedding, k=1, threshold=None, where=None):
+        """
+        쿼리 임베딩과 유사한 문서를 문서 ID와 함께 ChromaDB에서 검색하는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param k: 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 검색 조건 (기본값: None)
+        :return: (문서 ID, 문서, 유사도) 튜플의 리스트
+        """
+        return self._query([query_embedding], k, threshold, where)[0]
+
+    def search_batch(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        여러 쿼리 임베딩을 한 번의 collection.query로 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 검색 조건 (기본값: None)
+        :return: 쿼리별 (문서, 유사도) 튜플 리스트의 리스트
+        """
+        return [
+            [(document, distance) for _, document, distance in results]
+            for results in self._query(query_embeddings, k, threshold, where)
+        ]
+
+    def search_batch_with_ids(self, query_embeddings, k=1, threshold=None, where=None):
+        """
+        여러 쿼리 임베딩을 한 번의 collection.query로 문서 ID와 함께 검색하는 메소드
+        :param query_embeddings: 쿼리 임베딩 리스트
+        :param k: 쿼리마다 검색할 문서의 개수 (기본값: 1)
+        :param threshold: 유사도 임계값 (기본값: None)
+        :param where: 검색 조건 (기본값: None)
+        :return: 쿼리별 (문서 ID, 문서, 유사도) 튜플 리스트의 리스트
+        """
+        return self._query(query_embeddings, k, threshold, where)
+
+    def _query(self, query_embeddings, k, threshold, where):
+        query_embeddings = [np.asarray(query_embedding).tolist() for query_embedding in query_embeddings]
+        batch = []
+        # 쿼리도 max_batch_size개씩 나눠 collection.query 한 번에 보낸다
+        for start in range(0, len(query_embeddings), self.max_batch_size):
+            results = self.collection.query(
+                query_embeddings=query_embeddings[start:start + self.max_batch_size],
+                n_results=k,
+                where=where
+            )
+            ids = results.get('ids') or [[None] * len(documents) for documents in results['documents']]
+            for row_ids, documents, distances in zip(ids, results['documents'], results['distances']):
+                triples = list(zip(row_ids[:k], documents[:k], distances[:k]))
+                if threshold is not None:
+                    triples = [triple for triple in triples if triple[2] <= threshold]
+                batch.append(triples)
+        return batch
\ No newline at end of file
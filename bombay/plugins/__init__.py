@@ -1,5 +1,11 @@
 #bombay/plugins/__init__.py
+from .rerankers import Reranker, CosineReranker, MMRReranker
+from .registry import register_embedding_model, register_query_model, create_embedding_model, create_query_model, available_embedding_models, available_query_models
+from .custom_models import HashingEmbedding, ExtractiveQuery
 
-"""
-아직작성안됨
-"""
\ No newline at end of file
+__all__ = [
+    "Reranker", "CosineReranker", "MMRReranker",
+    "register_embedding_model", "register_query_model", "create_embedding_model", "create_query_model",
+    "available_embedding_models", "available_query_models",
+    "HashingEmbedding", "ExtractiveQuery"
+]
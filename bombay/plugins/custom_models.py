@@ -1,5 +1,156 @@
 #bombay/plugins/custom_models.py
+from functools import lru_cache
+import hashlib
+import re
+import unicodedata
+import numpy as np
+from ..pipeline.embedding_models import EmbeddingModel
+from ..pipeline.query_models import QueryModel
+from ..utils.preprocessing import count_tokens
+from .registry import register_embedding_model, register_query_model
 
-"""
-아직작성안됨
-"""
\ No newline at end of file
+_WORD = re.compile(r'\w+')
+_SENTENCE_END = re.compile(r'(?<=[.!?。])\s+|\n+')
+
+
+def text_features(text, ngram_range=(2, 3)):
+    """
+    텍스트를 단어와 단어 내부 문자 n-gram 특징으로 나누는 함수
+    문자 n-gram은 단어 앞뒤에 경계 표시('<', '>')를 붙여 만들므로 '고양이는'과 '고양이'처럼 조사가 붙은 단어도 특징을 공유한다.
+    :param text: 특징을 추출할 텍스트
+    :param ngram_range: 문자 n-gram 길이의 (최소, 최대) 범위 (기본값: (2, 3), None이면 단어만 사용)
+    :return: 특징 문자열 리스트
+    """
+    words = _WORD.findall(unicodedata.normalize('NFC', text).lower())
+    features = list(words)
+    if ngram_range is not None:
+        low, high = ngram_range
+        for word in words:
+            marked = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend(marked[i:i + n] for i in range(len(marked) - n + 1))
+    return features
+
+@lru_cache(maxsize=1 << 18)
+def _feature_hash(feature):
+    # 프로세스마다 값이 달라지는 내장 hash 대신 blake2b를 사용해 저장한 인덱스와 샤드 워커에서도 같은 벡터를 만든다
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# 네트워크 없이 CPU에서 동작하는 특징 해싱 임베딩 모델
+class HashingEmbedding(EmbeddingModel):
+    def __init__(self, dim=512, ngram_range=(2, 3)):
+        """
+        단어와 문자 n-gram을 해시해 고정 차원 벡터에 누적하는 임베딩 모델 초기화
+        특징마다 부호를 정해 충돌이 서로 상쇄되게 하고, 등장 횟수는 1 + log(tf)로 눌러 긴 문서에서 한 단어가 벡터를 지배하지 않게 한다.
+        학습이나 어휘 사전이 필요 없으므로 개발, 테스트, 벤치마크에서 API 지연 없이 전체 파이프라인을 실행할 수 있다.
+        :param dim: 임베딩 차원 (기본값: 512)
+        :param ngram_range: 문자 n-gram 길이의 (최소, 최대) 범위 (기본값: (2, 3), None이면 단어만 사용)
+        """
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range) if ngram_range is not None else None
+        suffix = f"-c{self.ngram_range[0]}{self.ngram_range[1]}" if self.ngram_range else ''
+        self.model = f"hashing-{dim}{suffix}"
+
+    def embed(self, texts):
+        """
+        텍스트를 임베딩하는 메소드
+        특징 해시까지만 텍스트별로 계산하고, 빈도 계산과 누적은 전체 배치에 대해 NumPy로 한 번에 처리한다.
+        :param texts: 임베딩할 텍스트 리스트
+        :return: 단위 길이로 정규화된 (텍스트 수 x 차원) float32 배열
+        """
+        features = [text_features(text, self.ngram_range) for text in texts]
+        lengths = np.fromiter((len(row) for row in features), dtype=np.int64, count=len(features))
+        codes = np.fromiter((_feature_hash(feature) for row in features for feature in row), dtype=np.uint64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(features), dtype=np.int64), lengths)
+
+        # (행, 특징)별 등장 횟수를 정렬 후 경계 위치로 센다
+        order = np.lexsort((codes, rows))
+        rows, codes = rows[order], codes[order]
+        starts = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (codes[1:] != codes[:-1])]) if len(codes) else np.empty(0, dtype=np.int64)
+        counts = np.diff(np.r_[starts, len(codes)])
+        rows, codes = rows[starts], codes[starts]
+
+        buckets = (codes % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where(codes >> np.uint64(63), -1.0, 1.0)
+        weights = signs * (1.0 + np.log(counts))
+        embeddings = np.bincount(rows * self.dim + buckets, weights=weights, minlength=len(features) * self.dim)
+        embeddings = embeddings.reshape(len(features), self.dim).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def get_dimension(self):
+        """
+        임베딩 차원을 반환하는 메소드
+        :return: 임베딩의 차원
+        """
+        return self.dim
+
+
+# 관련 문서에서 쿼리와 가장 많이 겹치는 문장을 뽑아 답하는 질의 모델
+class ExtractiveQuery(QueryModel):
+    def __init__(self, max_sentences=2, ngram_range=(2, 3)):
+        """
+        추출형 질의 모델 초기화
+        관련 문서를 문장으로 나누고 쿼리와 공유하는 특징 수(문장 길이로 보정)로 점수를 매겨 상위 문장을 원래 순서대로 이어 붙인다.
+        :param max_sentences: 답변에 사용할 최대 문장 수 (기본값: 2)
+        :param ngram_range: 문장과 쿼리를 비교할 문자 n-gram 범위 (기본값: (2, 3), None이면 단어만 사용)
+        """
+        self.max_sentences = max_sentences
+        self.ngram_range = tuple(ngram_range) if ngram_range is not None else None
+        self.model = 'extractive'
+
+    def select_sentences(self, query, relevant_docs):
+        """
+        답변에 사용할 문장을 고르는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 관련 문서 순서를 유지한 문장 리스트 (겹치는 특징이 없으면 첫 문장)
+        """
+        sentences = [sentence.strip() for document in relevant_docs for sentence in _SENTENCE_END.split(document)]
+        sentences = [sentence for sentence in sentences if sentence]
+        if not sentences:
+            return []
+        query_features = set(text_features(query, self.ngram_range))
+        scores = []
+        for sentence in sentences:
+            features = set(text_features(sentence, self.ngram_range))
+            scores.append(len(query_features & features) / np.sqrt(len(features)) if features else 0.0)
+        # 점수가 같으면 앞선 문장을 고른다
+        ranked = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))[:self.max_sentences]
+        chosen = sorted(i for i in ranked if scores[i] > 0) or [0]
+        return [sentences[i] for i in chosen]
+
+    def generate(self, query, relevant_docs):
+        """
+        관련 문서에서 뽑은 문장으로 답변을 만드는 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 선택한 문장을 공백으로 이은 답변 (관련 문서가 없으면 빈 문자열)
+        """
+        answer = ' '.join(self.select_sentences(query, relevant_docs))
+        self._record_usage(query, relevant_docs, answer)
+        return answer
+
+    def generate_stream(self, query, relevant_docs):
+        """
+        선택한 문장을 하나씩 내보내는 제너레이터 메소드
+        :param query: 사용자 쿼리
+        :param relevant_docs: 관련 문서 리스트
+        :return: 답변 조각을 내보내는 제너레이터
+        """
+        sentences = self.select_sentences(query, relevant_docs)
+        self._record_usage(query, relevant_docs, ' '.join(sentences))
+        for i, sentence in enumerate(sentences):
+            yield sentence if i == 0 else ' ' + sentence
+
+    def _record_usage(self, query, relevant_docs, answer):
+        self._set_usage({
+            'prompt_tokens': count_tokens(query) + sum(count_tokens(document) for document in relevant_docs),
+            'completion_tokens': count_tokens(answer)
+        })
+
+
+register_embedding_model('hashing', lambda api_key=None, **options: HashingEmbedding(**options))
+register_query_model('extractive', lambda api_key=None, **options: ExtractiveQuery(**options))
@@ -0,0 +1,89 @@
+#bombay/plugins/registry.py
+from importlib.metadata import entry_points
+
+# 설치된 패키지가 모델을 등록할 때 사용하는 entry point 그룹
+EMBEDDING_MODEL_GROUP = 'bombay.embedding_models'
+QUERY_MODEL_GROUP = 'bombay.query_models'
+
+_embedding_models = {}
+_query_models = {}
+
+
+def _register(registry, name, factory):
+    if factory is not None:
+        registry[name] = factory
+        return factory
+
+    def decorator(factory):
+        registry[name] = factory
+        return factory
+    return decorator
+
+def register_embedding_model(name, factory=None):
+    """
+    create_pipeline에서 이름으로 선택할 수 있도록 임베딩 모델 팩토리를 등록하는 함수
+    데코레이터로도 사용할 수 있으며, 같은 이름을 다시 등록하면 덮어쓴다.
+    :param name: 모델 이름 (create_pipeline의 embedding_model_name)
+    :param factory: factory(api_key, **options) 형태로 호출해 EmbeddingModel을 반환하는 callable (기본값: None, 데코레이터로 사용)
+    :return: 등록한 팩토리 (factory가 None이면 데코레이터)
+    """
+    return _register(_embedding_models, name, factory)
+
+def register_query_model(name, factory=None):
+    """
+    create_pipeline에서 이름으로 선택할 수 있도록 질의 모델 팩토리를 등록하는 함수
+    데코레이터로도 사용할 수 있으며, 같은 이름을 다시 등록하면 덮어쓴다.
+    :param name: 모델 이름 (create_pipeline의 query_model_name)
+    :param factory: factory(api_key, **options) 형태로 호출해 QueryModel을 반환하는 callable (기본값: None, 데코레이터로 사용)
+    :return: 등록한 팩토리 (factory가 None이면 데코레이터)
+    """
+    return _register(_query_models, name, factory)
+
+def _resolve(registry, group, name, kind):
+    factory = registry.get(name)
+    if factory is None:
+        # 등록되지 않은 이름일 때만 entry point를 조회해 다른 플러그인 패키지를 불러오지 않는다
+        for entry_point in entry_points(group=group):
+            if entry_point.name == name:
+                factory = registry[name] = entry_point.load()
+                break
+        else:
+            raise ValueError(f"Unsupported {kind} model: {name} (available: {', '.join(_available(registry, group))})")
+    return factory
+
+def _available(registry, group):
+    return sorted(set(registry) | {entry_point.name for entry_point in entry_points(group=group)})
+
+def create_embedding_model(name, api_key=None, **options):
+    """
+    등록된 이름 또는 'bombay.embedding_models' entry point로 임베딩 모델을 생성하는 함수
+    :param name: 모델 이름
+    :param api_key: API 키 (로컬 모델은 무시, 기본값: None)
+    :param **options: 팩토리에 넘길 추가 인자 (예: model, dim)
+    :return: 생성된 EmbeddingModel
+    """
+    return _resolve(_embedding_models, EMBEDDING_MODEL_GROUP, name, 'embedding')(api_key, **options)
+
+def create_query_model(name, api_key=None, **options):
+    """
+    등록된 이름 또는 'bombay.query_models' entry point로 질의 모델을 생성하는 함수
+    :param name: 모델 이름
+    :param api_key: API 키 (로컬 모델은 무시, 기본값: None)
+    :param **options: 팩토리에 넘길 추가 인자 (예: model, max_sentences)
+    :return: 생성된 QueryModel
+    """
+    return _resolve(_query_models, QUERY_MODEL_GROUP, name, 'query')(api_key, **options)
+
+def available_embedding_models():
+    """
+    선택할 수 있는 임베딩 모델 이름을 반환하는 함수 (entry point 포함)
+    :return: 정렬된 이름 리스트
+    """
+    return _available(_embedding_models, EMBEDDING_MODEL_GROUP)
+
+def available_query_models():
+    """
+    선택할 수 있는 질의 모델 이름을 반환하는 함수 (entry point 포함)
+    :return: 정렬된 이름 리스트
+    """
+    return _available(_query_models, QUERY_MODEL_GROUP)
@@ -0,0 +1,118 @@
+#bombay/plugins/rerankers.py
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class Reranker(ABC):
+    # True이면 파이프라인이 후보 문서의 저장된 임베딩을 벡터 DB에서 가져와 넘겨준다
+    uses_embeddings = True
+    # 반환하는 거리의 기준 ('cosine', 'ip', 'l2'), None이면 RAGPipeline이 자신의 similarity로 채운다
+    similarity = None
+
+    @abstractmethod
+    def rerank(self, query_embedding, candidates, candidate_embeddings, k):
+        """
+        검색 후보를 다시 정렬해 상위 k개를 고르는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param candidates: 근사 검색 순서의 (문서 ID, 문서, 유사도) 튜플 리스트
+        :param candidate_embeddings: candidates와 같은 순서의 (후보 수 x 차원) 임베딩 배열 (uses_embeddings가 False면 None)
+        :param k: 반환할 문서 수
+        :return: (문서 ID, 문서, 유사도) 튜플 리스트
+        """
+        pass
+
+
+def _cosine_similarities(query_embedding, candidate_embeddings):
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    vectors = np.asarray(candidate_embeddings, dtype=np.float32).reshape(-1, len(query))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    return vectors @ query, vectors
+
+def _distances(query_embedding, candidate_embeddings, similarity):
+    """
+    벡터 DB와 같은 기준으로 쿼리와 후보 사이의 거리를 계산하는 함수
+    (cosine: 1 - 코사인 유사도, ip: 1 - 내적, l2: 유클리드 거리의 제곱)
+    :return: (후보 수,) float32 거리 배열
+    """
+    similarity = similarity or 'cosine'
+    if similarity == 'cosine':
+        return 1.0 - _cosine_similarities(query_embedding, candidate_embeddings)[0]
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    vectors = np.asarray(candidate_embeddings, dtype=np.float32).reshape(-1, len(query))
+    if similarity == 'ip':
+        return 1.0 - vectors @ query
+    if similarity == 'l2':
+        difference = vectors - query
+        return np.einsum('ij,ij->i', difference, difference)
+    raise ValueError(f"Unsupported similarity: {similarity}")
+
+
+# 벡터 DB와 같은 기준의 정확한 거리로 다시 정렬하는 리랭커
+class CosineReranker(Reranker):
+    def __init__(self, similarity=None):
+        """
+        정확한 거리 리랭커 초기화
+        :param similarity: 거리 기준 ('cosine', 'ip', 'l2') (기본값: None, 파이프라인의 similarity, 단독 사용 시 cosine)
+        """
+        self.similarity = similarity
+
+    def rerank(self, query_embedding, candidates, candidate_embeddings, k):
+        """
+        근사 검색 후보를 정확한 거리로 다시 정렬하는 메소드
+        HNSW/IVF-PQ 근사 오차로 순서가 바뀐 후보와 키워드 검색으로만 찾은 후보를 벡터 검색과 같은 기준으로 비교하므로,
+        반환하는 거리는 리랭킹하지 않은 검색 결과의 거리와 같은 의미를 가진다.
+        :param query_embedding: 쿼리의 임베딩
+        :param candidates: (문서 ID, 문서, 유사도) 튜플 리스트
+        :param candidate_embeddings: (후보 수 x 차원) 임베딩 배열
+        :param k: 반환할 문서 수
+        :return: 거리 오름차순 (문서 ID, 문서, 거리) 튜플 리스트
+        """
+        if not candidates:
+            return []
+        distances = _distances(query_embedding, candidate_embeddings, self.similarity)
+        order = np.argsort(distances, kind='stable')[:k]
+        return [(candidates[i][0], candidates[i][1], float(distances[i])) for i in order]
+
+
+# Maximal Marginal Relevance 리랭커
+class MMRReranker(Reranker):
+    def __init__(self, lambda_mult=0.5, similarity=None):
+        """
+        관련도와 다양성을 함께 고려하는 MMR 리랭커 초기화
+        이미 고른 문서와 비슷한 후보일수록 점수를 깎아 거의 같은 청크가 컨텍스트를 채우지 않게 한다.
+        선택은 코사인 유사도로 하고, 반환하는 거리는 similarity 기준으로 계산한다.
+        :param lambda_mult: 관련도 가중치, 1.0이면 관련도만, 0.0이면 다양성만 본다 (기본값: 0.5)
+        :param similarity: 반환할 거리 기준 ('cosine', 'ip', 'l2') (기본값: None, 파이프라인의 similarity, 단독 사용 시 cosine)
+        """
+        if not 0.0 <= lambda_mult <= 1.0:
+            raise ValueError("lambda_mult must be between 0 and 1.")
+        self.lambda_mult = lambda_mult
+        self.similarity = similarity
+
+    def rerank(self, query_embedding, candidates, candidate_embeddings, k):
+        """
+        MMR 점수(lambda * 쿼리 유사도 - (1 - lambda) * 선택된 문서와의 최대 유사도)가 높은 순으로 k개를 고르는 메소드
+        :param query_embedding: 쿼리의 임베딩
+        :param candidates: (문서 ID, 문서, 유사도) 튜플 리스트
+        :param candidate_embeddings: (후보 수 x 차원) 임베딩 배열
+        :param k: 반환할 문서 수
+        :return: 선택 순서의 (문서 ID, 문서, 거리) 튜플 리스트
+        """
+        if not candidates:
+            return []
+        similarities, vectors = _cosine_similarities(query_embedding, candidate_embeddings)
+        pairwise = vectors @ vectors.T
+        redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+        available = np.ones(len(candidates), dtype=bool)
+        selected = []
+        for _ in range(min(k, len(candidates))):
+            penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+            scores = self.lambda_mult * similarities - (1.0 - self.lambda_mult) * penalty
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            available[best] = False
+            np.maximum(redundancy, pairwise[best], out=redundancy)
+        distances = _distances(query_embedding, candidate_embeddings, self.similarity)
+        return [(candidates[i][0], candidates[i][1], float(distances[i])) for i in selected]
@@ -1,7 +1,7 @@
 # bombay/templates.py
 def get_project_templates():
     return {
-        "Basic": """from bombay.pipeline.bombay import create_pipeline, run_pipeline
+        "Basic": """from bombay.pipeline import create_pipeline, run_pipeline
 from dotenv import load_dotenv
 import os
 
@@ -36,7 +36,7 @@ print(f"Query: {query}")
 print(f"Answer: {result['answer']}")
 """,
 
-        "Chatbot": """from bombay.pipeline.bombay import create_pipeline, run_pipeline
+        "Chatbot": """from bombay.pipeline import create_pipeline, run_pipeline
 from dotenv import load_dotenv
 import os
 
@@ -68,14 +68,19 @@ while True:
     if user_input.lower() in ["exit", "quit"]:
         break
     
-    result = run_pipeline(pipeline, documents, user_input, k=1)
-    print(f"Assistant: {result['answer']}")
+    result = run_pipeline(pipeline, documents, user_input, k=1, stream=True)
+    print("Assistant: ", end="", flush=True)
+    for token in result['answer_stream']:
+        print(token, end="", flush=True)
+    print()
 """,
-        "Web App": """from bombay.pipeline.bombay import create_pipeline, run_pipeline
+        "Web App": """from bombay.pipeline import create_pipeline
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
+import json
 import os
 
 load_dotenv()
@@ -89,16 +94,20 @@ pipeline = create_pipeline(
     vector_db='$vector_db',
     api_key=api_key,
     similarity='cosine',
-    use_persistent_storage=$use_persistent_storage
+    use_persistent_storage=$use_persistent_storage,
+    index_path=$index_path,
+    use_async=True
 )
 
-# Add documents
+# Add documents (skipped when a saved index was loaded)
 documents = [
     "Document 1 text goes here...",
     "Document 2 text goes here...",
     "Document 3 text goes here..."
 ]
-pipeline.add_documents(documents)
+if not pipeline.index_loaded:
+    pipeline.add_documents(documents)
+    pipeline.save()
 
 # FastAPI app
 app = FastAPI()
@@ -110,11 +119,32 @@ class QueryRequest(BaseModel):
 async def query_endpoint(request: QueryRequest):
     query = request.query
     try:
-        result = run_pipeline(pipeline, documents, query, k=1)
+        result = await pipeline.asearch_and_answer(query, k=1)
         return {"query": query, "answer": result['answer']}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_stream_endpoint(request: QueryRequest):
+    query = request.query
+    try:
+        result = await pipeline.asearch_and_answer(query, k=1, stream=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        # Retrieved documents are sent before the first token
+        context = {
+            "relevant_docs": list(result['relevant_docs']),
+            "distances": [float(distance) for distance in result['distances']]
+        }
+        yield f"event: context\\ndata: {json.dumps(context)}\\n\\n"
+        async for token in result['answer_stream']:
+            yield f"event: token\\ndata: {json.dumps(token)}\\n\\n"
+        yield "event: done\\ndata: {}\\n\\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 if __name__ == '__main__':
     uvicorn.run(app, host='0.0.0.0', port=8000)
 """
@@ -1,6 +1,6 @@
 # bombay/utils/__init__.py
 from .config import Config
 from .logging import logger
-from .preprocessing import preprocess_text
+from .preprocessing import preprocess_text, count_tokens, content_hash, chunk_text, iter_chunks, iter_file_chunks
 
-__all__ = ["Config", "logger", "preprocess_text"]
\ No newline at end of file
+__all__ = ["Config", "logger", "preprocess_text", "count_tokens", "content_hash", "chunk_text", "iter_chunks", "iter_file_chunks"]
\ No newline at end of file
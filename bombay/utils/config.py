@@ -1,7 +1,20 @@
 # bombay/utils/config.py
+import os
 import yaml
 
+# 패키지에 포함된 기본 설정 파일 경로
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.yaml')
+
 class Config:
-    def __init__(self, config_path):
+    def __init__(self, config_path=DEFAULT_CONFIG_PATH):
         with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
\ No newline at end of file
+            self.config = yaml.safe_load(f) or {}
+
+    def get(self, section, default=None):
+        """
+        설정 섹션을 반환하는 메소드
+        :param section: 섹션 이름 (예: 'hnswlib')
+        :param default: 섹션이 없을 때 반환할 값 (기본값: None)
+        :return: 섹션 값
+        """
+        return self.config.get(section, default)
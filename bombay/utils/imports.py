@@ -0,0 +1,46 @@
+# bombay/utils/imports.py
+import importlib
+
+
+def lazy_import(name):
+    """
+    처음 속성에 접근할 때 실제로 불러오는 모듈을 반환하는 함수
+    chromadb, openai처럼 불러오는 데 오래 걸리는 백엔드를 사용하지 않는 경우에는 import 비용을 내지 않는다.
+    설치되지 않은 모듈이면 사용하는 시점에 ImportError를 일으킨다.
+    :param name: 모듈 이름
+    :return: 모듈 대리 객체
+    """
+    return _LazyModule(name)
+
+
+# 처음 사용할 때 모듈을 불러오는 대리 객체
+class _LazyModule:
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            # import_module은 모듈별 import 락을 잡으므로 여러 스레드가 동시에 처음 접근해도 안전하다
+            try:
+                module = importlib.import_module(self._name)
+            except ModuleNotFoundError as e:
+                if e.name != self._name:
+                    raise
+                raise ImportError(f"'{self._name}' is required for this backend. Install it with 'pip install {self._name}'.") from e
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __delattr__(self, attribute):
+        delattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
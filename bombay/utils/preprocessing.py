@@ -1,5 +1,220 @@
 # bombay/utils/preprocessing.py
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+import re
+import unicodedata
+
+# 디렉터리에서 읽을 기본 파일 확장자
+DEFAULT_EXTENSIONS = ('.txt', '.md')
+
+# 공백을 제외한 제어 문자
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
 
 def preprocess_text(text):
-    # Add text preprocessing logic here
-    return text
\ No newline at end of file
+    """
+    텍스트를 정규화하는 함수
+    유니코드 NFC 정규화 후 제어 문자를 지우고 연속된 공백을 하나로 줄인다.
+    :param text: 정규화할 텍스트
+    :return: 정규화된 텍스트
+    """
+    text = _CONTROL_CHARS.sub('', unicodedata.normalize('NFC', text))
+    return ' '.join(text.split())
+
+def count_tokens(text):
+    """
+    텍스트의 토큰 수를 근사하는 함수
+    ASCII 문자는 약 4자당 1토큰, 그 외 문자(한글 등)는 1자당 1토큰으로 계산한다.
+    :param text: 토큰 수를 셀 텍스트
+    :return: 근사 토큰 수
+    """
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+def content_hash(text):
+    """
+    문서 내용의 해시를 계산하는 함수 (sync_documents에서 변경 여부 판단에 사용)
+    :param text: 문서 텍스트
+    :return: SHA-256 16진수 문자열
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def iter_files(paths, extensions=DEFAULT_EXTENSIONS):
+    """
+    파일과 디렉터리 경로에서 읽을 파일 경로를 차례로 내보내는 제너레이터
+    디렉터리는 하위 디렉터리까지 이름 순으로 탐색하며 extensions에 해당하는 파일만 내보낸다.
+    :param paths: 파일 또는 디렉터리 경로, 또는 경로 리스트
+    :param extensions: 디렉터리에서 읽을 파일 확장자 튜플 (기본값: ('.txt', '.md'))
+    :return: 파일 경로를 내보내는 제너레이터
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    for path in paths:
+        path = os.fspath(path)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(tuple(extensions)):
+                    yield os.path.join(root, name)
+
+def read_lines(path, encoding='utf-8'):
+    """
+    파일을 한 줄씩 읽는 제너레이터 (파일 전체를 메모리에 올리지 않는다)
+    :param path: 파일 경로
+    :param encoding: 파일 인코딩 (기본값: 'utf-8', 디코딩할 수 없는 바이트는 대체 문자로 바꾼다)
+    :return: 줄을 내보내는 제너레이터
+    """
+    with open(path, encoding=encoding, errors='replace') as f:
+        yield from f
+
+def chunk_text(text, max_tokens=512, overlap=64):
+    """
+    텍스트를 토큰 수 기준으로 겹치는 청크로 나누는 제너레이터
+    단어 경계에서 자르며, max_tokens보다 긴 단어는 글자 단위로 자른다.
+    :param text: 나눌 텍스트 또는 텍스트 조각(줄)의 이터러블
+    :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+    :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+    :return: 정규화된 청크를 내보내는 제너레이터
+    """
+    if max_tokens <= 0 or not 0 <= overlap < max_tokens:
+        raise ValueError("max_tokens must be positive and overlap must be in [0, max_tokens).")
+    pieces = [text] if isinstance(text, str) else text
+    # 청크의 토큰 수를 count_tokens와 같게 계산하도록 ASCII/비ASCII 글자 수를 따로 센다 (단어 사이 공백 포함)
+    window = deque()
+    ascii_chars = other_chars = 0
+    fresh = 0
+    for word in _iter_words(pieces, max_tokens):
+        word_ascii = len(word.encode('ascii', 'ignore'))
+        word_other = len(word) - word_ascii
+        if fresh and _chunk_tokens(ascii_chars + word_ascii + 1, other_chars + word_other) > max_tokens:
+            yield ' '.join(w for w, _, _ in window)
+            fresh = 0
+            while window and (_chunk_tokens(ascii_chars, other_chars) > overlap or
+                              _chunk_tokens(ascii_chars + word_ascii + 1, other_chars + word_other) > max_tokens):
+                _, removed_ascii, removed_other = window.popleft()
+                ascii_chars -= removed_ascii + 1
+                other_chars -= removed_other
+        window.append((word, word_ascii, word_other))
+        ascii_chars += word_ascii + 1
+        other_chars += word_other
+        fresh += 1
+    if fresh:
+        yield ' '.join(w for w, _, _ in window)
+
+def iter_chunks(documents, max_tokens=512, overlap=64, workers=1):
+    """
+    문서들을 청크로 나누는 제너레이터
+    :param documents: 문서 텍스트의 이터러블 (리스트일 필요 없음)
+    :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+    :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+    :param workers: 청크 분할에 사용할 프로세스 수, 1이면 현재 프로세스에서 처리 (기본값: 1)
+    :return: (문서 번호, 청크) 튜플을 내보내는 제너레이터
+    """
+    if workers <= 1:
+        for i, document in enumerate(documents):
+            for chunk in chunk_text(document, max_tokens, overlap):
+                yield i, chunk
+        return
+    tasks = ((chunk_document, document, max_tokens, overlap) for document in documents)
+    for i, chunks in enumerate(_parallel_map(tasks, workers)):
+        for chunk in chunks:
+            yield i, chunk
+
+def iter_file_chunks(paths, max_tokens=512, overlap=64, extensions=DEFAULT_EXTENSIONS, encoding='utf-8', workers=1):
+    """
+    파일을 한 줄씩 읽어 청크로 나누는 제너레이터
+    메모리에는 현재 청크와 겹치는 부분만 유지하므로 큰 파일도 일정한 메모리로 처리한다.
+    workers가 2 이상이면 파일 단위로 프로세스 풀에 나누어 처리하며, 이때는 진행 중인 파일의 청크가 메모리에 올라간다.
+    :param paths: 파일 또는 디렉터리 경로, 또는 경로 리스트
+    :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+    :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+    :param extensions: 디렉터리에서 읽을 파일 확장자 튜플 (기본값: ('.txt', '.md'))
+    :param encoding: 파일 인코딩 (기본값: 'utf-8')
+    :param workers: 청크 분할에 사용할 프로세스 수, 1이면 현재 프로세스에서 처리 (기본값: 1)
+    :return: (파일 경로, 청크) 튜플을 내보내는 제너레이터
+    """
+    if workers <= 1:
+        for path in iter_files(paths, extensions):
+            for chunk in chunk_text(read_lines(path, encoding), max_tokens, overlap):
+                yield path, chunk
+        return
+    paths = list(iter_files(paths, extensions))
+    tasks = ((chunk_file, path, max_tokens, overlap, encoding) for path in paths)
+    for path, chunks in zip(paths, _parallel_map(tasks, workers)):
+        for chunk in chunks:
+            yield path, chunk
+
+def chunk_document(document, max_tokens=512, overlap=64):
+    """
+    문서 하나를 청크 리스트로 나누는 함수 (프로세스 풀 작업 단위)
+    :param document: 문서 텍스트
+    :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+    :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+    :return: 청크 리스트
+    """
+    return list(chunk_text(document, max_tokens, overlap))
+
+def chunk_file(path, max_tokens=512, overlap=64, encoding='utf-8'):
+    """
+    파일 하나를 청크 리스트로 나누는 함수 (프로세스 풀 작업 단위)
+    :param path: 파일 경로
+    :param max_tokens: 청크 하나의 최대 토큰 수 (기본값: 512)
+    :param overlap: 이웃한 청크가 겹치는 최대 토큰 수 (기본값: 64)
+    :param encoding: 파일 인코딩 (기본값: 'utf-8')
+    :return: 청크 리스트
+    """
+    return list(chunk_text(read_lines(path, encoding), max_tokens, overlap))
+
+def batched(iterable, batch_size):
+    """
+    이터러블을 batch_size개씩 묶어 내보내는 제너레이터
+    :param iterable: 묶을 이터러블
+    :param batch_size: 묶음 크기
+    :return: 리스트를 내보내는 제너레이터 (마지막 묶음은 더 작을 수 있음)
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive.")
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _chunk_tokens(ascii_chars, other_chars):
+    # ascii_chars는 단어마다 공백 하나를 더한 값이므로 마지막 공백을 뺀다
+    ascii_chars = max(ascii_chars - 1, 0)
+    return (ascii_chars + 3) // 4 + other_chars
+
+def _iter_words(pieces, max_tokens):
+    for piece in pieces:
+        for word in preprocess_text(piece).split(' '):
+            if not word:
+                continue
+            if count_tokens(word) <= max_tokens:
+                yield word
+                continue
+            # 한 글자는 최대 1토큰이므로 max_tokens 글자씩 자르면 예산을 넘지 않는다
+            for start in range(0, len(word), max_tokens):
+                yield word[start:start + max_tokens]
+
+def _parallel_map(tasks, workers):
+    """
+    (함수, 인자...) 작업을 프로세스 풀에서 실행하고 결과를 입력 순서대로 내보내는 제너레이터
+    동시에 제출하는 작업을 workers의 두 배로 제한해 소비자가 느려도 결과가 쌓이지 않게 한다.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for function, *args in tasks:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
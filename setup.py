@@ -9,6 +9,7 @@ setup(
     version='0.1.5',  
     packages=find_packages(),
     include_package_data=True,
+    package_data={'bombay': ['config.yaml']},
     install_requires=[
         'numpy',
         'hnswlib',
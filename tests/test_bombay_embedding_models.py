@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from bombay.pipeline.embedding_models import OpenAIEmbedding
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fail_first=0, fail_status=429):
+        super().__init__(('127.0.0.1', 0), FakeEmbeddingHandler)
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.lock = threading.Lock()
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            if server.fail_first > 0:
+                server.fail_first -= 1
+                self._send(server.fail_status, {'error': {'message': 'try again', 'type': 'rate_limit'}}, {'retry-after': '0'})
+                return
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.batch_sizes.append(len(body['input']))
+        threading.Event().wait(0.02)
+        data = [
+            {'object': 'embedding', 'index': i, 'embedding': [float(len(text)), float(i), 1.0]}
+            for i, text in enumerate(body['input'])
+        ]
+        # 순서 복원을 확인하기 위해 역순으로 응답한다
+        self._send(200, {
+            'object': 'list',
+            'data': list(reversed(data)),
+            'model': body['model'],
+            'usage': {'prompt_tokens': len(data), 'total_tokens': len(data)}
+        })
+        with server.lock:
+            server.in_flight -= 1
+
+    def _send(self, status, payload, headers=None):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+@pytest.fixture
+def embedding_server():
+    servers = []
+
+    def start(**kwargs):
+        server = FakeEmbeddingServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_embed_splits_batches_concurrently_and_keeps_order(embedding_server):
+    server, base_url = embedding_server()
+    model = OpenAIEmbedding('dummy', 'text-embedding-ada-002', max_batch_size=4, max_concurrency=3, base_url=base_url)
+    texts = ['x' * i for i in range(1, 11)]
+    embeddings = model.embed(texts)
+
+    assert [embedding[0] for embedding in embeddings] == [float(i) for i in range(1, 11)]
+    assert sorted(server.batch_sizes) == [2, 4, 4]
+    assert server.max_in_flight > 1
+    stats = model.get_stats()
+    assert stats['texts'] == 10
+    assert stats['requests'] == 3
+    assert stats['texts_per_second'] > 0
+
+
+def test_embed_splits_on_token_budget(embedding_server):
+    server, base_url = embedding_server()
+    model = OpenAIEmbedding('dummy', 'text-embedding-ada-002', max_batch_tokens=10, base_url=base_url)
+    model.embed(['a' * 20, 'b' * 20, 'c' * 20])
+    assert sorted(server.batch_sizes) == [1, 2]
+
+
+def test_embed_retries_rate_limited_requests(embedding_server):
+    server, base_url = embedding_server(fail_first=2)
+    model = OpenAIEmbedding('dummy', 'text-embedding-ada-002', backoff_base=0.01, base_url=base_url)
+    assert len(model.embed(['hello', 'world'])) == 2
+    assert model.get_stats()['retries'] == 2
+
+
+def test_embed_gives_up_after_max_retries(embedding_server):
+    server, base_url = embedding_server(fail_first=10, fail_status=503)
+    model = OpenAIEmbedding('dummy', 'text-embedding-ada-002', max_retries=1, backoff_base=0.01, base_url=base_url)
+    with pytest.raises(Exception):
+        model.embed(['hello'])
+    assert model.get_stats()['failures'] == 1
+
+
+def test_aembed_batches_concurrently_and_keeps_order(embedding_server):
+    server, base_url = embedding_server(fail_first=1)
+    model = OpenAIEmbedding('dummy', 'text-embedding-ada-002', max_batch_size=3, max_concurrency=4,
+                            backoff_base=0.01, base_url=base_url)
+    texts = ['y' * i for i in range(1, 10)]
+    embeddings = asyncio.run(model.aembed(texts))
+    assert [embedding[0] for embedding in embeddings] == [float(i) for i in range(1, 10)]
+    assert sorted(server.batch_sizes) == [3, 3, 3]
+    assert model.get_stats()['retries'] == 1
@@ -0,0 +1,131 @@
+import json
+import numpy as np
+import pytest
+from bombay.cli import main
+from bombay.evaluation import (recall_at_k, reciprocal_rank, latency_summary, exact_match, token_f1, rouge_l,
+                               synthetic_dataset, exact_neighbors, benchmark_vector_db, run_benchmark,
+                               FakeEmbedding, FakeQueryModel, load_dataset, query_cost, evaluate_pipeline,
+                               compare_configurations, comparison_table)
+from bombay.pipeline.rag_pipeline import RAGPipeline
+from bombay.pipeline.vector_db import HNSWLib
+
+
+def test_retrieval_metrics():
+    assert recall_at_k([1, 2, 3], [3, 4], k=2) == 0.0
+    assert recall_at_k([1, 2, 3], [3, 4], k=3) == 0.5
+    assert recall_at_k([5], [5], k=10) == 1.0
+    assert reciprocal_rank([7, 8, 9], [9]) == pytest.approx(1 / 3)
+    assert reciprocal_rank([7, 8], [1]) == 0.0
+    summary = latency_summary([0.001] * 99 + [0.1])
+    assert summary['p50'] == pytest.approx(1.0)
+    assert summary['max'] == pytest.approx(100.0)
+
+
+@pytest.mark.parametrize('similarity', ['cosine', 'ip', 'l2'])
+def test_exact_neighbors_matches_brute_force(similarity):
+    rng = np.random.default_rng(0)
+    embeddings, queries = rng.standard_normal((50, 4)), rng.standard_normal((5, 4))
+    neighbors = exact_neighbors(embeddings, queries, 3, similarity)
+    for query, row in zip(queries, neighbors):
+        if similarity == 'l2':
+            distances = ((embeddings - query) ** 2).sum(axis=1)
+        elif similarity == 'ip':
+            distances = -embeddings @ query
+        else:
+            distances = -(embeddings @ query) / np.linalg.norm(embeddings, axis=1)
+        assert row.tolist() == np.argsort(distances)[:3].tolist()
+
+
+def test_benchmark_vector_db_reports_quality_and_latency():
+    embeddings, queries = synthetic_dataset(num_documents=500, num_queries=20, dim=16, seed=1)
+    result = benchmark_vector_db(lambda: HNSWLib(16, ef_search=100), embeddings, queries, k=5, batch_size=128)
+    assert result['backend'] == 'HNSWLib'
+    assert result['recall_at_k'] >= 0.95
+    assert 0 < result['mrr'] <= 1.0
+    assert result['qps'] > 0 and result['build_time'] > 0
+    assert set(result['latency_ms']) == {'mean', 'p50', 'p95', 'p99', 'max'}
+
+
+def test_run_benchmark_exact_backend_has_perfect_recall():
+    report = run_benchmark(backends=['numpy'], k=5, num_documents=300, num_queries=10, dim=8)
+    assert report['dataset']['source'] == 'synthetic'
+    assert report['results'][0]['recall_at_k'] == 1.0
+    with pytest.raises(ValueError):
+        run_benchmark(backends=['faiss'])
+
+
+def test_chromadb_benchmark_uses_requested_metric():
+    rng = np.random.default_rng(0)
+    embeddings = (rng.normal(size=(300, 8)) * rng.uniform(0.1, 10.0, size=(300, 1))).astype(np.float32)
+    queries = rng.normal(size=(10, 8)).astype(np.float32)
+    report = run_benchmark(backends=['chromadb'], embeddings=embeddings, queries=queries, k=5, similarity='cosine')
+    assert report['results'][0]['recall_at_k'] >= 0.9
+
+
+def test_bench_cli_emits_json(capsys, tmp_path):
+    embeddings, queries = synthetic_dataset(num_documents=200, num_queries=5, dim=8)
+    np.save(tmp_path / "docs.npy", embeddings)
+    np.save(tmp_path / "queries.npy", queries)
+    main(['bench', '--backends', 'numpy', 'hnswlib', '--k', '3',
+          '--embeddings', str(tmp_path / "docs.npy"), '--queries', str(tmp_path / "queries.npy"),
+          '--params', '{"hnswlib": {"ef_search": 64}}'])
+    report = json.loads(capsys.readouterr().out)
+    assert report['dataset']['source'] == 'loaded'
+    assert [result['backend'] for result in report['results']] == ['numpy', 'hnswlib']
+    assert report['results'][1]['params'] == {'ef_search': 64}
+
+
+CORPUS = {
+    'cat': "Cats are small domesticated carnivorous mammals that sleep a lot.",
+    'dog': "Dogs are loyal domesticated animals descended from wolves.",
+    'tea': "Green tea is made from unoxidized leaves of the tea plant.",
+    'rust': "Rust is a systems programming language focused on memory safety.",
+}
+DATASET = [
+    {'question': "Which mammals sleep a lot?", 'expected_ids': ['cat'], 'reference_answer': CORPUS['cat']},
+    {'question': "What animals descended from wolves?", 'expected_ids': ['dog'], 'reference_answer': CORPUS['dog']},
+    {'question': "How is green tea made from leaves?", 'expected_ids': ['tea'], 'reference_answer': CORPUS['tea']},
+    {'question': "Which programming language focuses on memory safety?", 'expected_ids': ['rust'],
+     'reference_answer': "Rust"},
+]
+
+
+def test_answer_overlap_metrics():
+    assert exact_match("Hello, World!", "hello world") == 1.0
+    assert token_f1("the cat sat", "cat sat on mat") == pytest.approx(4 / 7)
+    assert rouge_l("the cat sat on", "cat on the mat") == pytest.approx(0.5)
+    assert query_cost({'embedding_tokens': 1000, 'prompt_tokens': 2000, 'completion_tokens': 500},
+                      {'embedding': 0.1, 'prompt': 1.0, 'completion': 2.0}) == pytest.approx(0.0031)
+
+
+def test_evaluate_pipeline_offline_with_fakes(tmp_path):
+    pipeline = RAGPipeline(FakeEmbedding(), FakeQueryModel(latency=0.01), vector_db='numpy')
+    pipeline.sync_documents(list(CORPUS.values()), list(CORPUS))
+    path = tmp_path / "dataset.jsonl"
+    path.write_text('\n'.join(json.dumps(item) for item in DATASET), encoding='utf-8')
+
+    report = evaluate_pipeline(pipeline, load_dataset(path), k=2, concurrency=4, prices={'prompt': 1.0})
+    summary = report['summary']
+    assert summary['queries'] == 4
+    assert summary['hit_rate'] == 1.0
+    assert summary['mrr'] == 1.0
+    assert summary['exact_match'] == 0.75
+    assert summary['tokens']['prompt_tokens'] > 0
+    assert summary['cost'] == pytest.approx(summary['tokens']['prompt_tokens'] / 1e6)
+    assert summary['latency_ms']['generate']['p50'] >= 10
+    assert report['items'][0]['retrieved_ids'][0] == 'cat'
+
+
+def test_compare_configurations_side_by_side():
+    report = compare_configurations(
+        {
+            'numpy-k': lambda: RAGPipeline(FakeEmbedding(dim=128), FakeQueryModel(), vector_db='numpy'),
+            'hnsw-tiny-dim': lambda: RAGPipeline(FakeEmbedding(dim=2), FakeQueryModel(), vector_db='hnswlib'),
+        },
+        list(CORPUS.values()), list(CORPUS), DATASET, k=1
+    )
+    assert set(report['configurations']) == {'numpy-k', 'hnsw-tiny-dim'}
+    assert report['configurations']['numpy-k']['summary']['hit_rate'] == 1.0
+    table = comparison_table(report).splitlines()
+    assert table[0].split()[:3] == ['config', 'hit_rate', 'mrr']
+    assert [line.split()[0] for line in table[1:]] == ['numpy-k', 'hnsw-tiny-dim']
@@ -1,9 +1,23 @@
 import pytest
 from unittest.mock import Mock, patch
 import numpy as np
-from bombay.pipeline.rag_pipeline import RAGPipeline
-from bombay.pipeline.vector_db import HNSWLib, ChromaDB
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from bombay.pipeline.rag_pipeline import RAGPipeline, AsyncRAGPipeline, run_pipeline
+from bombay.pipeline.embedding_models import EmbeddingModel
+from bombay.pipeline.query_models import QueryModel, OpenAIQuery
+from bombay.pipeline.vector_db import HNSWLib, NumpyFlatDB, ChromaDB
+from bombay.pipeline.sharded import ShardedVectorDB, shard_of
+from bombay.pipeline.ivfpq import IVFPQDB
+from bombay.pipeline.embedding_cache import CachedEmbedding, EmbeddingCache
+from bombay.pipeline.answer_cache import AnswerCache
+from bombay.pipeline.context import ContextBudgeter
+from bombay.pipeline.lexical import BM25Index, reciprocal_rank_fusion
 from bombay.utils.config import Config
+from bombay.utils.preprocessing import count_tokens
 
 @pytest.fixture
 def mock_config():
@@ -72,4 +86,903 @@ def test_rag_pipeline_search_and_answer(mock_embedding, mock_query, mock_config)
     assert 'relevant_docs' in result
     assert 'distances' in result
     assert 'answer' in result
-    assert result['answer'] == "This is a mock answer."
\ No newline at end of file
+    assert result['answer'] == "This is a mock answer."
+
+def test_hnswlib_delete_keeps_search_consistent():
+    hnswlib_db = HNSWLib(dim=3)
+    documents = ["doc1", "doc2", "doc3"]
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    ids = hnswlib_db.add_documents(documents, embeddings)
+    assert ids == [0, 1, 2]
+
+    hnswlib_db.delete_document(0)
+    results = hnswlib_db.search([0.0, 0.0, 1.0], k=5)
+    assert [doc for doc, _ in results][0] == "doc3"
+    assert "doc1" not in [doc for doc, _ in results]
+    assert len(results) == 2
+
+    with pytest.raises(ValueError):
+        hnswlib_db.delete_document(0)
+
+def test_hnswlib_reuses_deleted_labels():
+    hnswlib_db = HNSWLib(dim=3)
+    hnswlib_db.add_documents(["doc1", "doc2"], np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]))
+    hnswlib_db.delete_document(1)
+    ids = hnswlib_db.add_documents(["doc3"], np.array([[0.0, 0.0, 1.0]]), ids=["custom"])
+    assert ids == ["custom"]
+    assert hnswlib_db.index.element_count == 2
+    assert hnswlib_db.search([0.0, 0.0, 1.0], k=1)[0][0] == "doc3"
+
+    hnswlib_db.update_document("custom", "doc3-updated", [0.0, 1.0, 0.0])
+    assert hnswlib_db.search([0.0, 1.0, 0.0], k=1)[0][0] == "doc3-updated"
+    assert len(hnswlib_db) == 2
+
+
+def test_cached_embedding_only_embeds_misses(tmp_path):
+    model = Mock()
+    model.model = 'mock-model'
+    model.embed.side_effect = lambda texts: [[float(len(text)), 1.0, 0.0] for text in texts]
+    cache_path = str(tmp_path / 'embeddings.sqlite')
+    cached = CachedEmbedding(model, cache_path)
+
+    first = cached.embed(["doc1", "doc22", "doc1"])
+    assert model.embed.call_args[0][0] == ["doc1", "doc22"]
+    assert first.shape == (3, 3)
+
+    second = cached.embed(["doc22", "  doc1 ", "doc333"])
+    assert model.embed.call_args[0][0] == ["doc333"]
+    assert np.allclose(second[1], first[0])
+    assert cached.get_stats()['hit_rate'] == pytest.approx(3 / 6)
+
+    cached.cache.close()
+    reopened = CachedEmbedding(model, cache_path)
+    reopened.embed(["doc1"])
+    assert model.embed.call_count == 2
+    assert reopened.get_stats()['hits'] == 1
+
+def test_embedding_cache_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, memory_entries=1)
+    cache.put_many([(b'a', [1.0]), (b'b', [2.0])])
+    cache.get_many([b'a'])
+    cache.put_many([(b'c', [3.0])])
+    cache.memory.clear()
+    assert sorted(cache.get_many([b'a', b'b', b'c'])) == [b'a', b'c']
+    assert len(cache) == 2
+
+def test_embedding_cache_memory_hits_refresh_disk_recency():
+    cache = EmbeddingCache(max_entries=2, memory_entries=2)
+    cache.put_many([(b'a', [1.0]), (b'b', [2.0])])
+    assert sorted(cache.get_many([b'a'])) == [b'a']
+    cache.put_many([(b'c', [3.0])])
+    cache.memory.clear()
+    assert sorted(cache.get_many([b'a', b'b', b'c'])) == [b'a', b'c']
+
+def test_hnswlib_save_and_load(tmp_path):
+    hnswlib_db = HNSWLib(dim=3)
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    hnswlib_db.add_documents(["doc1", "문서2", "doc3"], embeddings)
+    hnswlib_db.delete_document(0)
+    path = str(tmp_path / 'index.bin')
+    hnswlib_db.save(path)
+
+    loaded = HNSWLib.load(path)
+    assert len(loaded) == 2
+    assert loaded.search([0.0, 1.0, 0.0], k=1)[0][0] == "문서2"
+    assert [doc for doc, _ in loaded.search([1.0, 0.0, 0.0], k=5)] != ["doc1"]
+
+    ids = loaded.add_documents(["doc4"], np.array([[1.0, 0.0, 0.0]]))
+    assert ids == [3]
+    loaded.update_document(1, "doc2-updated", [0.0, 1.0, 0.0])
+    assert loaded.search([1.0, 0.0, 0.0], k=1)[0][0] == "doc4"
+    assert loaded.search([0.0, 1.0, 0.0], k=1)[0][0] == "doc2-updated"
+
+    loaded.save(path)
+    reloaded = HNSWLib.load(path)
+    assert sorted(doc for doc in reloaded.documents if doc is not None) == ["doc2-updated", "doc3", "doc4"]
+
+def test_rag_pipeline_loads_saved_index(mock_embedding, mock_query, tmp_path):
+    path = str(tmp_path / 'index.bin')
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='hnswlib', index_path=path)
+    assert not pipeline.index_loaded
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    pipeline.save()
+
+    restarted = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='hnswlib', index_path=path)
+    assert restarted.index_loaded
+    assert len(restarted.vector_db) == 3
+
+def test_hnswlib_search_batch_matches_search():
+    hnswlib_db = HNSWLib(dim=3)
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    hnswlib_db.add_documents(["doc1", "doc2", "doc3"], embeddings)
+    queries = np.array([[0.9, 0.1, 0.0], [0.0, 0.2, 0.8]])
+    batch = hnswlib_db.search_batch(queries, k=2)
+    assert [[doc for doc, _ in results] for results in batch] == [
+        [doc for doc, _ in hnswlib_db.search(query, k=2)] for query in queries
+    ]
+    assert [len(results) for results in hnswlib_db.search_batch(queries, k=3, threshold=0.5)] == [1, 1]
+
+@patch('bombay.pipeline.vector_db.chromadb.Client')
+def test_chromadb_search_batch(mock_chromadb_client):
+    mock_collection = Mock()
+    mock_chromadb_client.return_value.create_collection.return_value = mock_collection
+    mock_collection.query.return_value = {
+        'documents': [['doc1', 'doc2'], ['doc3', 'doc1']],
+        'distances': [[0.1, 0.2], [0.3, 0.9]]
+    }
+    chromadb_db = ChromaDB(collection_name='test_collection')
+    batch = chromadb_db.search_batch([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], k=2, threshold=0.5)
+    assert mock_collection.query.call_count == 1
+    assert batch == [[('doc1', 0.1), ('doc2', 0.2)], [('doc3', 0.3)]]
+
+@patch('bombay.pipeline.vector_db.chromadb.Client')
+def test_chromadb_chunks_writes_to_max_batch_size(mock_chromadb_client):
+    mock_collection = Mock()
+    mock_chromadb_client.return_value.create_collection.return_value = mock_collection
+    chromadb_db = ChromaDB(collection_name='test_collection', max_batch_size=2)
+    embeddings = np.arange(15, dtype=np.float32).reshape(5, 3)
+
+    ids = chromadb_db.add_documents([f"doc{i}" for i in range(5)], embeddings, ids=[str(i) for i in range(5)])
+    assert ids == ['0', '1', '2', '3', '4']
+    assert [call.kwargs['ids'] for call in mock_collection.add.call_args_list] == [['0', '1'], ['2', '3'], ['4']]
+
+    chromadb_db.upsert_documents(["a", "b", "c"], embeddings[:3], ['0', '1', '9'], ['h0', 'h1', 'h9'],
+                                 metadatas=[{'lang': 'ko'}, None, None])
+    assert mock_collection.upsert.call_count == 2
+    assert mock_collection.upsert.call_args_list[0].kwargs['metadatas'] == [{'lang': 'ko', 'content_hash': 'h0'}, {'content_hash': 'h1'}]
+
+    chromadb_db.update_documents(['0', '1', '2'], metadatas=[{'v': 1}, {'v': 2}, {'v': 3}])
+    assert mock_collection.update.call_count == 2
+    assert mock_collection.update.call_args_list[1].kwargs['embeddings'] is None
+
+    chromadb_db.delete_documents(['0', '1', '2', '3', '4'])
+    assert [call.kwargs['ids'] for call in mock_collection.delete.call_args_list] == [['0', '1'], ['2', '3'], ['4']]
+
+    mock_collection.add.reset_mock()
+    with pytest.raises(ValueError, match="Expected 3 embeddings, got 2"):
+        chromadb_db.add_documents(["a", "b", "c"], embeddings[:2])
+    with pytest.raises(ValueError, match="Expected 2 ids, got 1"):
+        chromadb_db.add_documents(["a", "b"], embeddings[:2], ids=['0'])
+    mock_collection.add.assert_not_called()
+    with pytest.raises(ValueError):
+        chromadb_db.add_documents(iter(["a", "b", "c"]), iter(embeddings[:2]))
+
+@patch('bombay.pipeline.vector_db.chromadb.Client')
+def test_chromadb_close_stops_writer_thread(mock_chromadb_client):
+    import threading
+    mock_chromadb_client.return_value.create_collection.return_value = Mock()
+    with ChromaDB(collection_name='test_collection', max_batch_size=1) as chromadb_db:
+        chromadb_db.add_documents(["a", "b"], np.ones((2, 3), dtype=np.float32))
+        writer = chromadb_db._executor
+        assert any(thread.name.startswith('chromadb-writer') for thread in threading.enumerate())
+    assert chromadb_db._executor is None and writer._shutdown
+    assert not any(thread.name.startswith('chromadb-writer') for thread in threading.enumerate())
+
+def test_rag_pipeline_search_batch_embeds_once(mock_embedding, mock_query):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='hnswlib')
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.reset_mock()
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3], [0.7, 0.8, 0.9]])
+    results = pipeline.search_batch(["query1", "query2"], k=2)
+    mock_embedding.embed.assert_called_once_with(["query1", "query2"])
+    assert [len(result) for result in results] == [2, 2]
+
+@pytest.mark.parametrize('similarity', ['cosine', 'ip', 'l2'])
+def test_numpy_flat_db_exact_search(similarity):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 8)).astype(np.float32)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+    flat_db = NumpyFlatDB(dim=8, similarity=similarity, initial_capacity=16)
+    flat_db.add_documents([f"doc{i}" for i in range(300)], embeddings)
+
+    if similarity == 'cosine':
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        expected = 1 - (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    elif similarity == 'ip':
+        expected = 1 - queries @ embeddings.T
+    else:
+        expected = ((queries[:, None, :] - embeddings[None, :, :]) ** 2).sum(axis=2)
+    results = flat_db.search_batch(queries, k=5)
+    for row, result in zip(expected, results):
+        assert [doc for doc, _ in result] == [f"doc{i}" for i in np.argsort(row)[:5]]
+        assert np.allclose([dist for _, dist in result], np.sort(row)[:5], atol=1e-4)
+
+@pytest.mark.parametrize('dtype', ['float16', 'int8'])
+def test_numpy_flat_db_compressed_storage(dtype):
+    rng = np.random.default_rng(1)
+    embeddings = rng.normal(size=(200, 16)).astype(np.float32)
+    flat_db = NumpyFlatDB(dim=16, dtype=dtype)
+    full_db = NumpyFlatDB(dim=16)
+    flat_db.add_documents([f"doc{i}" for i in range(200)], embeddings)
+    full_db.add_documents([f"doc{i}" for i in range(200)], embeddings)
+    assert flat_db.vectors.nbytes <= full_db.vectors.nbytes // 2
+    assert flat_db.search(embeddings[7], k=1)[0][0] == "doc7"
+
+def test_numpy_flat_db_delete_and_update():
+    flat_db = NumpyFlatDB(dim=3)
+    flat_db.add_documents(["doc1", "doc2", "doc3"], np.eye(3))
+    flat_db.delete_document(0)
+    assert sorted(doc for doc, _ in flat_db.search([1.0, 0.0, 0.0], k=5)) == ["doc2", "doc3"]
+    flat_db.update_document(2, "doc3-updated", [1.0, 0.0, 0.0])
+    assert flat_db.search([1.0, 0.0, 0.0], k=1)[0][0] == "doc3-updated"
+    assert flat_db.search([1.0, 0.0, 0.0], k=1, threshold=-1.0) == []
+
+def test_rag_pipeline_numpy_backend(mock_embedding, mock_query):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='numpy', storage_dtype='float16')
+    assert isinstance(pipeline.vector_db, NumpyFlatDB)
+    assert pipeline.vector_db.dtype == np.float16
+
+
+class SlowAsyncEmbedding(EmbeddingModel):
+    def embed(self, texts):
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    async def aembed(self, texts):
+        await asyncio.sleep(0.05)
+        return self.embed(texts)
+
+    def get_dimension(self):
+        return 3
+
+class SlowAsyncQuery(QueryModel):
+    def generate(self, query, relevant_docs):
+        return f"answer to {query}"
+
+    async def agenerate(self, query, relevant_docs):
+        await asyncio.sleep(0.1)
+        return self.generate(query, relevant_docs)
+
+def test_async_pipeline_serves_queries_concurrently():
+    pipeline = AsyncRAGPipeline(SlowAsyncEmbedding(), SlowAsyncQuery(), vector_db='numpy')
+
+    async def scenario():
+        await pipeline.aadd_documents(["doc1", "doc22", "doc333"])
+        start = time.perf_counter()
+        results = await asyncio.gather(*(pipeline.asearch_and_answer(f"q{i}", k=2) for i in range(20)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(scenario())
+    pipeline.close()
+    assert [result['answer'] for result in results] == [f"answer to q{i}" for i in range(20)]
+    assert all(len(result['relevant_docs']) == 2 for result in results)
+    assert elapsed < 20 * 0.15 / 4
+
+def test_default_async_methods_run_sync_implementation():
+    class SyncQuery(QueryModel):
+        def generate(self, query, relevant_docs):
+            return "sync answer"
+
+    assert asyncio.run(SyncQuery().agenerate("query", ["doc1"])) == "sync answer"
+
+
+class StreamingQuery(QueryModel):
+    def __init__(self):
+        self.started = False
+
+    def generate(self, query, relevant_docs):
+        return ''.join(self.generate_stream(query, relevant_docs))
+
+    def generate_stream(self, query, relevant_docs):
+        self.started = True
+        for token in ["Hello", ", ", "world"]:
+            yield token
+
+def test_run_pipeline_stream_returns_docs_before_tokens(mock_embedding):
+    query_model = StreamingQuery()
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=query_model, vector_db='numpy')
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    result = run_pipeline(pipeline, None, "query", k=2, stream=True)
+    assert len(result['relevant_docs']) == 2
+    assert len(result['distances']) == 2
+    assert not query_model.started
+    assert list(result['answer_stream']) == ["Hello", ", ", "world"]
+
+def test_openai_query_generate_stream_yields_deltas():
+    def chunk(content):
+        return Mock(choices=[Mock(delta=Mock(content=content))])
+
+    query_model = OpenAIQuery('dummy', 'gpt-3.5-turbo')
+    query_model.client = Mock()
+    query_model.client.chat.completions.create.return_value = iter([chunk("Hi"), chunk(None), chunk(" there"), Mock(choices=[])])
+    assert list(query_model.generate_stream("query", ["doc1"])) == ["Hi", " there"]
+    assert query_model.client.chat.completions.create.call_args.kwargs['stream'] is True
+
+def test_openai_query_usage_is_isolated_between_concurrent_streams():
+    class FakeCompletions:
+        async def create(self, messages, **kwargs):
+            query = messages[-1]['content']
+            tokens = 5 if query.endswith("short") else 50
+
+            async def chunks():
+                # 두 스트림의 사용량이 모두 기록된 뒤에 각 스트림이 끝나도록 사용량을 먼저 보낸다
+                yield Mock(choices=[], usage=Mock(prompt_tokens=tokens, completion_tokens=tokens))
+                for token in ["a", "b"]:
+                    await asyncio.sleep(0.01)
+                    yield Mock(choices=[Mock(delta=Mock(content=token))], usage=None)
+            return chunks()
+
+    query_model = OpenAIQuery('dummy', 'gpt-3.5-turbo')
+    query_model._async_client = Mock(chat=Mock(completions=FakeCompletions()))
+    pipeline = AsyncRAGPipeline(SlowAsyncEmbedding(), query_model, vector_db='numpy')
+
+    async def consume(query):
+        result = await pipeline.asearch_and_answer(query, k=1, stream=True)
+        return result, [token async for token in result['answer_stream']]
+
+    async def scenario():
+        await pipeline.aadd_documents(["doc1", "doc22"])
+        return await asyncio.gather(consume("short"), consume("long"))
+
+    (short, _), (long, _) = asyncio.run(scenario())
+    pipeline.close()
+    assert short['usage']['completion_tokens'] == 5
+    assert long['usage']['completion_tokens'] == 50
+
+def test_async_pipeline_stream():
+    pipeline = AsyncRAGPipeline(SlowAsyncEmbedding(), SlowAsyncQuery(), vector_db='numpy')
+
+    async def scenario():
+        await pipeline.aadd_documents(["doc1", "doc22"])
+        result = await pipeline.asearch_and_answer("q", k=1, stream=True)
+        return result, [token async for token in result['answer_stream']]
+
+    result, tokens = asyncio.run(scenario())
+    pipeline.close()
+    assert len(result['relevant_docs']) == 1
+    assert tokens == ["answer to q"]
+
+def test_search_and_answer_reports_stage_timings(mock_embedding):
+    class UsageQuery(QueryModel):
+        model = 'fake-llm'
+
+        def generate(self, query, relevant_docs):
+            time.sleep(0.01)
+            return "answer"
+
+        def get_last_usage(self):
+            return {'prompt_tokens': 42, 'completion_tokens': 7}
+
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=UsageQuery(), vector_db='hnswlib')
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    result = pipeline.search_and_answer("query", k=2)
+
+    timings = result['timings']
+    assert set(timings) == {'embed', 'search', 'prompt', 'generate', 'total'}
+    assert timings['generate'] >= 0.01
+    assert timings['total'] >= sum(timings[stage] for stage in ('embed', 'search', 'prompt', 'generate')) - 1e-6
+    assert result['usage'] == {'embedding_tokens': 2, 'prompt_tokens': 42, 'completion_tokens': 7, 'estimated': False}
+    assert result['backends']['query_model'] == 'UsageQuery:fake-llm'
+    assert result['backends']['vector_db'] == 'HNSWLib'
+
+def test_search_and_answer_stream_records_timings_after_consumption(mock_embedding):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=StreamingQuery(), vector_db='numpy')
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    result = pipeline.search_and_answer("query", stream=True)
+    assert 'generate' not in result['timings']
+    assert ''.join(result['answer_stream']) == "Hello, world"
+    assert result['answer'] == "Hello, world"
+    assert 'first_token' in result['timings']
+    assert result['usage']['estimated'] is True
+
+def test_answer_cache_reuses_answer_for_similar_query(mock_embedding, mock_query):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='numpy',
+                           answer_cache=AnswerCache(similarity_threshold=0.99))
+    ids = pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    first = pipeline.search_and_answer("query", k=2)
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.301]])
+    second = pipeline.search_and_answer("query?", k=2)
+
+    assert first['cache_hit'] is False
+    assert second['cache_hit'] is True
+    assert second['cached_query'] == "query"
+    assert second['answer'] == first['answer']
+    assert set(second['document_ids']) <= set(ids)
+    assert second['usage']['completion_tokens'] == 0
+    assert mock_query.generate.call_count == 1
+
+    mock_embedding.embed.return_value = np.array([[0.9, -0.2, 0.1]])
+    assert pipeline.search_and_answer("other", k=2)['cache_hit'] is False
+
+def test_answer_cache_invalidated_by_document_changes(mock_embedding, mock_query):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='numpy',
+                           answer_cache=AnswerCache())
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    result = pipeline.search_and_answer("query", k=1)
+    used_id = result['document_ids'][0]
+
+    assert pipeline.search_and_answer("query", k=1)['cache_hit'] is True
+    pipeline.update_document(used_id, "doc1 updated")
+    assert pipeline.search_and_answer("query", k=1)['cache_hit'] is False
+    pipeline.delete_document(used_id)
+    assert pipeline.search_and_answer("query", k=1)['cache_hit'] is False
+
+def test_answer_cache_ttl_and_lru_eviction():
+    now = [0.0]
+    cache = AnswerCache(ttl=10, max_entries=2, clock=lambda: now[0])
+    cache.put([1.0, 0.0], {'answer': 'a'}, ['d1'])
+    cache.put([0.0, 1.0], {'answer': 'b'}, ['d2'])
+    assert cache.lookup([1.0, 0.0])[0]['answer'] == 'a'
+    cache.put([-1.0, 0.0], {'answer': 'c'}, ['d3'])
+    assert cache.lookup([0.0, 1.0]) is None
+    assert len(cache) == 2
+
+    now[0] = 11.0
+    assert cache.lookup([1.0, 0.0]) is None
+    assert len(cache) == 0
+
+def test_answer_cache_skips_expired_best_match_and_other_params():
+    now = [0.0]
+    cache = AnswerCache(similarity_threshold=0.9, ttl=10, clock=lambda: now[0])
+    cache.put([1.0, 0.0], {'answer': 'stale'}, ['d1'], params=(2, None))
+    now[0] = 8.0
+    cache.put([1.0, 0.1], {'answer': 'fresh'}, ['d1'], params=(2, None))
+    cache.put([1.0, 0.0], {'answer': 'k1'}, ['d1'], params=(1, None))
+    now[0] = 12.0
+
+    assert cache.lookup([1.0, 0.0], params=(2, None))[0]['answer'] == 'fresh'
+    assert cache.lookup([1.0, 0.0], params=(1, None))[0]['answer'] == 'k1'
+    assert cache.lookup([1.0, 0.0], params=(2, 0.5)) is None
+    assert len(cache) == 2
+
+def test_answer_cache_is_keyed_by_search_settings(mock_embedding, mock_query):
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=mock_query, vector_db='numpy',
+                           answer_cache=AnswerCache())
+    pipeline.add_documents(["doc1", "doc2", "doc3"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+
+    assert len(pipeline.search_and_answer("query", k=1)['relevant_docs']) == 1
+    wider = pipeline.search_and_answer("query", k=3)
+    assert wider['cache_hit'] is False and len(wider['relevant_docs']) == 3
+    assert pipeline.search_and_answer("query", k=3, threshold=0.1)['cache_hit'] is False
+    assert pipeline.search_and_answer("query", k=3)['cache_hit'] is True
+    pipeline.rrf_k = 10
+    assert pipeline.search_and_answer("query", k=3)['cache_hit'] is False
+
+def test_async_pipeline_answer_cache_stream():
+    pipeline = AsyncRAGPipeline(SlowAsyncEmbedding(), SlowAsyncQuery(), vector_db='numpy', answer_cache=AnswerCache())
+
+    async def scenario():
+        await pipeline.aadd_documents(["doc1", "doc22"])
+        await pipeline.asearch_and_answer("q", k=1)
+        result = await pipeline.asearch_and_answer("q", k=1, stream=True)
+        return result, [token async for token in result['answer_stream']]
+
+    result, tokens = asyncio.run(scenario())
+    pipeline.close()
+    assert result['cache_hit'] is True
+    assert tokens == ["answer to q"]
+
+def test_rag_pipeline_ingest_files_in_batches(tmp_path):
+    class LengthEmbedding(EmbeddingModel):
+        def __init__(self):
+            self.batch_sizes = []
+
+        def embed(self, texts):
+            self.batch_sizes.append(len(texts))
+            return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+        def get_dimension(self):
+            return 3
+
+    for i in range(3):
+        (tmp_path / f"doc{i}.txt").write_text(f"document {i} " * 40, encoding='utf-8')
+    embedding_model = LengthEmbedding()
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db='numpy')
+    reports = []
+    stats = pipeline.ingest_files(tmp_path, max_tokens=16, overlap=4, batch_size=5, progress=reports.append)
+
+    assert stats['sources'] == 3
+    assert stats['chunks'] == len(pipeline.vector_db) == sum(embedding_model.batch_sizes)
+    assert max(embedding_model.batch_sizes) == 5
+    assert len(reports) == len(embedding_model.batch_sizes)
+    assert reports[-1]['chunks'] == stats['chunks']
+
+def test_rag_pipeline_ingest_overlaps_embedding_with_chunking():
+    class SlowEmbedding(EmbeddingModel):
+        def __init__(self):
+            self.active = 0
+            self.max_active = 0
+
+        def embed(self, texts):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            time.sleep(0.02)
+            self.active -= 1
+            return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+        def get_dimension(self):
+            return 3
+
+    embedding_model = SlowEmbedding()
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db='hnswlib', num_threads=2)
+    documents = (f"document {i} " * 30 for i in range(12))
+    stats = pipeline.ingest(documents, max_tokens=20, overlap=4, batch_size=8, workers=2, embed_concurrency=3)
+
+    assert pipeline.vector_db.num_threads == 2
+    assert stats['sources'] == 12
+    assert stats['chunks'] == len(pipeline.vector_db)
+    assert embedding_model.max_active > 1
+
+class CountingEmbedding(EmbeddingModel):
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, float(sum(map(ord, text)) % 7)] for text in texts]
+
+    def get_dimension(self):
+        return 3
+
+@pytest.mark.parametrize('vector_db', ['hnswlib', 'numpy'])
+def test_sync_documents_only_embeds_changes(vector_db):
+    embedding_model = CountingEmbedding()
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db=vector_db)
+    stats = pipeline.sync_documents(["doc a", "doc b", "doc c"], ["a", "b", "c"])
+    assert stats == {'added': 3, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    embedding_model.embedded.clear()
+    stats = pipeline.sync_documents(["doc a", "doc b changed", "doc d"], ["a", "b", "d"])
+    assert stats == {'added': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1}
+    assert embedding_model.embedded == ["doc b changed", "doc d"]
+    assert len(pipeline.vector_db) == 3
+    assert sorted(pipeline.vector_db.get_content_hashes()) == ["a", "b", "d"]
+
+    embedding_model.embedded.clear()
+    assert pipeline.sync_documents(["doc a", "doc b changed", "doc d"], ["a", "b", "d"])['unchanged'] == 3
+    assert embedding_model.embedded == []
+
+def test_sync_documents_survives_save_and_load(tmp_path):
+    embedding_model = CountingEmbedding()
+    path = str(tmp_path / "index.bin")
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db='hnswlib', index_path=path)
+    pipeline.sync_documents(["doc a", "doc b"], ["a", "b"])
+    pipeline.save()
+
+    embedding_model.embedded.clear()
+    reloaded = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db='hnswlib', index_path=path)
+    stats = reloaded.sync_documents(["doc a", "doc b!"], ["a", "b"])
+    assert stats['unchanged'] == 1 and stats['updated'] == 1
+    assert embedding_model.embedded == ["doc b!"]
+
+@patch('bombay.pipeline.vector_db.chromadb.Client')
+def test_chromadb_upsert_stores_content_hash(mock_chromadb_client):
+    mock_collection = Mock()
+    mock_chromadb_client.return_value.create_collection.return_value = mock_collection
+    mock_collection.get.return_value = {'ids': ['a', 'b'], 'metadatas': [{'content_hash': 'h1'}, None]}
+    chromadb_db = ChromaDB(collection_name='test_collection')
+    assert chromadb_db.get_content_hashes() == {'a': 'h1', 'b': None}
+
+    chromadb_db.upsert_documents(["doc a"], np.array([[0.1, 0.2, 0.3]]), ["a"], ["h2"])
+    kwargs = mock_collection.upsert.call_args.kwargs
+    assert kwargs['ids'] == ["a"]
+    assert kwargs['metadatas'] == [{'content_hash': 'h2'}]
+
+def test_hnswlib_parameters_and_geometric_growth():
+    db = HNSWLib(dim=3, M=8, ef_construction=50, ef_search=20, growth_factor=2.0)
+    rng = np.random.default_rng(0)
+    db.add_documents([f"doc{i}" for i in range(10)], rng.random((10, 3)))
+    assert db.index.M == 8 and db.index.ef_construction == 50 and db.index.ef == 20
+    db.add_documents(["doc10"], rng.random((1, 3)))
+    assert db.index.max_elements == 20
+    db.add_documents([f"more{i}" for i in range(30)], rng.random((30, 3)))
+    assert db.index.max_elements == 41
+
+def test_hnswlib_tune_ef_reaches_target_recall(tmp_path):
+    rng = np.random.default_rng(1)
+    db = HNSWLib(dim=16, M=4, ef_construction=20, ef_search=1)
+    db.add_documents([f"doc{i}" for i in range(2000)], rng.standard_normal((2000, 16)))
+    report = db.tune_ef(rng.standard_normal((50, 16)), k=10, target_recall=0.9)
+    assert report['recall'] >= 0.9
+    assert db.index.ef == db.ef_search == report['ef']
+    assert [trial['ef'] for trial in report['trials']] == sorted(trial['ef'] for trial in report['trials'])
+
+    path = str(tmp_path / "index.bin")
+    db.save(path)
+    assert HNSWLib.load(path).index.ef == report['ef']
+
+@patch('bombay.pipeline.rag_pipeline.OpenAIQuery')
+@patch('bombay.pipeline.rag_pipeline.OpenAIEmbedding')
+def test_create_pipeline_reads_hnsw_config(mock_embedding_class, mock_query_class, tmp_path):
+    from bombay.pipeline.rag_pipeline import create_pipeline
+    mock_embedding_class.return_value.get_dimension.return_value = 3
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text("hnswlib:\n  M: 12\n  ef_search: 30\n  growth_factor: 1.5\n", encoding='utf-8')
+
+    pipeline = create_pipeline('openai', 'gpt-3', 'hnswlib', 'dummy', config_path=str(config_path), ef_search=40)
+    assert pipeline.vector_db.M == 12
+    assert pipeline.vector_db.ef_search == 40
+    assert pipeline.vector_db.growth_factor == 1.5
+
+    default = create_pipeline('openai', 'gpt-3', 'hnswlib', 'dummy')
+    assert default.vector_db.ef_construction == Config().get('hnswlib')['ef_construction']
+
+def test_context_budgeter_dedupes_and_truncates():
+    long_document = ' '.join(f"word{i}" for i in range(400))
+    results = [
+        (1, "Cats sleep sixteen hours a day.", 0.1),
+        (2, "cats  sleep sixteen hours a day!", 0.2),
+        (3, long_document, 0.3),
+        (4, "Dogs bark.", 0.4),
+    ]
+    packed, report = ContextBudgeter(max_tokens=60, min_truncated_tokens=10).pack(results)
+
+    assert [document_id for document_id, _, _ in packed] == [1, 3]
+    assert report['duplicates'] == 1
+    assert report['truncated'] == 1
+    assert report['dropped'] == 1
+    assert report['tokens_after'] <= 60
+    assert report['tokens_saved'] == report['tokens_before'] - report['tokens_after']
+    assert long_document.startswith(packed[1][1])
+
+def test_rag_pipeline_applies_context_budget(mock_embedding):
+    class PromptQuery(QueryModel):
+        def generate(self, query, relevant_docs):
+            self.relevant_docs = relevant_docs
+            return "answer"
+
+    query_model = PromptQuery()
+    pipeline = RAGPipeline(embedding_model=mock_embedding, query_model=query_model, vector_db='numpy',
+                           context_budgeter=ContextBudgeter(max_tokens=8))
+    pipeline.add_documents(["alpha beta gamma delta " * 3, "alpha beta gamma delta " * 3, "short doc"])
+    mock_embedding.embed.return_value = np.array([[0.1, 0.2, 0.3]])
+    result = pipeline.search_and_answer("query", k=3)
+
+    assert query_model.relevant_docs == result['relevant_docs']
+    assert len(result['relevant_docs']) == len(result['document_ids']) == len(result['distances'])
+    assert result['context']['candidates'] == 3
+    assert result['context']['tokens_after'] <= 8
+    assert result['usage']['prompt_tokens'] <= count_tokens("query") + 8
+
+def test_bm25_index_matches_identifiers_and_survives_compaction(tmp_path):
+    index = BM25Index(compact_ratio=0.5)
+    index.add_documents([
+        "Error ERR-1042 means the upload quota was exceeded.",
+        "Uploads fail when the disk is full.",
+        "SKU 88-301 ships in two days.",
+        "Quota limits reset every month.",
+    ], ["err", "disk", "sku", "quota"])
+
+    assert index.search("ERR-1042")[0][0] == "err"
+    assert index.search("1042")[0][0] == "err"
+    assert [document_id for document_id, _ in index.search("upload quota", k=2)] == ["err", "quota"]
+    assert index.confident("ERR-1042", index.search("ERR-1042"))
+    assert not index.confident("why do uploads fail", index.search("why do uploads fail"))
+
+    index.update_document("sku", "SKU 88-302 ships tomorrow.")
+    index.delete_document("disk")
+    index.delete_document("quota")
+    assert index.deleted == 0 and len(index.ids) == 2
+    assert index.search("days") == [] and "88-301" not in index.postings
+    assert index.search("88-302")[0][0] == "sku"
+
+    path = str(tmp_path / "index.bm25")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("upload quota") == index.search("upload quota")
+    assert reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=1)[0][0] == "b"
+
+def test_rag_pipeline_hybrid_retrieval_and_lexical_fast_path(tmp_path):
+    embedding_model = CountingEmbedding()
+    path = str(tmp_path / "index.bin")
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=Mock(generate=Mock(return_value="answer")),
+                           vector_db='hnswlib', lexical_index=BM25Index(), index_path=path)
+    pipeline.sync_documents(["Error ERR-1042 means the quota was exceeded.", "The service restarts nightly.",
+                             "Quota usage is shown on the dashboard."], ["err", "restart", "quota"])
+
+    embedding_model.embedded.clear()
+    result = pipeline.search_and_answer("ERR-1042", k=1)
+    assert result['retrieval'] == 'lexical'
+    assert result['document_ids'] == ("err",) and result['distances'] == (None,)
+    assert embedding_model.embedded == []
+
+    result = pipeline.search_and_answer("how is quota usage shown", k=2)
+    assert result['retrieval'] == 'hybrid'
+    assert result['document_ids'][0] == "quota"
+    assert embedding_model.embedded == ["how is quota usage shown"]
+
+    pipeline.delete_document("err")
+    assert pipeline.search_and_answer("ERR-1042", k=1)['retrieval'] != 'lexical'
+    pipeline.save()
+    reloaded = RAGPipeline(embedding_model=embedding_model, query_model=Mock(), vector_db='hnswlib',
+                           lexical_index=BM25Index(), index_path=path)
+    assert "err" not in reloaded.lexical_index and "quota" in reloaded.lexical_index
+
+    os.remove(f"{path}.bm25")
+    rebuilt = RAGPipeline(embedding_model=embedding_model, query_model=Mock(generate=Mock(return_value="answer")),
+                          vector_db='hnswlib', lexical_index=BM25Index(), index_path=path)
+    assert len(rebuilt.lexical_index) == 2 and "quota" in rebuilt.lexical_index
+    assert rebuilt.search_and_answer("how is quota usage shown", k=2)['retrieval'] == 'hybrid'
+
+@pytest.mark.parametrize('filter_exact_limit', [0, 10000])
+def test_hnswlib_where_filter_returns_k_in_filter_results(filter_exact_limit, tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((300, 8)).astype(np.float32)
+    metadatas = [{'tenant': f"t{i % 10}", 'year': 2000 + i % 7, 'public': i % 2 == 0} for i in range(300)]
+    db = HNSWLib(dim=8, filter_exact_limit=filter_exact_limit)
+    db.add_documents([f"doc{i}" for i in range(300)], embeddings, metadatas=metadatas)
+    query = rng.standard_normal(8).astype(np.float32)
+
+    def expected(predicate, k):
+        allowed = [i for i in range(300) if predicate(metadatas[i])]
+        scores = embeddings[allowed] @ query / np.linalg.norm(embeddings[allowed], axis=1)
+        return [allowed[i] for i in np.argsort(-scores)[:k]]
+
+    results = db.search_with_ids(query, k=5, where={'tenant': 't3'})
+    assert [document_id for document_id, _, _ in results] == expected(lambda m: m['tenant'] == 't3', 5)
+    results = db.search_with_ids(query, k=5, where={'$and': [{'tenant': {'$in': ['t1', 't2']}}, {'year': {'$gte': 2004}}]})
+    assert [document_id for document_id, _, _ in results] == expected(
+        lambda m: m['tenant'] in ('t1', 't2') and m['year'] >= 2004, 5)
+    results = db.search_with_ids(query, k=5, where={'$or': [{'public': True}, {'tenant': {'$ne': 't0'}}]})
+    assert len(results) == 5
+    assert db.search(query, k=3, where={'tenant': 'missing'}) == []
+    with pytest.raises(ValueError):
+        db.search(query, k=3, where={'tenant': {'$gt': 't1'}})
+
+    db.delete_document(3)
+    db.update_document(13, "doc13", embeddings[13], metadata={'tenant': 't9'})
+    ids = [document_id for document_id, _, _ in db.search_with_ids(query, k=50, where={'tenant': 't3'})]
+    assert len(ids) == 28 and 3 not in ids and 13 not in ids
+
+    path = str(tmp_path / "index.bin")
+    db.save(path)
+    loaded = HNSWLib.load(path)
+    assert loaded.get_metadatas([13, 14]) == [{'tenant': 't9'}, {'tenant': 't4', 'year': 2000, 'public': True}]
+    assert loaded.search_with_ids(query, k=50, where={'tenant': 't3'}) == db.search_with_ids(query, k=50, where={'tenant': 't3'})
+
+def test_rag_pipeline_where_filter_bypasses_answer_cache():
+    embedding_model = CountingEmbedding()
+    query_model = Mock(generate=Mock(return_value="answer"))
+    pipeline = RAGPipeline(embedding_model=embedding_model, query_model=query_model, vector_db='hnswlib',
+                           answer_cache=AnswerCache())
+    pipeline.add_documents(["alpha doc", "beta doc"], metadatas=[{'tenant': 'a'}, {'tenant': 'b'}])
+
+    assert pipeline.search_and_answer("doc", k=2, where={'tenant': 'b'})['relevant_docs'] == ("beta doc",)
+    assert pipeline.search_and_answer("doc", k=2, where={'tenant': 'a'})['relevant_docs'] == ("alpha doc",)
+    assert len(pipeline.answer_cache) == 0
+
+def test_import_bombay_does_not_load_backends():
+    code = "import sys, bombay; print(sorted(m for m in ('chromadb', 'openai', 'hnswlib', 'pyfiglet') if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    assert output.strip() == "[]"
+
+@pytest.mark.parametrize('vector_db', ['hnswlib', 'numpy'])
+def test_pipeline_defers_index_until_dimension_is_known(vector_db):
+    class UnknownDimensionEmbedding(CountingEmbedding):
+        def get_dimension(self):
+            raise AssertionError("get_dimension must not be called at pipeline creation")
+
+        def known_dimension(self):
+            return None
+
+    pipeline = RAGPipeline(embedding_model=UnknownDimensionEmbedding(), query_model=Mock(generate=Mock(return_value="answer")),
+                           vector_db=vector_db)
+    assert pipeline.vector_db.dim is None
+    assert pipeline.vector_db.search([1.0, 1.0, 0.0], k=2) == []
+
+    pipeline.add_documents(["short", "a much longer document"])
+    assert pipeline.vector_db.dim == 3
+    assert sorted(pipeline.search_and_answer("query", k=2)['relevant_docs']) == ["a much longer document", "short"]
+
+def test_create_pipeline_builds_openai_models_without_network():
+    from bombay.pipeline.rag_pipeline import create_pipeline
+    pipeline = create_pipeline('openai', 'gpt-3', 'hnswlib', 'dummy')
+
+    assert pipeline.vector_db.dim == 1536
+    assert pipeline.embedding_model._client is None and pipeline.query_model._client is None
+
+def test_sharded_vector_db_matches_single_index(tmp_path):
+    rng = np.random.default_rng(3)
+    embeddings = rng.normal(size=(120, 8)).astype(np.float32)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+    ids = [f"doc-{i}" for i in range(120)]
+    documents = [f"text {i}" for i in range(120)]
+    single = NumpyFlatDB(8)
+    single.add_documents(documents, embeddings, ids=ids)
+
+    with ShardedVectorDB(num_shards=3, backend='numpy') as sharded:
+        sharded.add_documents(documents, embeddings, ids=ids)
+        assert len(sharded) == 120 and sharded.dim == 8
+        assert len({shard_of(document_id, 3) for document_id in ids}) == 3
+        assert sharded.search_batch_with_ids(queries, k=7) == single.search_batch_with_ids(queries, k=7)
+
+        sharded.delete_document("doc-5")
+        sharded.update_document("doc-6", "changed", embeddings[7])
+        assert sharded.get_documents(["doc-6", "doc-5", "doc-1"]) == ["changed", None, "text 1"]
+        assert np.allclose(sharded.get_embeddings(["doc-6"]), single.get_embeddings(["doc-7"]))
+        assert len(sharded) == 119
+        with pytest.raises(ValueError):
+            sharded.delete_document("doc-5")
+
+    with ShardedVectorDB(8, num_shards=2, M=8, ef_construction=100, ef_search=200,
+                         filter_exact_limit=0) as sharded:
+        assert sharded.add_documents(documents, embeddings, metadatas=[{'even': i % 2 == 0} for i in range(120)]) == list(range(120))
+        results = sharded.search_with_ids(queries[0], k=5, where={'even': True})
+        assert len(results) == 5 and all(document_id % 2 == 0 for document_id, _, _ in results)
+        path = str(tmp_path / "sharded.bin")
+        sharded.save(path)
+        expected = sharded.search_batch(queries, k=5)
+
+    with ShardedVectorDB.load(path) as loaded:
+        assert loaded.search_batch(queries, k=5) == expected
+        assert loaded.add_documents(["new"], embeddings[:1]) == [120]
+
+def test_sharded_vector_db_validates_ids_before_writing():
+    rng = np.random.default_rng(4)
+    embeddings = rng.normal(size=(6, 8)).astype(np.float32)
+    with ShardedVectorDB(num_shards=3, backend='numpy') as sharded:
+        sharded.add_documents(["a", "b"], embeddings[:2], ids=["doc-0", "doc-1"])
+        # 기존 ID 확인은 문서 본문을 가져오지 않는다
+        with patch.object(sharded, 'get_documents', side_effect=AssertionError):
+            with pytest.raises(ValueError, match="Duplicate"):
+                sharded.add_documents(["c", "d", "e"], embeddings[2:5], ids=["doc-2", "doc-3", "doc-2"])
+            with pytest.raises(ValueError, match="already exists"):
+                sharded.add_documents([f"new {i}" for i in range(5)], embeddings[1:6], ids=[f"doc-{i}" for i in range(1, 6)])
+        assert len(sharded) == 2
+        assert sharded.get_documents(["doc-2", "doc-3", "doc-4", "doc-5"]) == [None] * 4
+
+    for db in (NumpyFlatDB(8), HNSWLib(8)):
+        db.add_documents(["a"], embeddings[:1], ids=["doc-0"])
+        assert db.has_ids(["doc-0", "doc-1"]) == [True, False]
+
+def test_sharded_vector_db_serves_concurrent_searches():
+    from concurrent.futures import ThreadPoolExecutor
+    rng = np.random.default_rng(6)
+    embeddings = rng.normal(size=(200, 8)).astype(np.float32)
+    queries = rng.normal(size=(40, 8)).astype(np.float32)
+    with ShardedVectorDB(num_shards=3, backend='numpy') as sharded:
+        sharded.add_documents([f"text {i}" for i in range(200)], embeddings)
+        expected = [sharded.search_with_ids(query, k=5) for query in queries]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda query: sharded.search_with_ids(query, k=5), queries))
+        assert results == expected
+
+def test_ivfpq_trains_compresses_and_reranks(tmp_path):
+    rng = np.random.default_rng(5)
+    centers = rng.normal(size=(16, 32)).astype(np.float32)
+    embeddings = centers[rng.integers(0, 16, 3000)] + 0.3 * rng.normal(size=(3000, 32)).astype(np.float32)
+    queries = centers[:8] + 0.3 * rng.normal(size=(8, 32)).astype(np.float32)
+    documents = [f"doc {i}" for i in range(3000)]
+    exact = NumpyFlatDB(32)
+    exact.add_documents(documents[:1000], embeddings[:1000])
+
+    db = IVFPQDB(32, nlist=16, m=8, nprobe=4, rerank=8, train_size=2000, kmeans_iterations=8)
+    db.add_documents(documents[:1000], embeddings[:1000])
+    assert not db.is_trained
+    for found, expected in zip(db.search_batch_with_ids(queries, k=5), exact.search_batch_with_ids(queries, k=5)):
+        assert [document_id for document_id, _, _ in found] == [document_id for document_id, _, _ in expected]
+        assert np.allclose([dist for _, _, dist in found], [dist for _, _, dist in expected], atol=1e-5)
+
+    db.add_documents(documents[1000:], embeddings[1000:])
+    exact.add_documents(documents[1000:], embeddings[1000:])
+    assert db.is_trained and sum(lst.size for lst in db.lists) == 3000
+    truth = [[document_id for document_id, _, _ in row] for row in exact.search_batch_with_ids(queries, k=10)]
+
+    def recall(index):
+        rows = index.search_batch_with_ids(queries, k=10)
+        return np.mean([len({document_id for document_id, _, _ in row} & set(expected)) / 10 for row, expected in zip(rows, truth)])
+
+    assert recall(db) >= 0.9
+    compressed = IVFPQDB(32, nlist=16, m=8, nprobe=16, train_size=3000, kmeans_iterations=8)
+    compressed.add_documents(documents, embeddings)
+    assert compressed.raw is None
+    assert compressed.nbytes - compressed.codebooks.nbytes - compressed.centroids.nbytes < embeddings.nbytes / 4
+    assert recall(compressed) >= 0.5
+    assert np.abs(compressed.get_embeddings([7]) - embeddings[7] / np.linalg.norm(embeddings[7])).max() < 0.5
+
+    db.delete_document(0)
+    db.update_document(1, "moved", embeddings[2])
+    assert db.get_documents([0, 1]) == [None, "moved"]
+    assert 0 not in [document_id for document_id, _, _ in db.search_with_ids(embeddings[0], k=20)]
+    assert db.search_with_ids(embeddings[2], k=2)[0][2] == pytest.approx(0.0, abs=1e-5)
+
+    path = str(tmp_path / "index.ivfpq")
+    db.save(path)
+    loaded = IVFPQDB.load(path)
+    assert loaded.search_batch_with_ids(queries, k=10) == db.search_batch_with_ids(queries, k=10)
+    assert loaded.add_documents(["new"], embeddings[:1]) == [3000]
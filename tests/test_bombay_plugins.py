@@ -0,0 +1,152 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from bombay.pipeline.rag_pipeline import RAGPipeline, create_pipeline
+from bombay.pipeline.embedding_models import EmbeddingModel
+from bombay.pipeline.vector_db import NumpyFlatDB
+from bombay.plugins import (Reranker, CosineReranker, MMRReranker, HashingEmbedding, ExtractiveQuery,
+                            register_embedding_model, available_query_models)
+from bombay.plugins import registry
+
+
+class TableEmbedding(EmbeddingModel):
+    def __init__(self, table):
+        self.table = table
+
+    def embed(self, texts):
+        return np.array([self.table[text] for text in texts], dtype=np.float32)
+
+    def get_dimension(self):
+        return 3
+
+
+def test_cosine_reranker_restores_exact_order():
+    candidates = [("a", "doc a", 0.3), ("b", "doc b", 0.1), ("c", "doc c", 0.2)]
+    embeddings = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [1.0, 1.0, 0.0]])
+    reranked = CosineReranker().rerank([1.0, 0.1, 0.0], candidates, embeddings, k=2)
+
+    assert [document_id for document_id, _, _ in reranked] == ["a", "c"]
+    assert np.isclose(reranked[0][2], 1.0 - 1.0 / np.sqrt(1.01))
+
+def test_mmr_reranker_skips_redundant_candidates():
+    candidates = [("a", "doc a", 0.0), ("a2", "doc a copy", 0.0), ("b", "doc b", 0.5)]
+    embeddings = np.array([[1.0, 0.1, 0.0], [1.0, 0.11, 0.0], [0.6, -0.8, 0.0]])
+    query = [1.0, 0.0, 0.0]
+
+    assert [c[0] for c in MMRReranker(lambda_mult=1.0).rerank(query, candidates, embeddings, k=2)] == ["a", "a2"]
+    assert [c[0] for c in MMRReranker(lambda_mult=0.5).rerank(query, candidates, embeddings, k=2)] == ["a", "b"]
+
+def test_rerankers_report_distances_in_index_metric():
+    table = {"a": [3.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [1.0, 1.0, 0.0], "query": [1.0, 0.2, 0.0]}
+    for similarity in ('l2', 'ip'):
+        for reranker in (CosineReranker(), MMRReranker(lambda_mult=1.0)):
+            pipeline = RAGPipeline(TableEmbedding(table), Mock(generate=Mock(return_value="answer")), vector_db='numpy',
+                                   similarity=similarity, reranker=reranker, overfetch=3)
+            pipeline.add_documents(["a", "b", "c"])
+            plain = NumpyFlatDB(3, similarity=similarity)
+            plain.add_documents(["a", "b", "c"], np.array([table[d] for d in "abc"], dtype=np.float32))
+            expected = dict((document, distance) for document, distance in plain.search(table["query"], k=3))
+
+            result = pipeline.search_and_answer("query", k=2)
+            assert reranker.similarity == similarity
+            assert all(np.isclose(distance, expected[document], atol=1e-5)
+                       for document, distance in zip(result['relevant_docs'], result['distances']))
+
+def test_chromadb_reranked_distances_match_vector_search():
+    from uuid import uuid4
+    table = {"a": [3.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [1.0, 1.0, 0.0], "query": [1.0, 0.2, 0.0]}
+    results = []
+    for reranker in (None, CosineReranker()):
+        pipeline = RAGPipeline(TableEmbedding(table), Mock(generate=Mock(return_value="answer")), vector_db='chromadb',
+                               reranker=reranker, overfetch=3, collection_name=f"rerank-{uuid4().hex}")
+        pipeline.add_documents(["a", "b", "c"])
+        result = pipeline.search_and_answer("query", k=2)
+        results.append(dict(zip(result['relevant_docs'], result['distances'])))
+
+    plain, reranked = results
+    assert plain.keys() == reranked.keys()
+    assert all(np.isclose(plain[document], reranked[document], atol=1e-5) for document in plain)
+
+def test_pipeline_overfetches_and_reranks_before_generation():
+    table = {
+        "near": [1.0, 0.0, 0.0],
+        "near copy": [1.0, 0.01, 0.0],
+        "other": [0.7, 0.7, 0.0],
+        "far": [0.5, 0.0, 0.866],
+        "query": [1.0, 0.05, 0.0],
+    }
+
+    class RecordingReranker(Reranker):
+        def rerank(self, query_embedding, candidates, candidate_embeddings, k):
+            self.seen = [document_id for document_id, _, _ in candidates]
+            assert candidate_embeddings.shape == (len(candidates), 3)
+            return MMRReranker().rerank(query_embedding, candidates, candidate_embeddings, k)
+
+    reranker = RecordingReranker()
+    query_model = Mock(generate=Mock(return_value="answer"))
+    pipeline = RAGPipeline(embedding_model=TableEmbedding(table), query_model=query_model, vector_db='numpy',
+                           reranker=reranker, overfetch=2)
+    pipeline.sync_documents(["near", "near copy", "other", "far"], ["near", "copy", "other", "far"])
+    result = pipeline.search_and_answer("query", k=2)
+
+    assert reranker.seen == ["copy", "near", "other", "far"]
+    assert result['document_ids'] == ("copy", "other")
+    query_model.generate.assert_called_once_with("query", ("near copy", "other"))
+    assert 'rerank' in result['timings']
+    assert result['timings']['total'] >= result['timings']['rerank']
+
+def test_hashing_embedding_is_deterministic_and_matches_inflected_words():
+    embedding = HashingEmbedding(dim=256)
+    vectors = embedding.embed(["고양이는 포유류입니다", "고양이 포유류", "파이썬 프로그래밍 언어", ""])
+
+    assert vectors.shape == (4, 256) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0) and not vectors[3].any()
+    assert np.array_equal(vectors, HashingEmbedding(dim=256).embed(["고양이는 포유류입니다", "고양이 포유류", "파이썬 프로그래밍 언어", ""]))
+    assert vectors[0] @ vectors[1] > 0.5 > vectors[0] @ vectors[2]
+
+def test_extractive_query_selects_overlapping_sentences_in_order():
+    query_model = ExtractiveQuery(max_sentences=2)
+    documents = ["개는 후각이 뛰어납니다. 파이썬은 언어입니다.", "고양이는 포유류입니다.\n고양이는 잠이 많습니다."]
+
+    assert query_model.generate("고양이는 포유류인가요?", documents) == "고양이는 포유류입니다. 고양이는 잠이 많습니다."
+    assert query_model.get_last_usage()['completion_tokens'] > 0
+    assert list(query_model.generate_stream("후각", documents)) == ["개는 후각이 뛰어납니다."]
+    assert query_model.generate("anything", []) == ''
+
+def test_extractive_query_usage_is_per_task():
+    query_model = ExtractiveQuery()
+
+    async def ask(document):
+        await query_model.agenerate("query", [document])
+        await asyncio.sleep(0.01)
+        return query_model.get_last_usage()['completion_tokens']
+
+    async def scenario():
+        return await asyncio.gather(ask("short"), ask("a much longer sentence " * 20))
+
+    short, long = asyncio.run(scenario())
+    assert short < long
+
+def test_create_pipeline_resolves_registered_and_entry_point_models(monkeypatch):
+    monkeypatch.setattr(registry, '_embedding_models', dict(registry._embedding_models))
+    monkeypatch.setattr(registry, '_query_models', dict(registry._query_models))
+
+    @register_embedding_model('test-table')
+    def table_embedding(api_key, table=None):
+        assert api_key is None
+        return TableEmbedding(table)
+
+    table = {"near": [1.0, 0.0, 0.0], "far": [0.0, 1.0, 0.0], "query": [0.9, 0.1, 0.0]}
+    pipeline = create_pipeline('test-table', 'extractive', 'numpy', embedding_model_options={'table': table})
+    pipeline.add_documents(["near", "far"])
+    assert pipeline.search_and_answer("query", k=1)['relevant_docs'] == ("near",)
+
+    entry_point = Mock()
+    entry_point.name = 'test-entry-point'
+    entry_point.load.return_value = lambda api_key, **options: ExtractiveQuery(**options)
+    monkeypatch.setattr(registry, 'entry_points', lambda group: [entry_point] if group == registry.QUERY_MODEL_GROUP else [])
+    assert create_pipeline('hashing', 'test-entry-point', 'hnswlib', query_model_options={'max_sentences': 1}).query_model.max_sentences == 1
+    assert 'test-entry-point' in available_query_models()
+    with pytest.raises(ValueError, match="Unsupported embedding model: missing"):
+        create_pipeline('missing', 'extractive', 'numpy')
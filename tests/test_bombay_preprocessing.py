@@ -0,0 +1,56 @@
+import os
+import pytest
+from bombay.utils.preprocessing import preprocess_text, count_tokens, chunk_text, iter_files, iter_chunks, iter_file_chunks, batched
+
+
+def test_preprocess_text_normalizes_whitespace_and_control_chars():
+    assert preprocess_text("  hello\x00\tworld \n\n 가가 ") == "hello world 가가"
+
+
+def test_chunk_text_respects_budget_and_overlap():
+    words = [f"w{i:03d}" for i in range(200)]
+    chunks = list(chunk_text(' '.join(words), max_tokens=20, overlap=5))
+    assert all(count_tokens(chunk) <= 20 for chunk in chunks)
+    # 각 청크는 이전 청크의 마지막 단어들(overlap 토큰 이하)로 시작한다
+    for previous, current in zip(chunks, chunks[1:]):
+        previous_words, current_words = previous.split(), current.split()
+        shared = previous_words.index(current_words[0])
+        overlap = previous_words[shared:]
+        assert overlap and current_words[:len(overlap)] == overlap
+        assert count_tokens(' '.join(overlap)) <= 5
+    assert chunks[-1].split()[-1] == 'w199'
+    assert {word for chunk in chunks for word in chunk.split()} == set(words)
+
+
+def test_chunk_text_splits_long_words_and_validates_arguments():
+    chunks = list(chunk_text('가' * 25, max_tokens=10, overlap=0))
+    assert chunks == ['가' * 10, '가' * 10, '가' * 5]
+    with pytest.raises(ValueError):
+        list(chunk_text('text', max_tokens=10, overlap=10))
+
+
+def test_iter_file_chunks_reads_directories_lazily(tmp_path):
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a.txt').write_text("alpha " * 50, encoding='utf-8')
+    (tmp_path / 'b' / 'c.md').write_text("gamma\n" * 10, encoding='utf-8')
+    (tmp_path / 'skip.bin').write_bytes(b'\x00\x01')
+
+    assert [os.path.basename(path) for path in iter_files(tmp_path)] == ['a.txt', 'c.md']
+    chunks = list(iter_file_chunks(tmp_path, max_tokens=20, overlap=4))
+    sources = [path for path, _ in chunks]
+    assert sources == sorted(sources)
+    assert chunks[-1] == (str(tmp_path / 'b' / 'c.md'), ' '.join(['gamma'] * 10))
+
+
+def test_batched():
+    assert list(batched(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_parallel_chunking_matches_sequential(tmp_path):
+    for i in range(5):
+        (tmp_path / f"doc{i}.txt").write_text(f"file {i} line\n" * 100, encoding='utf-8')
+    sequential = list(iter_file_chunks(tmp_path, max_tokens=30, overlap=5))
+    assert list(iter_file_chunks(tmp_path, max_tokens=30, overlap=5, workers=2)) == sequential
+
+    documents = [f"document {i} " * 60 for i in range(7)]
+    assert list(iter_chunks(iter(documents), 25, 5, workers=3)) == list(iter_chunks(documents, 25, 5))